@@ -6,7 +6,8 @@ import {
   checkMLServiceHealth,
   getModelInfo,
   validateUserProfile,
-  calculateBMI
+  calculateBMI,
+  LOG_ML_PAYLOADS
 } from '../services/recommendationService.js';
 
 /**
@@ -84,11 +85,13 @@ export const getRecommendations = async (req, res) => {
     console.log('🔄 Requesting recommendations from ML service...\n');
 
     // Get recommendations from ML service
-    const result = await getHabitRecommendations(userProfile, 8);
+    const result = await getHabitRecommendations(userProfile, 8, req.get('X-Request-ID'));
     
-    console.log('📦 ML Service Response:');
-    console.log(JSON.stringify(result, null, 2));
-    console.log('\n');
+    if (LOG_ML_PAYLOADS) {
+      console.log('📦 ML Service Response:');
+      console.log(JSON.stringify(result, null, 2));
+      console.log('\n');
+    }
 
     if (!result.success) {
       console.log('❌ Failed to get recommendations:');
@@ -110,19 +113,21 @@ export const getRecommendations = async (req, res) => {
     console.log(`   Source: ${result.metadata.fallbackUsed ? 'FALLBACK SYSTEM' : 'ML MODEL'}`);
     console.log(`   Total Recommendations: ${result.recommendations.length}\n`);
 
-    console.log('📋 RECOMMENDATIONS LIST:');
-    console.log('─────────────────────────────────────────────────────────────────');
-    result.recommendations.forEach((rec, index) => {
-      console.log(`\n${index + 1}. ${rec.habitName}`);
-      console.log(`   Score: ${rec.score ? rec.score.toFixed(4) : 'N/A'}`);
-      console.log(`   Category: ${rec.category || 'N/A'}`);
-      console.log(`   Description: ${rec.description}`);
-      console.log(`   Source: ${rec.source || 'N/A'}`);
-    });
-    console.log('\n─────────────────────────────────────────────────────────────────\n');
+    if (LOG_ML_PAYLOADS) {
+      console.log('📋 RECOMMENDATIONS LIST:');
+      console.log('─────────────────────────────────────────────────────────────────');
+      result.recommendations.forEach((rec, index) => {
+        console.log(`\n${index + 1}. ${rec.habitName}`);
+        console.log(`   Score: ${rec.score ? rec.score.toFixed(4) : 'N/A'}`);
+        console.log(`   Category: ${rec.category || 'N/A'}`);
+        console.log(`   Description: ${rec.description}`);
+        console.log(`   Source: ${rec.source || 'N/A'}`);
+      });
+      console.log('\n─────────────────────────────────────────────────────────────────\n');
 
-    console.log('📊 Metadata:');
-    console.log(JSON.stringify(result.metadata, null, 2));
+      console.log('📊 Metadata:');
+      console.log(JSON.stringify(result.metadata, null, 2));
+    }
     console.log('\n╔════════════════════════════════════════════════════════════════╗');
     console.log('║                    RESPONSE SENT                               ║');
     console.log('╚════════════════════════════════════════════════════════════════╝\n');
@@ -213,11 +218,13 @@ export const getCustomRecommendations = async (req, res) => {
     console.log('🔄 Requesting custom recommendations from ML service...\n');
 
     // Get recommendations
-    const result = await getHabitRecommendations(userProfile, topK || 5);
+    const result = await getHabitRecommendations(userProfile, topK || 5, req.get('X-Request-ID'));
 
-    console.log('\n═══════════════ ML CUSTOM RESPONSE ═══════════════');
-    console.log(JSON.stringify(result, null, 2));
-    console.log('══════════════════════════════════════════════════\n');
+    if (LOG_ML_PAYLOADS) {
+      console.log('\n═══════════════ ML CUSTOM RESPONSE ═══════════════');
+      console.log(JSON.stringify(result, null, 2));
+      console.log('══════════════════════════════════════════════════\n');
+    }
 
     if (!result.success) {
       console.log('❌ Failed to get custom recommendations:');
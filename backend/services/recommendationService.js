@@ -2,10 +2,15 @@
 // Purpose: Interface with Flask ML API for habit recommendations
 
 import axios from 'axios';
+import { randomUUID } from 'crypto';
 
 const ML_API_URL = process.env.ML_API_URL || 'http://localhost:5001';
 const ML_API_TIMEOUT = 25000; // 10 seconds
 
+// Full payload / recommendation dumps are synchronous console writes on
+// every request; only enable them while debugging
+export const LOG_ML_PAYLOADS = process.env.LOG_ML_PAYLOADS === 'true';
+
 /**
  * Check if ML service is healthy
  */
@@ -34,6 +39,7 @@ export const checkMLServiceHealth = async () => {
  * @param {string[]} userProfile.healthIssues - Array of health issues
  * @param {string} userProfile.goals - User's goals
  * @param {number} topK - Number of recommendations to fetch (default: 5)
+ * @param {string} requestId - Sent as X-Request-ID so ML service logs can be matched (generated if omitted)
  * @returns {Promise<Object>} Recommendations and metadata
  */
 // Utility function to normalize strings
@@ -48,7 +54,7 @@ const normalizeArray = (arr) => {
   return arr.map(item => normalizeString(item));
 };
 
-export const getHabitRecommendations = async (userProfile, topK = 5) => {
+export const getHabitRecommendations = async (userProfile, topK = 5, requestId = randomUUID()) => {
   try {
     // Validate input
     if (!userProfile.bmiCategory) {
@@ -67,7 +73,9 @@ export const getHabitRecommendations = async (userProfile, topK = 5) => {
       topK: topK
     };
 
-    console.log('Requesting ML predictions with normalized payload:', payload);
+    if (LOG_ML_PAYLOADS) {
+      console.log(`[${requestId}] Requesting ML predictions with normalized payload:`, payload);
+    }
 
     // Call ML API
     const response = await axios.post(
@@ -76,7 +84,8 @@ export const getHabitRecommendations = async (userProfile, topK = 5) => {
       {
         timeout: ML_API_TIMEOUT,
         headers: {
-          'Content-Type': 'application/json'
+          'Content-Type': 'application/json',
+          'X-Request-ID': requestId
         }
       }
     );
@@ -88,8 +97,9 @@ export const getHabitRecommendations = async (userProfile, topK = 5) => {
 
     const { recommendations, input } = response.data.data;
 
-    console.log(`✓ Received ${recommendations.length} recommendations from ML service`);
-    console.log('ML Recommendations:', JSON.stringify(recommendations, null, 2));
+    if (LOG_ML_PAYLOADS) {
+      console.log(`[${requestId}] ML Recommendations:`, JSON.stringify(recommendations, null, 2));
+    }
 
     return {
       success: true,
@@ -109,7 +119,7 @@ export const getHabitRecommendations = async (userProfile, topK = 5) => {
     };
 
   } catch (error) {
-    console.error('❌ Error fetching ML recommendations:', error.message);
+    console.error(`❌ [${requestId}] Error fetching ML recommendations:`, error.message);
     console.error('Error details:', {
       code: error.code,
       status: error.response?.status,
@@ -349,7 +359,9 @@ const getFallbackRecommendations = (userProfile, topK = 5) => {
   recommendations.sort((a, b) => priority_order[a.priority] - priority_order[b.priority]);
   const limitedRecommendations = recommendations.slice(0, topK);
 
-  console.log('✓ Fallback Recommendations:', JSON.stringify(limitedRecommendations, null, 2));
+  if (LOG_ML_PAYLOADS) {
+    console.log('✓ Fallback Recommendations:', JSON.stringify(limitedRecommendations, null, 2));
+  }
 
   return {
     success: true,
@@ -1,18 +1,69 @@
-from flask import Flask, request, jsonify
+import time
+
+STARTUP_BEGAN = time.perf_counter()
+
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+import hmac
+import logging
 import os
+import random
 import sys
+import tempfile
 
 # ------------------------------------------------------------------
 # Path setup
 # ------------------------------------------------------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SRC_DIR = os.path.join(BASE_DIR, 'src')
-MODEL_DIR = os.path.join(BASE_DIR, 'models')
+MODEL_DIR = os.environ.get("ML_MODEL_DIR", os.path.join(BASE_DIR, 'models'))
+MAX_BATCH_SIZE = int(os.environ.get("ML_MAX_BATCH_SIZE", "1000"))
+COMPILED_MODEL = os.environ.get("ML_COMPILED", "false").lower() == "true"
+FLAT_MODEL = os.environ.get("ML_FLAT_MODEL", "false").lower() == "true"
+# Serve the habit profile index (src/similarity.py) instead of the forest
+SIMILARITY_MODEL = os.environ.get("ML_SIMILARITY_MODEL", "false").lower() == "true"
+INFERENCE_BUNDLE = os.environ.get("ML_INFERENCE_BUNDLE", "false").lower() == "true"
+MMAP_ARTIFACTS = os.environ.get("ML_MMAP_ARTIFACTS", "false").lower() == "true"
+CACHE_SIZE = int(os.environ.get("ML_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.environ.get("ML_CACHE_TTL", "0"))
+# Identical concurrent /predict calls share one computation
+COALESCE_REQUESTS = os.environ.get("ML_COALESCE", "true").lower() == "true"
+# Build /predict bodies from per-habit JSON serialized at model load
+JSON_FRAGMENTS = os.environ.get("ML_JSON_FRAGMENTS", "true").lower() == "true"
+# Admission control: /predict calls beyond ML_MAX_IN_FLIGHT, or expected to
+# wait longer than ML_MAX_WAIT_MS, get a fast 503 with Retry-After (0 disables)
+MAX_IN_FLIGHT = int(os.environ.get("ML_MAX_IN_FLIGHT", "64"))
+MAX_WAIT_MS = float(os.environ.get("ML_MAX_WAIT_MS", "2000"))
+# Requests one process serves in parallel (gunicorn --threads)
+SERVING_CONCURRENCY = int(os.environ.get("ML_SERVING_CONCURRENCY", "1"))
+ADMIN_TOKEN = os.environ.get("ML_ADMIN_TOKEN")
+RELOAD_INTERVAL = float(os.environ.get("ML_RELOAD_INTERVAL", "0"))
+# Longest backoff between load attempts when startup found no usable model (0: don't retry)
+LOAD_RETRY_MAX_DELAY = float(os.environ.get("ML_LOAD_RETRY_MAX_DELAY", "300"))
+METRICS_ENABLED = os.environ.get("ML_METRICS", "true").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.environ.get("ML_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("ML_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "habivance-profiles"))
+LOG_LEVEL = os.environ.get("ML_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("ML_LOG_FORMAT", "json").lower()
+# Share of successful requests that get an access log line; 4xx/5xx are always logged
+LOG_SAMPLE_RATE = float(os.environ.get("ML_LOG_SAMPLE_RATE", "0.01"))
 
 sys.path.append(SRC_DIR)
 
-from predict import HabitRecommender
+from model_holder import ModelHolder
+from artifacts import ArtifactError
+from admission import SHED_REASONS, AdmissionController, queue_seconds
+from cache import ResponseCache, SingleFlight, canonical_profile_key
+from metrics import MetricsRegistry, ProfileSampler, stage_clock
+from logging_setup import new_request_id, request_id_var, setup_logging
+from json_fragments import JSON_BACKEND, batch_body, predict_body
+
+# Records go through a queue to a background writer thread, so request
+# threads never block on stdout
+setup_logging(LOG_LEVEL, LOG_FORMAT)
+# The dev server's own per-request lines are replaced by the sampled access log
+logging.getLogger("werkzeug").setLevel(logging.WARNING)
+logger = logging.getLogger("habivance.api")
 
 # ------------------------------------------------------------------
 # Flask app
@@ -20,29 +71,284 @@ from predict import HabitRecommender
 app = Flask(__name__)
 CORS(app)
 
+# Per-worker latency summaries and request counters, served on /metrics
+metrics = MetricsRegistry() if METRICS_ENABLED else None
+profile_sampler = ProfileSampler(PROFILE_SAMPLE_RATE, PROFILE_DIR)
+
 # ------------------------------------------------------------------
 # Model initialization (RUNS ON GUNICORN START)
 # ------------------------------------------------------------------
-print("=" * 50)
-print("Habivance ML API – Startup")
-print("=" * 50)
-
-print("BASE_DIR:", BASE_DIR)
-print("MODEL_DIR:", MODEL_DIR)
-print("Model dir exists:", os.path.exists(MODEL_DIR))
+logger.info(
+    "Starting Habivance ML API",
+    extra={
+        "model_dir": MODEL_DIR,
+        "model_dir_exists": os.path.exists(MODEL_DIR),
+        "model_files": sorted(os.listdir(MODEL_DIR)) if os.path.exists(MODEL_DIR) else []
+    }
+)
 
-if os.path.exists(MODEL_DIR):
-    print("Files in model dir:", os.listdir(MODEL_DIR))
+# Routes read model_holder.current once per request, so a reload swaps
+# the model without affecting in-flight predictions
+model_holder = ModelHolder(
+    MODEL_DIR,
+    compiled=COMPILED_MODEL,
+    flat=FLAT_MODEL,
+    similarity=SIMILARITY_MODEL,
+    bundle=INFERENCE_BUNDLE,
+    mmap=MMAP_ARTIFACTS,
+    metrics=metrics
+)
 
+load_info = {}
 try:
-    recommender = HabitRecommender(MODEL_DIR)
-    print("✓ Habit Recommender initialized successfully!")
-except Exception as e:
-    recommender = None
-    print("✗ Failed to initialize Habit Recommender")
-    print("ERROR:", str(e))
+    load_info = model_holder.reload()
+except ArtifactError:
+    # The message names every bad file; a traceback adds nothing
+    logger.error("Failed to initialize Habit Recommender", extra={"error": model_holder.last_error})
+except Exception:
+    logger.exception("Failed to initialize Habit Recommender")
+
+# Serve 503s meanwhile, but pick the model up once the artifacts are fixed
+if model_holder.current is None and LOAD_RETRY_MAX_DELAY > 0:
+    model_holder.retry_in_background(max_delay=LOAD_RETRY_MAX_DELAY)
+
+if RELOAD_INTERVAL > 0:
+    model_holder.watch(RELOAD_INTERVAL)
+
+# Imports plus model load, reported so cold-start regressions are visible
+STARTUP_SECONDS = round(time.perf_counter() - STARTUP_BEGAN, 3)
+logger.info(
+    "Startup complete",
+    extra={
+        "model_loaded": model_holder.current is not None,
+        "model_version": load_info.get("model_version"),
+        "load_seconds": load_info.get("load_seconds"),
+        "artifact_bytes": load_info.get("artifact_bytes"),
+        "artifact_sizes": load_info.get("artifact_sizes"),
+        "startup_seconds": STARTUP_SECONDS,
+        "json_fragments": JSON_FRAGMENTS,
+        "json_backend": JSON_BACKEND,
+        "heavy_modules": sorted(m for m in ("pandas", "sklearn", "joblib") if m in sys.modules),
+        "reload_interval": RELOAD_INTERVAL
+    }
+)
+
+# Predictions keyed on the normalized profile; 0 disables caching
+response_cache = ResponseCache(max_size=CACHE_SIZE, ttl=CACHE_TTL)
+inflight = SingleFlight()
+# In-flight limit, latency estimate and shed counts for the prediction routes
+admission = AdmissionController(MAX_IN_FLIGHT, MAX_WAIT_MS, concurrency=SERVING_CONCURRENCY)
+ADMISSION_ROUTES = ("/predict", "/predict/batch")
+
+# ------------------------------------------------------------------
+# Request helpers
+# ------------------------------------------------------------------
+
+VALID_BMI = ["underweight", "normal", "overweight", "obese"]
+
+
+def parse_top_k(value):
+    """topK as a non-negative int (digit strings accepted); returns (top_k, error message)"""
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        return None, "topK must be a non-negative integer"
+    return value, None
+
+
+def parse_profile(data, default_top_k=5):
+    """Validate a prediction payload; returns (profile, error message)"""
+    if not isinstance(data, dict):
+        return None, "Each profile must be a JSON object"
+
+    bmi_category = data.get("bmiCategory")
+    health_issues = data.get("healthIssues")
+    goals = data.get("goals")
+
+    if not bmi_category or not goals:
+        return None, "bmiCategory and goals are required"
+
+    if not isinstance(bmi_category, str) or not isinstance(goals, str):
+        return None, "bmiCategory and goals must be strings"
+
+    if bmi_category not in VALID_BMI:
+        return None, f"bmiCategory must be one of {VALID_BMI}"
+
+    if health_issues is None:
+        health_issues = []
+    elif not isinstance(health_issues, list):
+        health_issues = [health_issues]
+    if not all(isinstance(issue, str) for issue in health_issues):
+        return None, "healthIssues must be strings"
+
+    top_k, error = parse_top_k(data.get("topK", default_top_k))
+    if error:
+        return None, error
+
+    return {
+        "bmi_category": bmi_category,
+        "health_issues": health_issues,
+        "goals": goals,
+        "top_k": top_k
+    }, None
+
+
+def profile_key(profile):
+    """Canonical key of a validated profile"""
+    return canonical_profile_key(
+        profile["bmi_category"],
+        profile["health_issues"],
+        profile["goals"],
+        profile["top_k"]
+    )
+
+
+def profile_cache_key(model, profile):
+    """Cache key for a profile served by model, or None when caching is off"""
+    if not response_cache.enabled:
+        return None
+
+    response_cache.bind(model)
+    return profile_key(profile)
+
+
+def flight_key(model, profile):
+    """Key under which identical concurrent requests to the same model coalesce"""
+    return (id(model), profile_key(profile))
+
+
+def cached_predict(model, profile):
+    """
+    Serve a prediction from the response cache, computing it on a miss;
+    concurrent identical misses wait for one computation. With
+    JSON_FRAGMENTS the recommendations are a serialized JSON array.
+    """
+    key = profile_cache_key(model, profile)
+    if key is not None:
+        recommendations = response_cache.get(key)
+        if recommendations is not None:
+            return recommendations
+
+    def compute():
+        recommendations = model.predict_habits(
+            bmi_category=profile["bmi_category"],
+            health_issues=profile["health_issues"],
+            goals=profile["goals"],
+            top_k=profile["top_k"],
+            as_json=JSON_FRAGMENTS
+        )
+        if key is not None:
+            response_cache.set(key, recommendations, model)
+        return recommendations
+
+    if not COALESCE_REQUESTS:
+        return compute()
+    return inflight.do(flight_key(model, profile), compute)
+
+
+# ------------------------------------------------------------------
+# Request instrumentation
+# ------------------------------------------------------------------
+
+def route_name():
+    """The matched URL rule, so label values stay bounded"""
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.request_id = new_request_id(request.headers.get("X-Request-ID"))
+    g.request_id_token = request_id_var.set(g.request_id)
+    g.clock = stage_clock(metrics)
+    g.profiler = profile_sampler.start()
+
+
+def shed_response(reason, retry_after):
+    """503 for a request turned away by admission control"""
+    response = jsonify({
+        "error": "Service overloaded",
+        "message": f"Too much work in flight ({reason}), retry later"
+    })
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 503
+
+
+@app.before_request
+def admit_request():
+    # Registered after start_request_timing, so shed requests are still
+    # timed, counted and logged
+    if route_name() not in ADMISSION_ROUTES:
+        return None
+
+    admitted, reason, retry_after = admission.try_acquire(
+        queue_seconds(request.headers.get("X-Request-Start"))
+    )
+    if not admitted:
+        return shed_response(reason, retry_after)
+    g.admitted = True
+    return None
+
+
+def record_request_metrics(route, method, status, seconds):
+    """Count one finished request and observe its latency"""
+    if metrics is None:
+        return
+
+    metrics.observe("habivance_request_seconds", seconds, route=route)
+    metrics.increment("habivance_requests_total", route=route, method=method, status=status)
+    if status >= 500:
+        metrics.increment("habivance_request_errors_total", route=route)
+
+
+def log_request(route, method, status, seconds):
+    """Access log line: every failed request, a sample of successful ones"""
+    if status < 400 and (LOG_SAMPLE_RATE <= 0 or random.random() >= LOG_SAMPLE_RATE):
+        return
+
+    logger.log(
+        logging.WARNING if status >= 500 else logging.INFO,
+        "request",
+        extra={
+            "route": route,
+            "method": method,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 3)
+        }
+    )
+
+
+@app.after_request
+def record_request(response):
+    route = route_name()
+
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profile_sampler.stop(profiler, f"{request.method} {route}")
+        if metrics is not None:
+            metrics.increment("habivance_profiles_total", route=route)
+
+    seconds = time.perf_counter() - g.request_started
+    record_request_metrics(route, request.method, response.status_code, seconds)
+    log_request(route, request.method, response.status_code, seconds)
+    response.headers["X-Request-ID"] = g.request_id
+    return response
+
+
+@app.teardown_request
+def release_admission(exc):
+    if g.pop("admitted", False):
+        # Batch latencies would skew the per-request estimate
+        seconds = time.perf_counter() - g.request_started
+        admission.release(seconds if route_name() == "/predict" else None)
+
+
+@app.teardown_request
+def clear_request_id(exc):
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        request_id_var.reset(token)
 
-print("=" * 50)
 
 # ------------------------------------------------------------------
 # Routes
@@ -50,6 +356,7 @@ print("=" * 50)
 
 @app.route("/", methods=["GET"])
 def home():
+    recommender = model_holder.current
     return jsonify({
         "message": "Habivance ML API",
         "version": "1.0.0",
@@ -57,27 +364,39 @@ def home():
         "endpoints": {
             "health": "/health",
             "predict": "/predict (POST)",
-            "model_info": "/model-info"
+            "predict_batch": "/predict/batch (POST)",
+            "model_info": "/model-info",
+            "cache_stats": "/cache-stats",
+            "coalesce_stats": "/coalesce-stats",
+            "admission_stats": "/admission-stats",
+            "metrics": "/metrics",
+            "reload": "/admin/reload (POST)"
         }
     }), 200
 
 
 @app.route("/health", methods=["GET"])
 def health():
+    recommender = model_holder.current
     if recommender is None:
         return jsonify({
             "status": "error",
-            "message": "Model not loaded"
+            "message": "Model not loaded",
+            "error": model_holder.last_error
         }), 503
 
+    # 503 while degraded, so load balancers route around a hot instance
+    status = admission.status()
     return jsonify({
-        "status": "healthy",
-        "model_loaded": True
-    }), 200
+        "status": status,
+        "model_loaded": True,
+        "in_flight": admission.in_flight
+    }), 200 if status == "healthy" else 503
 
 
 @app.route("/predict", methods=["POST"])
 def predict():
+    recommender = model_holder.current
     if recommender is None:
         return jsonify({
             "error": "Model not loaded"
@@ -89,57 +408,117 @@ def predict():
             "error": "Invalid JSON body"
         }), 400
 
-    bmi_category = data.get("bmiCategory")
-    health_issues = data.get("healthIssues", [])
-    goals = data.get("goals")
-    top_k = data.get("topK", 5)
+    profile, error = parse_profile(data)
+    if error:
+        return jsonify({
+            "error": error
+        }), 400
+    g.clock.lap("route.predict.parse")
 
-    if not bmi_category or not goals:
+    try:
+        recommendations = cached_predict(recommender, profile)
+        g.clock.lap("route.predict.model")
+
+        if JSON_FRAGMENTS:
+            response = Response(predict_body(recommendations), mimetype="application/json")
+        else:
+            response = jsonify({
+                "success": True,
+                "data": {
+                    "recommendations": recommendations
+                }
+            })
+        g.clock.lap("route.predict.serialize")
+        return response, 200
+
+    except Exception as e:
+        logger.exception("Prediction failed")
+        return jsonify({
+            "error": "Prediction failed",
+            "message": str(e)
+        }), 500
+
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    recommender = model_holder.current
+    if recommender is None:
         return jsonify({
-            "error": "bmiCategory and goals are required"
+            "error": "Model not loaded"
+        }), 503
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("profiles"), list):
+        return jsonify({
+            "error": "Body must be a JSON object with a 'profiles' list"
         }), 400
 
-    valid_bmi = ["underweight", "normal", "overweight", "obese"]
-    if bmi_category not in valid_bmi:
+    items = data["profiles"]
+    if len(items) > MAX_BATCH_SIZE:
         return jsonify({
-            "error": f"bmiCategory must be one of {valid_bmi}"
+            "error": f"At most {MAX_BATCH_SIZE} profiles per batch"
         }), 400
 
-    if not isinstance(health_issues, list):
-        health_issues = [health_issues]
+    default_top_k, error = parse_top_k(data.get("topK", 5))
+    if error:
+        return jsonify({
+            "error": error
+        }), 400
 
-    try:
-        recommendations = recommender.predict_habits(
-            bmi_category=bmi_category,
-            health_issues=health_issues,
-            goals=goals,
-            top_k=top_k
-        )
+    results = [None] * len(items)
+    profiles = []
+    positions = []
 
-        return jsonify({
-            "success": True,
-            "data": {
-                "recommendations": recommendations
-            }
-        }), 200
+    # Invalid items get their own error instead of failing the batch
+    for i, item in enumerate(items):
+        profile, error = parse_profile(item, default_top_k)
+        if error:
+            results[i] = {"error": error}
+        else:
+            profiles.append(profile)
+            positions.append(i)
+    g.clock.lap("route.predict_batch.parse")
 
+    try:
+        predictions = recommender.predict_habits_batch(
+            profiles, top_k=default_top_k, as_json=JSON_FRAGMENTS
+        )
+        g.clock.lap("route.predict_batch.model")
     except Exception as e:
-        print("Prediction error:", str(e))
+        logger.exception("Batch prediction failed")
         return jsonify({
             "error": "Prediction failed",
             "message": str(e)
         }), 500
 
+    for i, prediction in zip(positions, predictions):
+        results[i] = prediction
+
+    if JSON_FRAGMENTS:
+        response = Response(batch_body(results), mimetype="application/json")
+    else:
+        response = jsonify({
+            "success": True,
+            "data": {
+                "results": results
+            }
+        })
+    g.clock.lap("route.predict_batch.serialize")
+    return response, 200
+
 
 @app.route("/model-info", methods=["GET"])
 def model_info():
+    recommender = model_holder.current
     if recommender is None:
         return jsonify({
             "error": "Model not loaded"
         }), 503
 
     try:
-        info = recommender.get_model_info()
+        info = dict(recommender.get_model_info() or {})
+        info.update(model_holder.info)
+        info["startup_seconds"] = STARTUP_SECONDS
         return jsonify({
             "success": True,
             "data": info
@@ -149,3 +528,89 @@ def model_info():
             "error": "Failed to get model info",
             "message": str(e)
         }), 500
+
+
+@app.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify({
+        "success": True,
+        "data": response_cache.stats()
+    }), 200
+
+
+@app.route("/coalesce-stats", methods=["GET"])
+def coalesce_stats():
+    return jsonify({
+        "success": True,
+        "data": dict(inflight.stats(), enabled=COALESCE_REQUESTS)
+    }), 200
+
+
+@app.route("/admission-stats", methods=["GET"])
+def admission_stats():
+    return jsonify({
+        "success": True,
+        "data": admission.stats()
+    }), 200
+
+
+# Stats that only ever grow are exported as counters (<prefix>_<name>_total),
+# so rate() works on them; the rest are gauges
+CACHE_COUNTERS = {"hits", "misses", "evictions", "expirations", "invalidations", "stale_writes"}
+COALESCE_COUNTERS = {"calls", "computed", "coalesced"}
+ADMISSION_COUNTERS = {"admitted"}
+
+
+def export_stats(prefix, description, stats, counters):
+    """Copy the numeric values of a stats() dict into the metrics registry"""
+    for name, value in stats.items():
+        if name in counters:
+            metrics.set_counter(f"{prefix}_{name}_total", value, help_text=f"{description} {name}")
+        elif isinstance(value, (int, float)):
+            metrics.set_gauge(f"{prefix}_{name}", value, help_text=f"{description} {name}")
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    if metrics is None:
+        return jsonify({
+            "error": "Metrics are disabled"
+        }), 404
+
+    export_stats("habivance_cache", "Response cache", response_cache.stats(), CACHE_COUNTERS)
+    export_stats("habivance_coalesce", "Request coalescing", inflight.stats(), COALESCE_COUNTERS)
+    admission_counts = admission.stats()
+    for reason in SHED_REASONS:
+        metrics.set_counter(
+            "habivance_admission_shed_total", admission_counts.pop(f"shed_{reason}"),
+            help_text="Requests shed by admission control, by reason", reason=reason
+        )
+    admission_counts.pop("shed")
+    export_stats("habivance_admission", "Admission control", admission_counts, ADMISSION_COUNTERS)
+    metrics.set_gauge(
+        "habivance_model_loaded", int(model_holder.current is not None),
+        help_text="1 when a model is loaded"
+    )
+
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    # Constant-time comparison, so response timing doesn't leak the token
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({
+            "error": "Forbidden"
+        }), 403
+
+    if not model_holder.reload_in_background():
+        return jsonify({
+            "error": "Reload already in progress"
+        }), 409
+
+    return jsonify({
+        "success": True,
+        "message": "Reload started",
+        "current": model_holder.info
+    }), 202
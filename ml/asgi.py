@@ -0,0 +1,222 @@
+"""
+ASGI entry point for the Habivance ML API
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5001 --workers 4
+
+POST /predict is served natively: after the same admission control,
+validation, response cache and request coalescing as app.py, its inference goes through a
+MicroBatcher that groups concurrent requests into one
+predict_habits_batch call on a thread pool.
+Every other route is the Flask app from app.py behind asgiref's WSGI
+adapter, so routes, validation and responses are shared.
+
+Tuning:
+    ML_BATCH_MAX_SIZE     largest batch (default 32)
+    ML_BATCH_MAX_WAIT_MS  how long a request waits for others (default 5)
+    ML_BATCH_WORKERS      batches running at once (default 2)
+"""
+import json
+import logging
+import os
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (
+    COALESCE_REQUESTS, JSON_FRAGMENTS, admission, app as flask_app, flight_key, inflight,
+    model_holder, parse_profile, profile_cache_key, log_request, record_request_metrics, response_cache
+)
+from admission import queue_seconds
+from batcher import MicroBatcher
+from json_fragments import dumps, predict_body
+from logging_setup import new_request_id, request_id_var
+
+BATCH_MAX_SIZE = int(os.environ.get("ML_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("ML_BATCH_MAX_WAIT_MS", "5"))
+BATCH_WORKERS = int(os.environ.get("ML_BATCH_WORKERS", "2"))
+
+logger = logging.getLogger("habivance.asgi")
+
+
+def run_batch(profiles):
+    """Runs on the batcher's thread pool"""
+    recommender = model_holder.current
+    if recommender is None:
+        raise RuntimeError("Model not loaded")
+    return recommender.predict_habits_batch(profiles, as_json=JSON_FRAGMENTS)
+
+
+batcher = MicroBatcher(
+    run_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_workers=BATCH_WORKERS
+)
+wsgi_application = WsgiToAsgi(flask_app)
+
+# Every batch slot serves a request in parallel, unless set explicitly
+if "ML_SERVING_CONCURRENCY" not in os.environ:
+    admission.concurrency = BATCH_MAX_SIZE * BATCH_WORKERS
+
+
+# ------------------------------------------------------------------
+# Native routes
+# ------------------------------------------------------------------
+
+def is_json(scope):
+    # Other content types get Flask's own 415 response
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            return value.split(b";")[0].strip().lower() == b"application/json"
+    return False
+
+
+def header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_json(send, payload, status, extra_headers=()):
+    # Same layout as Flask's jsonify in production
+    return await send_body(send, dumps(payload) + b"\n", status, extra_headers)
+
+
+async def send_body(send, body, status, extra_headers=()):
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"access-control-allow-origin", b"*"),
+        *extra_headers
+    ]
+    request_id = request_id_var.get()
+    if request_id:
+        headers.append((b"x-request-id", request_id.encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+    return status
+
+
+async def predict_profile(recommender, profile):
+    """
+    Cached or micro-batched prediction for one validated profile;
+    identical profiles already waiting on the batcher share its result
+    """
+    key = profile_cache_key(recommender, profile)
+    if key is not None:
+        recommendations = response_cache.get(key)
+        if recommendations is not None:
+            return recommendations
+
+    async def compute():
+        # Fail this request alone rather than the batch it would join;
+        # parse_profile already made top_k an int, and 0 means no habits
+        result = await batcher.submit(profile)
+        if "error" in result:
+            raise ValueError(result["error"])
+
+        recommendations = result["recommendations"]
+        if key is not None:
+            response_cache.set(key, recommendations, recommender)
+        return recommendations
+
+    if not COALESCE_REQUESTS:
+        return await compute()
+    return await inflight.do_async(flight_key(recommender, profile), compute)
+
+
+async def predict(scope, receive, send):
+    admitted, reason, retry_after = admission.try_acquire(
+        queue_seconds(header(scope, b"x-request-start"))
+    )
+    if not admitted:
+        return await send_json(send, {
+            "error": "Service overloaded",
+            "message": f"Too much work in flight ({reason}), retry later"
+        }, 503, [(b"retry-after", str(retry_after).encode())])
+
+    started = time.perf_counter()
+    try:
+        return await predict_admitted(receive, send)
+    finally:
+        admission.release(time.perf_counter() - started)
+
+
+async def predict_admitted(receive, send):
+    body = await read_body(receive)
+
+    recommender = model_holder.current
+    if recommender is None:
+        return await send_json(send, {"error": "Model not loaded"}, 503)
+
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        data = None
+    if not data:
+        return await send_json(send, {"error": "Invalid JSON body"}, 400)
+
+    profile, error = parse_profile(data)
+    if error:
+        return await send_json(send, {"error": error}, 400)
+
+    try:
+        recommendations = await predict_profile(recommender, profile)
+    except Exception as e:
+        logger.exception("Prediction failed")
+        return await send_json(send, {"error": "Prediction failed", "message": str(e)}, 500)
+
+    if JSON_FRAGMENTS:
+        return await send_body(send, predict_body(recommendations), 200)
+    return await send_json(send, {
+        "success": True,
+        "data": {
+            "recommendations": recommendations
+        }
+    }, 200)
+
+
+async def batcher_stats(send):
+    return await send_json(send, {"success": True, "data": batcher.stats()}, 200)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            batcher.executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    if scope["type"] == "http":
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        if route == ("POST", "/predict") and is_json(scope):
+            started = time.perf_counter()
+            # Each ASGI request runs in its own task, so this stays per-request
+            request_id_var.set(new_request_id(header(scope, b"x-request-id")))
+            status = await predict(scope, receive, send)
+            seconds = time.perf_counter() - started
+            record_request_metrics("/predict", "POST", status, seconds)
+            log_request("/predict", "POST", status, seconds)
+            return
+        if route == ("GET", "/batcher-stats"):
+            return await batcher_stats(send)
+
+    return await wsgi_application(scope, receive, send)
@@ -0,0 +1,59 @@
+"""
+Cold-start benchmark: time a fresh interpreter importing app.py
+
+Each run starts a new Python process, the way a gunicorn worker boots,
+and reports wall time plus the startup_seconds app.py logs.
+
+Run from the ml/ directory:
+    python benchmarks/cold_start.py --runs 5
+    ML_INFERENCE_BUNDLE=true python benchmarks/cold_start.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def boot_once():
+    """Import app.py in a new interpreter; returns (wall seconds, reported seconds)"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', 'import app'],
+        cwd=ML_DIR, capture_output=True, text=True, check=True,
+        env=dict(os.environ, ML_LOG_FORMAT='json', ML_LOG_LEVEL='INFO')
+    )
+    wall = time.perf_counter() - started
+
+    reported = None
+    for line in result.stdout.splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(entry, dict) and 'startup_seconds' in entry:
+            reported = entry['startup_seconds']
+    return wall, reported
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    walls, reported = [], []
+    for _ in range(args.runs):
+        wall, startup = boot_once()
+        walls.append(wall)
+        if startup is not None:
+            reported.append(startup)
+
+    print(f"runs: {args.runs}")
+    print(f"process wall time (s): median {statistics.median(walls):.3f}, max {max(walls):.3f}")
+    if reported:
+        print(f"app startup time (s): median {statistics.median(reported):.3f}, max {max(reported):.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Dataset preprocessing: vectorized vs row-wise encoding, in memory and streamed
+
+Writes a synthetic copy of data/habit_dataset.csv enlarged to --rows rows
+(sampled with replacement), then times each mode in a fresh interpreter
+and reports its encoding rate (CSV parsing excluded where possible)
+and peak RSS:
+
+    rowwise   the previous per-row .apply parsing plus the sklearn
+              encoders, on the first --rowwise-rows rows
+    memory    HabitDataPreprocessor.fit + transform_dataset on the whole CSV
+    stream    fit_csv + iter_transform_csv in --chunksize row chunks
+
+Run from the ml/ directory:
+    python benchmarks/dataset_preprocessing.py --rows 2000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ML_DIR, 'src'))
+DATASET = os.path.join(ML_DIR, 'data', 'habit_dataset.csv')
+
+def enlarge_dataset(path, n_rows, seed=0):
+    """Write n_rows rows sampled from the real dataset to path"""
+    import numpy as np
+    import pandas as pd
+
+    df = pd.read_csv(DATASET)
+    rows = np.random.default_rng(seed).integers(0, len(df), n_rows)
+    df.iloc[rows].to_csv(path, index=False)
+
+def rowwise_transform(preprocessor, df):
+    """The per-row parsing train.py used before vectorization, as a baseline"""
+    import numpy as np
+    import pandas as pd
+
+    df['bmiCategory'] = df['bmiCategory'].str.lower().str.replace(" ", "")
+    df['goals'] = df['goals'].str.lower().str.replace(" ", "")
+    df['healthIssues_list'] = df['healthIssues'].apply(
+        lambda x: [issue.strip().lower().replace(" ", "") for issue in str(x).split(',')]
+        if pd.notna(x) and x != 'none' else []
+    )
+    X = np.column_stack([
+        preprocessor.le_bmi.transform(df['bmiCategory']),
+        preprocessor.le_goals.transform(df['goals']),
+        preprocessor.mlb_health.transform(df['healthIssues_list'])
+    ])
+    y = preprocessor.le_habit.transform(df['recommendedHabit'])
+    return X, y
+
+def run_mode(mode, csv_path, chunksize, rowwise_rows):
+    """Time one mode in this process; returns a result dict"""
+    import pandas as pd
+    from preprocess import HabitDataPreprocessor
+
+    started = time.perf_counter()
+    preprocessor = HabitDataPreprocessor()
+    if mode == 'stream':
+        # Reading and encoding are interleaved, so both count as encoding
+        read_seconds = 0.0
+        preprocessor.fit_csv(csv_path, chunksize=chunksize)
+        rows = 0
+        for X, y in preprocessor.iter_transform_csv(csv_path, chunksize=chunksize):
+            rows += len(y)
+    else:
+        df = pd.read_csv(csv_path, nrows=rowwise_rows if mode == 'rowwise' else None)
+        read_seconds = time.perf_counter() - started
+        preprocessor.fit(df)
+        if mode == 'rowwise':
+            X, y = rowwise_transform(preprocessor, df)
+        else:
+            X, y = preprocessor.transform_dataset(df)
+        rows = len(y)
+    encode_seconds = time.perf_counter() - started - read_seconds
+
+    return {
+        'mode': mode,
+        'rows': rows,
+        'read_seconds': round(read_seconds, 3),
+        'encode_seconds': round(encode_seconds, 3),
+        'rows_per_second': round(rows / encode_seconds),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--chunksize', type=int, default=200000)
+    parser.add_argument('--rowwise-rows', type=int, default=500000,
+                        help="rows for the slow row-wise baseline")
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.csv, args.chunksize, args.rowwise_rows)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'habit_dataset_large.csv')
+        enlarge_dataset(csv_path, args.rows)
+        print(f"Synthetic dataset: {args.rows} rows, {os.path.getsize(csv_path) / 1e6:.0f} MB")
+
+        print(f"{'mode':>8} {'rows':>9} {'read s':>8} {'encode s':>9} {'rows/s':>10} {'peak MB':>8}")
+        for mode in ('rowwise', 'memory', 'stream'):
+            # A fresh interpreter per mode so peak RSS isn't shared
+            output = subprocess.run(
+                [sys.executable, __file__, '--mode', mode, '--csv', csv_path,
+                 '--chunksize', str(args.chunksize), '--rowwise-rows', str(args.rowwise_rows)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.splitlines()[-1])
+            print(f"{mode:>8} {result['rows']:>9} {result['read_seconds']:>8.2f} "
+                  f"{result['encode_seconds']:>9.2f} {result['rows_per_second']:>10} "
+                  f"{result['peak_rss_mb']:>8.1f}")
+
+if __name__ == '__main__':
+    main()
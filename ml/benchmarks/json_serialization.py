@@ -0,0 +1,75 @@
+"""
+Per-request cost of building and serializing a /predict response body
+
+Starting from the ordered class indices HabitRecommender picked, times:
+
+    jsonify     build recommendation dicts, Flask's jsonify (stdlib json)
+    json        build recommendation dicts, json.dumps with the same layout
+    orjson      build recommendation dicts, orjson.dumps (when installed)
+    fragments   join the per-habit JSON serialized at model load
+
+and checks that the fragments body is byte-identical to jsonify's.
+
+Run from the ml/ directory after training:
+    python benchmarks/json_serialization.py --top-k 5 8 12
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import warnings
+
+import numpy as np
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ML_DIR, 'src'))
+
+def best_seconds(fn, repeat=5):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--models', default=os.path.join(ML_DIR, 'models'))
+    parser.add_argument('--top-k', type=int, nargs='+', default=[5, 8, 12])
+    args = parser.parse_args()
+
+    from flask import Flask, jsonify
+    from json_fragments import orjson, predict_body
+    from predict import HabitRecommender
+
+    warnings.simplefilter('ignore')
+    recommender = HabitRecommender(args.models)
+    app = Flask(__name__)
+    n_classes = len(recommender.preprocessor.habit_classes)
+    rng = np.random.default_rng(0)
+
+    def envelope(recommendations):
+        return {'success': True, 'data': {'recommendations': recommendations}}
+
+    methods = {
+        'jsonify': lambda indices: jsonify(envelope(recommender._build_recommendations(indices))).get_data(),
+        'json': lambda indices: (json.dumps(
+            envelope(recommender._build_recommendations(indices)), sort_keys=True, separators=(',', ':')
+        ) + '\n').encode(),
+    }
+    if orjson is not None:
+        methods['orjson'] = lambda indices: orjson.dumps(
+            envelope(recommender._build_recommendations(indices)), option=orjson.OPT_SORT_KEYS
+        ) + b'\n'
+    methods['fragments'] = lambda indices: predict_body(recommender.fragments.join(indices))
+
+    print(f"Habit classes: {n_classes}, orjson: {'yes' if orjson is not None else 'not installed'}")
+    print(f"{'top_k':>6}" + ''.join(f"{f'{name} us':>14}" for name in methods) + f"{'speedup':>9}{'identical':>10}")
+    with app.app_context():
+        for top_k in args.top_k:
+            indices = rng.choice(n_classes, size=min(top_k, n_classes), replace=False)
+            seconds = {name: best_seconds(lambda: method(indices)) for name, method in methods.items()}
+            identical = methods['fragments'](indices) == methods['jsonify'](indices)
+            print(f"{top_k:>6}" + ''.join(f"{seconds[name] * 1e6:>14.1f}" for name in methods)
+                  + f"{seconds['jsonify'] / seconds['fragments']:>8.1f}x{str(identical):>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Load test: concurrent POST /predict against a running server
+
+Sends the same mix of profiles from many threads over keep-alive
+connections and reports throughput and latency percentiles, so the
+Flask/gunicorn and ASGI/uvicorn entry points can be compared.
+
+Run from the ml/ directory, with a server already listening:
+    gunicorn -w 4 -b 127.0.0.1:5001 app:app
+    python benchmarks/load_test.py --port 5001 --concurrency 32 --requests 4000
+
+    uvicorn asgi:application --port 5002 --workers 4
+    python benchmarks/load_test.py --port 5002 --concurrency 32 --requests 4000
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+
+BMI = ['normal', 'overweight', 'obese', 'underweight']
+GOALS = ['weightloss', 'musclegain', 'mentalhealth', 'hearthealth', 'endurance', 'flexibility']
+HEALTH = ['diabetes', 'hypertension', 'asthma', 'backpain', 'anxiety', 'insomnia', 'stress', 'fatigue']
+
+def make_profiles(count, seed=0):
+    """Random request bodies, mostly distinct so the response cache rarely hits"""
+    rng = random.Random(seed)
+    return [
+        json.dumps({
+            'bmiCategory': rng.choice(BMI),
+            'healthIssues': rng.sample(HEALTH, rng.randint(0, 2)),
+            'goals': rng.choice(GOALS),
+            'topK': rng.randint(3, 8)
+        })
+        for _ in range(count)
+    ]
+
+def worker(host, port, bodies, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {'Content-Type': 'application/json'}
+    for body in bodies:
+        started = time.perf_counter()
+        try:
+            conn.request('POST', '/predict', body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=4000)
+    args = parser.parse_args()
+
+    bodies = make_profiles(args.requests)
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(args.host, args.port, bodies[i::args.concurrency], latencies, errors)
+        )
+        for i in range(args.concurrency)
+    ]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"requests: {len(latencies)} ok, {len(errors)} failed in {elapsed:.2f}s")
+    if latencies:
+        print(f"throughput: {len(latencies) / elapsed:.1f} req/s")
+        print(f"latency ms: mean {statistics.mean(latencies) * 1000:.1f}  "
+              f"p50 {percentile(latencies, 50) * 1000:.1f}  "
+              f"p95 {percentile(latencies, 95) * 1000:.1f}  "
+              f"p99 {percentile(latencies, 99) * 1000:.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Similarity index vs forest: recommendation quality and latency
+
+Loads the trained artifacts three ways (sklearn forest, FlatForest and
+the habit profile index), re-encodes the dataset with the saved
+preprocessor and, on the same held-out rows train.py tested on, reports:
+
+    hit@k        share of rows whose habit is among the top k
+    ndcg@k       position of the habit in the served list (evaluation.py)
+    agreement    mean overlap of each backend's top-k with the forest's
+    1-row us     HabitRecommender.predict_habits, median over profiles
+    batch rows/s HabitRecommender.predict_habits_batch
+
+Run from the ml/ directory after training:
+    python benchmarks/similarity_vs_forest.py --top-k 1 5 8
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+import warnings
+
+import numpy as np
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ML_DIR, 'src'))
+
+BACKENDS = (
+    ('forest', {}),
+    ('flat', {'flat': True}),
+    ('similarity', {'similarity': True}),
+)
+
+def held_out_rows(recommender, csv_path):
+    """Encoded test split (same split_mask as train.py) and its request profiles"""
+    import pandas as pd
+    from train import split_mask
+
+    df = pd.read_csv(csv_path)
+    X, y = recommender.preprocessor.transform_dataset(df)
+    is_test = split_mask(len(y))
+    test = df[is_test]
+    profiles = [
+        {
+            'bmi_category': bmi.lower().replace(' ', ''),
+            'health_issues': recommender.preprocessor._parse_health_issues(issues),
+            'goals': goals
+        }
+        for bmi, issues, goals in zip(test['bmiCategory'], test['healthIssues'], test['goals'])
+    ]
+    return X[is_test], y[is_test], profiles
+
+def ranked_classes(model, X, top_k):
+    from ranking import top_k_indices
+
+    return model.classes_[top_k_indices(model.predict_proba(X), top_k)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--models', default=os.path.join(ML_DIR, 'models'))
+    parser.add_argument('--data', default=os.path.join(ML_DIR, 'data', 'habit_dataset.csv'))
+    parser.add_argument('--top-k', type=int, nargs='+', default=[1, 5, 8])
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    from evaluation import evaluate_recommender
+    from predict import HabitRecommender
+
+    warnings.simplefilter('ignore')
+    recommenders = {name: HabitRecommender(args.models, **options) for name, options in BACKENDS}
+    X_test, y_test, profiles = held_out_rows(recommenders['forest'], args.data)
+    if not len(y_test):
+        sys.exit("No held-out rows: the dataset is too small for train.py's split")
+    batch = [profiles[i % len(profiles)] for i in range(args.batch_size)]
+    max_k = max(args.top_k)
+    forest_ranked = ranked_classes(recommenders['forest'].model, X_test, max_k)
+
+    print(f"Held-out rows: {len(y_test)}, classes: {len(recommenders['forest'].preprocessor.habit_classes)}")
+    header = (''.join(f"{f'hit@{k}':>8}" for k in args.top_k) + ''.join(f"{f'ndcg@{k}':>9}" for k in args.top_k)
+              + ''.join(f"{f'agree@{k}':>10}" for k in args.top_k))
+    print(f"{'backend':>10}{header}{'1-row us':>11}{'batch rows/s':>14}")
+
+    for name, recommender in recommenders.items():
+        ranked = ranked_classes(recommender.model, X_test, max_k)
+        metrics = evaluate_recommender(recommender, X_test, y_test, args.top_k)
+        agreement = [
+            float(np.mean([len(set(a[:k]) & set(b[:k])) / k for a, b in zip(ranked, forest_ranked)]))
+            for k in args.top_k
+        ]
+
+        single = []
+        for profile in profiles:
+            started = time.perf_counter()
+            recommender.predict_habits(top_k=max_k, **profile)
+            single.append(time.perf_counter() - started)
+        timer = timeit.Timer(lambda: recommender.predict_habits_batch(batch, top_k=max_k))
+        number, _ = timer.autorange()
+        batch_seconds = min(timer.repeat(repeat=3, number=number)) / number
+
+        print(f"{name:>10}" + ''.join(f"{metrics[f'hit@{k}']:>8.3f}" for k in args.top_k)
+              + ''.join(f"{metrics[f'ndcg@{k}']:>9.3f}" for k in args.top_k)
+              + ''.join(f"{share:>10.3f}" for share in agreement)
+              + f"{np.median(single) * 1e6:>11.1f}{args.batch_size / batch_seconds:>14.0f}")
+
+if __name__ == '__main__':
+    main()
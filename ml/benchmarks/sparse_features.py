@@ -0,0 +1,172 @@
+"""
+Dense vs sparse (CSR) features for a large health issue vocabulary
+
+Writes a synthetic dataset sampled from data/habit_dataset.csv where each
+row also gets up to --extra-issues conditions drawn from a vocabulary of
+--vocabulary synthetic ones, then runs each feature format in a fresh
+interpreter and reports:
+
+    encode    fit + transform_dataset seconds and the size of X
+    verify    verify_fast_path seconds, the encoder check train.py runs
+    fit       seconds to fit a small forest single-threaded
+    peak      peak RSS after encoding and after fitting
+    predict   single-row latency (transform_input + predict_proba) and
+              batch throughput (transform_batch + predict_proba), with
+              the sklearn forest and FlatForest
+
+Run from the ml/ directory:
+    python benchmarks/sparse_features.py --rows 100000 --vocabulary 2000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import warnings
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ML_DIR, 'src'))
+DATASET = os.path.join(ML_DIR, 'data', 'habit_dataset.csv')
+
+BENCH_CONFIG = {
+    'estimator': 'random_forest',
+    'params': {
+        'n_estimators': 20,
+        'min_samples_leaf': 5,
+        'class_weight': 'balanced',
+        'max_features': 'sqrt',
+        'random_state': 42,
+    }
+}
+
+def synthetic_dataset(path, n_rows, vocabulary, extra_issues, seed=0):
+    """Write n_rows sampled rows with synthetic conditions appended to healthIssues"""
+    import numpy as np
+    import pandas as pd
+
+    df = pd.read_csv(DATASET)
+    rng = np.random.default_rng(seed)
+    rows = df.iloc[rng.integers(0, len(df), n_rows)].reset_index(drop=True)
+
+    counts = rng.integers(0, extra_issues + 1, n_rows)
+    conditions = rng.integers(0, vocabulary, (n_rows, extra_issues))
+    issues = []
+    for base, count, row_conditions in zip(rows['healthIssues'], counts, conditions):
+        parts = [] if not isinstance(base, str) or base == 'none' else [base]
+        parts.extend(f'condition{code:05d}' for code in row_conditions[:count])
+        issues.append(','.join(parts) if parts else 'none')
+    rows['healthIssues'] = issues
+    rows.to_csv(path, index=False)
+
+def nbytes(X):
+    if hasattr(X, 'indptr'):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def best_seconds(fn, repeat=5):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def run_format(feature_format, csv_path, batch_size):
+    """Benchmark one feature format in this process; returns a result dict"""
+    import pandas as pd
+    from flat_forest import FlatForest
+    from model_search import build_estimator
+    from preprocess import HabitDataPreprocessor
+
+    warnings.simplefilter('ignore')
+    df = pd.read_csv(csv_path)
+
+    started = time.perf_counter()
+    preprocessor = HabitDataPreprocessor(sparse=feature_format == 'sparse')
+    preprocessor.fit(df)
+    X, y = preprocessor.transform_dataset(df)
+    encode_seconds = time.perf_counter() - started
+    encode_peak = peak_rss_mb()
+
+    started = time.perf_counter()
+    preprocessor.verify_fast_path()
+    verify_seconds = time.perf_counter() - started
+
+    model = build_estimator(BENCH_CONFIG, n_jobs=1)
+    started = time.perf_counter()
+    model.fit(X, y)
+    fit_seconds = time.perf_counter() - started
+    fit_peak = peak_rss_mb()
+    flat = FlatForest.from_sklearn(model)
+
+    sample = df.iloc[:batch_size]
+    bmis = sample['bmiCategory'].tolist()
+    issues = [preprocessor._parse_health_issues(value) for value in sample['healthIssues']]
+    goals = sample['goals'].tolist()
+
+    def single(forest):
+        return forest.predict_proba(preprocessor.transform_input(bmis[0], issues[0], goals[0]))
+
+    def batch(forest):
+        return forest.predict_proba(preprocessor.transform_batch(bmis, issues, goals))
+
+    return {
+        'format': feature_format,
+        'rows': X.shape[0],
+        'features': X.shape[1],
+        'encode_seconds': round(encode_seconds, 3),
+        'verify_seconds': round(verify_seconds, 3),
+        'x_mb': round(nbytes(X) / 1e6, 1),
+        'encode_peak_mb': encode_peak,
+        'fit_seconds': round(fit_seconds, 3),
+        'fit_peak_mb': fit_peak,
+        'single_us': round(best_seconds(lambda: single(model)) * 1e6, 1),
+        'batch_rows_per_s': round(batch_size / best_seconds(lambda: batch(model))),
+        'flat_single_us': round(best_seconds(lambda: single(flat)) * 1e6, 1),
+        'flat_batch_rows_per_s': round(batch_size / best_seconds(lambda: batch(flat)))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--vocabulary', type=int, default=2000,
+                        help="synthetic conditions added to the real health issues")
+    parser.add_argument('--extra-issues', type=int, default=3,
+                        help="most synthetic conditions per row")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--format', help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.format:
+        print(json.dumps(run_format(args.format, args.csv, args.batch_size)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'habit_dataset_vocabulary.csv')
+        synthetic_dataset(csv_path, args.rows, args.vocabulary, args.extra_issues)
+        print(f"Synthetic dataset: {args.rows} rows, up to {args.vocabulary} extra conditions")
+
+        print(f"{'format':>7} {'features':>8} {'encode s':>9} {'verify s':>9} {'X MB':>8} {'peak MB':>8} "
+              f"{'fit s':>7} {'peak MB':>8} {'1-row us':>9} {'rows/s':>8} "
+              f"{'flat us':>8} {'flat rows/s':>11}")
+        for feature_format in ('dense', 'sparse'):
+            # A fresh interpreter per format so peak RSS isn't shared
+            output = subprocess.run(
+                [sys.executable, __file__, '--format', feature_format, '--csv', csv_path,
+                 '--batch-size', str(args.batch_size)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            r = json.loads(output.splitlines()[-1])
+            print(f"{r['format']:>7} {r['features']:>8} {r['encode_seconds']:>9.2f} "
+                  f"{r['verify_seconds']:>9.2f} {r['x_mb']:>8.1f} "
+                  f"{r['encode_peak_mb']:>8.1f} {r['fit_seconds']:>7.2f} {r['fit_peak_mb']:>8.1f} "
+                  f"{r['single_us']:>9.1f} {r['batch_rows_per_s']:>8} "
+                  f"{r['flat_single_us']:>8.1f} {r['flat_batch_rows_per_s']:>11}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""
+Benchmark suite for the recommendation hot path
+
+For each class count, trains a small forest on a synthetic dataset
+generated from data/habit_dataset.csv (habits are split into numbered
+variants to reach the class count), then times:
+
+    load            HabitRecommender construction (pickles, bundle, mmap)
+    transform       transform_input (1 row) and transform_batch
+    predict_proba   sklearn forest and FlatForest
+    top_k           ranking.top_k_indices on the model's probabilities
+    metadata        _build_recommendations for the top 8 of every row
+    route           POST /predict and /predict/batch via Flask's test client
+
+at several batch sizes, and writes the results as JSON.
+
+Run from the ml/ directory:
+    python benchmarks/suite.py run --output before.json
+    python benchmarks/suite.py run --output after.json
+    python benchmarks/suite.py compare before.json after.json --threshold 0.1
+
+compare exits with status 1 when any benchmark got slower than the
+threshold allows.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ML_DIR, 'src'))
+DATASET = os.path.join(ML_DIR, 'data', 'habit_dataset.csv')
+
+# Small enough to train quickly at every class count
+SUITE_CONFIG = {
+    'estimator': 'random_forest',
+    'params': {
+        'n_estimators': 10,
+        'min_samples_leaf': 5,
+        'class_weight': 'balanced',
+        'max_features': 'sqrt',
+        'random_state': 42,
+    }
+}
+TOP_K = 8
+
+def time_call(fn, repeat=5):
+    """Best-of-repeat seconds per call"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def synthetic_dataset(path, n_classes, seed=0):
+    """
+    Write a dataset with about n_classes habits: rows are sampled from the
+    real dataset and each habit is split into numbered variants
+    """
+    import pandas as pd
+
+    df = pd.read_csv(DATASET)
+    n_rows = max(2000, 10 * n_classes)
+    rng = np.random.default_rng(seed)
+    rows = df.iloc[rng.integers(0, len(df), n_rows)].reset_index(drop=True)
+
+    replicas = -(-n_classes // df['recommendedHabit'].nunique())
+    if replicas > 1:
+        variant = rng.integers(0, replicas, n_rows)
+        suffix = np.where(variant > 0, np.char.add(' #', variant.astype(str)), '')
+        rows['recommendedHabit'] = rows['recommendedHabit'] + suffix
+
+    rows.to_csv(path, index=False)
+    return rows
+
+def train_synthetic_model(work_dir, n_classes):
+    """Train SUITE_CONFIG on a synthetic dataset; returns (model dir, dataset)"""
+    from train import train_model
+
+    csv_path = os.path.join(work_dir, f'habits_{n_classes}.csv')
+    model_path = os.path.join(work_dir, f'models_{n_classes}')
+    dataset = synthetic_dataset(csv_path, n_classes)
+
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        train_model(csv_path, model_path, compile_table=False, cv_jobs=1, model_config=SUITE_CONFIG)
+    return model_path, dataset
+
+def sample_profiles(dataset, n_rows, seed=1):
+    """Request profiles drawn from dataset rows"""
+    rng = np.random.default_rng(seed)
+    rows = dataset.iloc[rng.integers(0, len(dataset), n_rows)]
+    profiles = []
+    for _, row in rows.iterrows():
+        issues = row['healthIssues']
+        profiles.append({
+            'bmi_category': row['bmiCategory'],
+            'health_issues': [] if not isinstance(issues, str) or issues == 'none' else issues.split(','),
+            'goals': row['goals']
+        })
+    return profiles
+
+def bench_model(model_path, dataset, batch_sizes, flask_app):
+    """Every benchmark for one trained model; yields result dicts"""
+    from predict import HabitRecommender
+    from ranking import top_k_indices
+
+    for variant, options in (('pickles', {}), ('bundle', {'bundle': True}), ('mmap', {'mmap': True})):
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds = time_call(lambda: HabitRecommender(model_path, **options), repeat=3)
+        yield 'load', variant, 1, seconds
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender = HabitRecommender(model_path)
+        flat = HabitRecommender(model_path, flat=True)
+    preprocessor = recommender.preprocessor
+
+    profiles = sample_profiles(dataset, max(batch_sizes))
+    first = profiles[0]
+    yield 'transform', 'transform_input', 1, time_call(
+        lambda: preprocessor.transform_input(first['bmi_category'], first['health_issues'], first['goals'])
+    )
+
+    for batch_size in batch_sizes:
+        batch = profiles[:batch_size]
+        bmis = [p['bmi_category'] for p in batch]
+        issues = [p['health_issues'] for p in batch]
+        goals = [p['goals'] for p in batch]
+        features = preprocessor.transform_batch(bmis, issues, goals)
+        probabilities = recommender.model.predict_proba(features)
+        ranked = top_k_indices(probabilities, TOP_K)
+
+        yield 'transform', 'transform_batch', batch_size, time_call(
+            lambda: preprocessor.transform_batch(bmis, issues, goals)
+        )
+        yield 'predict_proba', 'sklearn', batch_size, time_call(
+            lambda: recommender.model.predict_proba(features)
+        )
+        yield 'predict_proba', 'flat', batch_size, time_call(
+            lambda: flat.model.predict_proba(features)
+        )
+        yield 'top_k', 'top_k_indices', batch_size, time_call(
+            lambda: top_k_indices(probabilities, TOP_K)
+        )
+        yield 'metadata', '_build_recommendations', batch_size, time_call(
+            lambda: [recommender._build_recommendations(row) for row in ranked]
+        )
+
+        # The route benchmarks serve this model through the Flask app
+        client = flask_app.test_client()
+        bodies = [
+            {'bmiCategory': p['bmi_category'], 'healthIssues': p['health_issues'],
+             'goals': p['goals'], 'topK': TOP_K}
+            for p in batch
+        ]
+        if batch_size == 1:
+            yield 'route', '/predict', 1, time_call(
+                lambda: client.post('/predict', json=bodies[0])
+            )
+        yield 'route', '/predict/batch', batch_size, time_call(
+            lambda: client.post('/predict/batch', json={'profiles': bodies})
+        )
+
+def load_flask_app(model_path):
+    """Import app.py serving model_path, with the response cache and access logs off"""
+    os.environ['ML_MODEL_DIR'] = model_path
+    os.environ['ML_CACHE_SIZE'] = '0'
+    os.environ['ML_LOG_LEVEL'] = 'WARNING'
+    sys.path.insert(0, ML_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    return app
+
+def environment():
+    """Versions and machine details stored with every run"""
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ML_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+def run(args):
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        app_module = None
+        for n_classes in args.classes:
+            started = time.perf_counter()
+            model_path, dataset = train_synthetic_model(work_dir, n_classes)
+            print(f"classes={n_classes}: trained in {time.perf_counter() - started:.1f}s")
+
+            if app_module is None:
+                app_module = load_flask_app(model_path)
+            else:
+                app_module.model_holder.model_path = model_path
+                with contextlib.redirect_stdout(io.StringIO()):
+                    app_module.model_holder.reload()
+
+            for benchmark, variant, batch_size, seconds in bench_model(
+                    model_path, dataset, args.batch_sizes, app_module.app):
+                result = {
+                    'benchmark': benchmark,
+                    'variant': variant,
+                    'classes': n_classes,
+                    'batch_size': batch_size,
+                    'seconds': seconds,
+                    'per_row_us': seconds * 1e6 / batch_size
+                }
+                results.append(result)
+                print(f"  {benchmark:>13} {variant:<24} batch={batch_size:<5} "
+                      f"{seconds * 1e6:>12.1f} us  ({result['per_row_us']:.1f} us/row)")
+
+    report = {'environment': environment(), 'args': vars(args), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+
+def result_key(result):
+    return (result['benchmark'], result['variant'], result['classes'], result['batch_size'])
+
+def compare(args):
+    with open(args.base) as f:
+        base = {result_key(r): r for r in json.load(f)['results']}
+    with open(args.new) as f:
+        new = {result_key(r): r for r in json.load(f)['results']}
+
+    regressions = 0
+    print(f"{'benchmark':>13} {'variant':<24} {'classes':>7} {'batch':>5} "
+          f"{'base us':>11} {'new us':>11} {'ratio':>7}")
+    for key in sorted(base.keys() & new.keys(), key=str):
+        ratio = new[key]['seconds'] / base[key]['seconds']
+        flag = ''
+        if ratio > 1 + args.threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = '  faster'
+        benchmark, variant, classes, batch_size = key
+        print(f"{benchmark:>13} {variant:<24} {classes:>7} {batch_size:>5} "
+              f"{base[key]['seconds'] * 1e6:>11.1f} {new[key]['seconds'] * 1e6:>11.1f} {ratio:>7.2f}{flag}")
+
+    for key in sorted(base.keys() ^ new.keys(), key=str):
+        print(f"only in {'base' if key in base else 'new'}: {key}")
+
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the suite and write JSON results")
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--classes', type=int, nargs='+', default=[100, 500])
+    run_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 256])
+
+    compare_parser = commands.add_parser('compare', help="flag regressions between two runs")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help="relative slowdown reported as a regression")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+if __name__ == '__main__':
+    main()
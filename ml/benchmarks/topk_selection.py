@@ -0,0 +1,80 @@
+"""
+Micro-benchmark: full argsort vs argpartition top-K selection
+
+Times top_k_indices with and without its full-sort shortcut against the
+plain argsort used before, on two kinds of probability rows:
+
+    dirichlet   continuous probabilities, no ties
+    forest      most classes at exactly 0 with quantized values, like a
+                random forest's predict_proba (ties at the K-th place)
+
+Use it to place FULL_SORT_MAX_CLASSES in src/ranking.py.
+
+Run from the ml/ directory:
+    python benchmarks/topk_selection.py
+"""
+import os
+import sys
+import timeit
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import ranking
+from ranking import top_k_indices
+
+def argsort_top_k(probabilities, top_k):
+    """Selection used before: sort every class, keep the last K"""
+    return np.argsort(probabilities, axis=1)[:, ::-1][:, :top_k]
+
+def stable_sort_top_k(probabilities, top_k):
+    """The full-sort shortcut of top_k_indices"""
+    return np.argsort(-probabilities, axis=1, kind='stable')[:, :top_k]
+
+def partition_top_k(probabilities, top_k):
+    """top_k_indices with the full-sort shortcut disabled"""
+    threshold = ranking.FULL_SORT_MAX_CLASSES
+    ranking.FULL_SORT_MAX_CLASSES = 0
+    try:
+        return top_k_indices(probabilities, top_k)
+    finally:
+        ranking.FULL_SORT_MAX_CLASSES = threshold
+
+def forest_like(rng, n_classes, n_rows, n_trees=100, nonzero=0.15):
+    """Vote shares of n_trees trees over a few classes per row"""
+    probabilities = np.zeros((n_rows, n_classes))
+    n_voted = max(1, int(nonzero * n_classes))
+    for row in probabilities:
+        voted = rng.choice(n_classes, size=n_voted, replace=False)
+        row[voted] = rng.multinomial(n_trees, rng.dirichlet(np.ones(n_voted))) / n_trees
+    return probabilities
+
+def time_call(fn, *args, repeat=5):
+    """Best-of-repeat seconds per call"""
+    timer = timeit.Timer(lambda: fn(*args))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def main():
+    rng = np.random.default_rng(42)
+    top_k = 8
+    distributions = {
+        'dirichlet': lambda n_classes, n_rows: rng.dirichlet(np.ones(n_classes), size=n_rows),
+        'forest': lambda n_classes, n_rows: forest_like(rng, n_classes, n_rows)
+    }
+
+    print(f"FULL_SORT_MAX_CLASSES = {ranking.FULL_SORT_MAX_CLASSES}")
+    print(f"{'probs':>10} {'classes':>8} {'rows':>6} {'argsort (us)':>14} {'stable (us)':>12} "
+          f"{'partition (us)':>15} {'top_k_indices (us)':>19}")
+    for name, sample in distributions.items():
+        for n_classes in (50, 100, 256, 512, 1000, 5000, 20000):
+            for n_rows in (1, 16, 256):
+                probabilities = sample(n_classes, n_rows)
+                times = [
+                    time_call(fn, probabilities, top_k)
+                    for fn in (argsort_top_k, stable_sort_top_k, partition_top_k, top_k_indices)
+                ]
+                print(f"{name:>10} {n_classes:>8} {n_rows:>6} {times[0] * 1e6:>14.1f} {times[1] * 1e6:>12.1f} "
+                      f"{times[2] * 1e6:>15.1f} {times[3] * 1e6:>19.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Per-worker memory with and without memory-mapped model artifacts
+
+Forks N workers the way gunicorn does, has each one serve a few
+predictions, then reads /proc/self/smaps_rollup (Linux only). PSS splits
+shared pages between the processes mapping them, so it is the best
+estimate of what each worker really costs; USS is its private memory.
+
+Run from the ml/ directory after training:
+    python benchmarks/worker_rss.py --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ML_DIR, 'src'))
+
+# mode name -> (HabitRecommender options, load in the master before forking)
+MODES = {
+    'pickles': ({}, False),
+    'preload-pickles': ({}, True),
+    'bundle': ({'bundle': True}, False),
+    'mmap': ({'mmap': True}, False),
+    'preload-mmap': ({'mmap': True}, True),
+}
+
+def memory_kb():
+    """Rss, Pss and private (USS) kilobytes of the current process"""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'uss': fields['Private_Clean'] + fields['Private_Dirty']
+    }
+
+def serve(recommender):
+    """A little traffic so lazily touched pages are resident"""
+    preprocessor = recommender.preprocessor
+    for bmi_category in preprocessor.bmi_classes:
+        for goals in preprocessor.goal_classes:
+            recommender.predict_habits(bmi_category, list(preprocessor.health_classes[:2]), goals, top_k=5)
+
+def run_mode(model_path, options, preload, n_workers):
+    """Fork workers for one mode; returns their memory readings"""
+    from predict import HabitRecommender
+
+    master_model = HabitRecommender(model_path, **options) if preload else None
+    readers = []
+
+    for _ in range(n_workers):
+        read_fd, write_fd = os.pipe()
+        sys.stdout.flush()
+        if os.fork() == 0:
+            os.close(read_fd)
+            recommender = master_model or HabitRecommender(model_path, **options)
+            serve(recommender)
+            with os.fdopen(write_fd, 'w') as out:
+                out.write(json.dumps(memory_kb()))
+            os._exit(0)
+        os.close(write_fd)
+        readers.append(read_fd)
+
+    # Read after all workers started so their mappings overlap in time
+    readings = []
+    for read_fd in readers:
+        with os.fdopen(read_fd) as f:
+            readings.append(json.loads(f.read()))
+    for _ in readers:
+        os.wait()
+    return readings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--model-path', default=os.path.join(ML_DIR, 'models'))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    print(f"{'mode':<16} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8}   (mean per worker, {args.workers} workers)")
+    for mode in args.modes:
+        options, preload = MODES[mode]
+        # Fresh process per mode so earlier loads don't skew the numbers
+        sys.stdout.flush()
+        if os.fork() == 0:
+            readings = run_mode(args.model_path, options, preload, args.workers)
+            mean = {key: sum(r[key] for r in readings) / len(readings) / 1024 for key in readings[0]}
+            print(f"{mode:<16} {mean['rss']:>8.1f} {mean['pss']:>8.1f} {mean['uss']:>8.1f}", flush=True)
+            os._exit(0)
+        os.wait()
+
+if __name__ == "__main__":
+    main()
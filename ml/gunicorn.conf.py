@@ -0,0 +1,24 @@
+# Gunicorn settings for the ML API (read automatically from this directory)
+#
+# GUNICORN_PRELOAD=true loads app.py, and with it the model, once in the
+# master before forking workers. Combined with ML_MMAP_ARTIFACTS=true the
+# model arrays are memory-mapped read-only, so every worker shares the same
+# physical pages instead of holding its own copy.
+import os
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+
+
+def post_fork(server, worker):
+    # Threads don't survive fork, so restart the log writer, the
+    # artifact watcher and the load retry loop per worker
+    if preload_app:
+        import app
+        from logging_setup import restart_after_fork
+
+        restart_after_fork()
+
+        if app.RELOAD_INTERVAL > 0:
+            app.model_holder.watch(app.RELOAD_INTERVAL)
+        if app.model_holder.current is None and app.LOAD_RETRY_MAX_DELAY > 0:
+            app.model_holder.retry_in_background(max_delay=app.LOAD_RETRY_MAX_DELAY)
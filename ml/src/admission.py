@@ -0,0 +1,149 @@
+import math
+import threading
+import time
+
+SHED_REASONS = ('in_flight', 'expected_wait', 'queue_time')
+
+def queue_seconds(header, now=None):
+    """
+    Time a request spent queued before reaching the app, from an
+    X-Request-Start header set by the proxy ('t=<epoch>' or '<epoch>', in
+    seconds, milliseconds or microseconds); 0.0 when absent or malformed
+    """
+    if not header:
+        return 0.0
+    try:
+        started = float(header.strip().removeprefix('t='))
+    except ValueError:
+        return 0.0
+
+    # Tell the unit apart by magnitude
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    now = time.time() if now is None else now
+    return max(0.0, now - started)
+
+class AdmissionController:
+    """
+    Bounded in-flight work with fail-fast load shedding
+
+    A request is admitted unless max_in_flight requests are already
+    running, or the wait it can expect (time already queued upstream plus
+    the in-flight requests ahead of it, drained at concurrency per
+    smoothed request latency) exceeds max_wait. Shedding early answers
+    in milliseconds instead of letting requests pile up until the
+    caller's timeout, when they are wasted work anyway.
+    """
+
+    def __init__(self, max_in_flight=64, max_wait_ms=2000, concurrency=1, smoothing=0.2,
+                 degraded_ratio=0.75, degraded_hold_seconds=5.0, clock=time.monotonic):
+        """
+        Args:
+            max_in_flight: int, admitted requests at once; 0 disables shedding
+            max_wait_ms: float, longest expected wait still admitted
+            concurrency: requests served in parallel (threads, batch slots)
+            smoothing: weight of the newest latency in the moving average
+            degraded_ratio: share of either limit at which status() reports
+                'degraded'
+            degraded_hold_seconds: status() also stays 'degraded' this long
+                after a request was shed
+        """
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait_ms / 1000.0
+        self.concurrency = max(1, concurrency)
+        self.smoothing = smoothing
+        self.degraded_ratio = degraded_ratio
+        self.degraded_hold = degraded_hold_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.latency = None
+        self.queue_time = None
+        self.admitted = 0
+        self.shed = dict.fromkeys(SHED_REASONS, 0)
+        self._last_shed = None
+
+    @property
+    def enabled(self):
+        return self.max_in_flight > 0
+
+    def _expected_wait(self):
+        return self.in_flight / self.concurrency * (self.latency or 0.0)
+
+    def try_acquire(self, queued_seconds=0.0):
+        """
+        Admit a request or shed it
+
+        Returns:
+            (admitted, reason, retry_after): reason is one of SHED_REASONS
+            and retry_after the whole seconds until the backlog should
+            have drained, both None when admitted
+        """
+        with self._lock:
+            if queued_seconds:
+                self.queue_time = self._smooth(self.queue_time, queued_seconds)
+
+            reason = None
+            expected_wait = self._expected_wait()
+            if self.enabled:
+                if self.in_flight >= self.max_in_flight:
+                    reason = 'in_flight'
+                elif queued_seconds > self.max_wait:
+                    reason = 'queue_time'
+                elif queued_seconds + expected_wait > self.max_wait:
+                    reason = 'expected_wait'
+
+            if reason is not None:
+                self.shed[reason] += 1
+                self._last_shed = self.clock()
+                return False, reason, max(1, math.ceil(expected_wait))
+
+            self.in_flight += 1
+            self.admitted += 1
+            return True, None, None
+
+    def release(self, seconds=None):
+        """
+        Mark an admitted request finished; seconds is its latency, or None
+        for requests that shouldn't feed the estimate (e.g. batches)
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if seconds is not None:
+                self.latency = self._smooth(self.latency, seconds)
+
+    def _smooth(self, average, value):
+        return value if average is None else average + self.smoothing * (value - average)
+
+    def status(self):
+        """'degraded' when close to a limit or recently shedding, else 'healthy'"""
+        if not self.enabled:
+            return 'healthy'
+        with self._lock:
+            if self.in_flight >= self.degraded_ratio * self.max_in_flight:
+                return 'degraded'
+            if self._expected_wait() >= self.degraded_ratio * self.max_wait:
+                return 'degraded'
+            if self._last_shed is not None and self.clock() - self._last_shed < self.degraded_hold:
+                return 'degraded'
+        return 'healthy'
+
+    def stats(self):
+        """Counters and estimates for monitoring; max_in_flight 0 means disabled"""
+        with self._lock:
+            stats = {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'admitted': self.admitted,
+                'shed': sum(self.shed.values()),
+                'latency_seconds': round(self.latency or 0.0, 6),
+                'queue_seconds': round(self.queue_time or 0.0, 6),
+                'expected_wait_seconds': round(self._expected_wait(), 6),
+                'max_wait_seconds': self.max_wait
+            }
+            stats.update({f'shed_{reason}': count for reason, count in self.shed.items()})
+        stats['status'] = self.status()
+        stats['degraded'] = int(stats['status'] == 'degraded')
+        return stats
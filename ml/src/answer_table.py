@@ -0,0 +1,167 @@
+import itertools
+import numpy as np
+from ranking import top_k_indices
+
+class AnswerTable:
+    """
+    Precomputed habit rankings for every (bmi, goals, health issues) input
+    with up to `max_health_issues` health issues.
+
+    Each input is packed into a single integer key; `keys` is sorted so a
+    lookup is one binary search, and `rankings[row]` holds the le_habit
+    class indices ordered from most to least likely (ties by class index).
+    `fingerprint` identifies the model the rankings came from (the sha256
+    of its pickle), or is None when unknown.
+    """
+
+    def __init__(self, keys, rankings, n_goals, n_health, max_health_issues, fingerprint=None):
+        self.keys = keys
+        self.rankings = rankings
+        self.n_goals = int(n_goals)
+        self.n_health = int(n_health)
+        self.max_health_issues = int(max_health_issues)
+        self.radix = self.n_health + 1
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, model, preprocessor, max_health_issues=2, max_rank=20, chunk_size=20000,
+              fingerprint=None):
+        """
+        Enumerate the input space and rank it with the model in bulk
+
+        Args:
+            model: fitted classifier with predict_proba
+            preprocessor: fitted HabitDataPreprocessor
+            max_health_issues: int, largest health issue set to precompute
+            max_rank: int, number of ranked classes kept per input
+            chunk_size: int, rows scored per predict_proba call
+            fingerprint: str identifying the model, saved with the table
+
+        Returns:
+            AnswerTable
+        """
+        n_bmi = len(preprocessor.bmi_classes)
+        n_goals = len(preprocessor.goal_classes)
+        n_health = len(preprocessor.health_classes)
+        n_classes = len(preprocessor.habit_classes)
+
+        if n_bmi * n_goals * (n_health + 1) ** max_health_issues >= 2 ** 63:
+            raise ValueError("Input space too large to pack into int64 keys")
+
+        health_sets = [
+            combo
+            for size in range(max_health_issues + 1)
+            for combo in itertools.combinations(range(n_health), size)
+        ]
+
+        # Multi-hot rows for every health issue set, reused for each (bmi, goals)
+        health_matrix = np.zeros((len(health_sets), n_health), dtype=np.int64)
+        for row, combo in enumerate(health_sets):
+            health_matrix[row, list(combo)] = 1
+
+        table = cls(None, None, n_goals, n_health, max_health_issues, fingerprint)
+        health_keys = np.array([table._pack_health(combo) for combo in health_sets], dtype=np.int64)
+
+        max_rank = min(max_rank, n_classes)
+        rank_dtype = np.uint16 if n_classes <= np.iinfo(np.uint16).max else np.uint32
+        keys = []
+        rankings = []
+
+        for bmi_code in range(n_bmi):
+            for goal_code in range(n_goals):
+                prefix = np.full((len(health_sets), 2), [bmi_code, goal_code], dtype=np.int64)
+                features = np.hstack([prefix, health_matrix])
+                keys.append(table._pack_prefix(bmi_code, goal_code) + health_keys)
+
+                for start in range(0, len(features), chunk_size):
+                    probabilities = model.predict_proba(features[start:start + chunk_size])
+                    ranked = model.classes_[top_k_indices(probabilities, max_rank)]
+                    rankings.append(ranked.astype(rank_dtype))
+
+        keys = np.concatenate(keys)
+        rankings = np.vstack(rankings)
+        order = np.argsort(keys)
+
+        table.keys = keys[order]
+        table.rankings = rankings[order]
+        return table
+
+    def _pack_prefix(self, bmi_code, goal_code):
+        """Key offset for a (bmi, goals) pair"""
+        return (int(bmi_code) * self.n_goals + int(goal_code)) * self.radix ** self.max_health_issues
+
+    def _pack_health(self, health_codes):
+        """Key part for a sorted health issue set; slot value 0 means empty"""
+        key = 0
+        for slot, code in enumerate(health_codes):
+            key += (int(code) + 1) * self.radix ** slot
+        return key
+
+    def lookup(self, features, top_k):
+        """
+        Find precomputed rankings for encoded feature rows
+
+        Args:
+            features: numpy array or CSR matrix of shape (n_users, n_features)
+            top_k: int, number of classes needed per row
+
+        Returns:
+            (rankings, hit) where rankings has shape (n_users, top_k) and
+            hit is a boolean mask of rows found in the table
+        """
+        n_rows = features.shape[0]
+        hit = np.zeros(n_rows, dtype=bool)
+
+        if top_k > self.rankings.shape[1]:
+            return None, hit
+
+        keys = np.full(n_rows, -1, dtype=np.int64)
+        for row, (bmi_code, goal_code, health_codes) in enumerate(self._row_codes(features)):
+            if len(health_codes) > self.max_health_issues:
+                continue
+            keys[row] = self._pack_prefix(bmi_code, goal_code) + self._pack_health(health_codes)
+
+        positions = np.searchsorted(self.keys, keys)
+        positions = np.minimum(positions, len(self.keys) - 1)
+        hit = (keys >= 0) & (self.keys[positions] == keys)
+
+        return self.rankings[positions, :top_k], hit
+
+    @staticmethod
+    def _row_codes(features):
+        """(bmi code, goal code, health issue codes) of each dense or CSR feature row"""
+        if not hasattr(features, 'indptr'):
+            for row in features:
+                yield row[0], row[1], np.flatnonzero(row[2:])
+            return
+
+        # Sorted CSR indices: bmi and goals are columns 0 and 1 when nonzero
+        for start, end in zip(features.indptr[:-1], features.indptr[1:]):
+            columns = features.indices[start:end]
+            values = features.data[start:end]
+            prefix = np.zeros(2)
+            is_prefix = columns < 2
+            prefix[columns[is_prefix]] = values[is_prefix]
+            yield prefix[0], prefix[1], columns[~is_prefix] - 2
+
+    def save(self, path):
+        """Save the table as a compressed npz file"""
+        np.savez_compressed(
+            path,
+            keys=self.keys,
+            rankings=self.rankings,
+            shape=np.array([self.n_goals, self.n_health, self.max_health_issues]),
+            fingerprint=np.array(self.fingerprint or '')
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a table written by save()"""
+        with np.load(path) as data:
+            n_goals, n_health, max_health_issues = data['shape']
+            # Tables saved before fingerprints were recorded have none
+            fingerprint = str(data['fingerprint']) if 'fingerprint' in data.files else ''
+            return cls(
+                data['keys'], data['rankings'], n_goals, n_health, max_health_issues,
+                fingerprint or None
+            )
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+# The pickled forest; its hash fingerprints artifacts derived from it
+MODEL_FILE = 'habit_recommender.pkl'
+
+# Files (or directories of files) whose change means a new model was deployed;
+# train.py writes the manifest last, so its change marks a complete deploy
+ARTIFACT_FILES = [
+    MODEL_FILE, 'preprocessor.pkl', 'metadata.pkl',
+    'flat_forest.npz', 'answer_table.npz', 'inference_bundle.npz', 'inference',
+    'similarity_index.npz', MANIFEST_FILE
+]
+
+# Start of a Git LFS pointer file, checked out instead of the real
+# artifact when LFS isn't installed or `git lfs pull` wasn't run
+LFS_POINTER_PREFIX = b'version https://git-lfs'
+
+class ArtifactError(Exception):
+    """A model artifact is missing, an LFS pointer, or doesn't match the manifest"""
+
+def artifact_paths(model_path):
+    """Existing artifact files, with directories expanded to their files"""
+    paths = []
+    for name in ARTIFACT_FILES:
+        path = os.path.join(model_path, name)
+        if os.path.isdir(path):
+            paths.extend(os.path.join(path, child) for child in sorted(os.listdir(path)))
+        elif os.path.exists(path):
+            paths.append(path)
+    return paths
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def is_lfs_pointer(path):
+    """Whether path is a Git LFS pointer stub rather than the artifact"""
+    # Pointers are ~130 bytes; real artifacts are never this small and text
+    if os.path.getsize(path) > 1024:
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(LFS_POINTER_PREFIX)) == LFS_POINTER_PREFIX
+
+def artifact_sizes(model_path):
+    """Bytes per artifact present in model_path, directories summed"""
+    sizes = {}
+    for path in artifact_paths(model_path):
+        name = os.path.relpath(path, model_path).split(os.sep)[0]
+        sizes[name] = sizes.get(name, 0) + os.path.getsize(path)
+    return sizes
+
+def write_manifest(model_path, n_features, n_classes, feature_format='dense'):
+    """
+    Record the size and content hash of every artifact in model_path,
+    with the feature and class counts they were trained for
+
+    Returns:
+        the manifest dict
+    """
+    artifacts = {}
+    for path in artifact_paths(model_path):
+        name = os.path.relpath(path, model_path).replace(os.sep, '/')
+        if name == MANIFEST_FILE:
+            continue
+        artifacts[name] = {'bytes': os.path.getsize(path), 'sha256': file_sha256(path)}
+
+    manifest = {
+        'manifest_version': MANIFEST_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'n_features': int(n_features),
+        'n_classes': int(n_classes),
+        'feature_format': feature_format,
+        'artifacts': artifacts
+    }
+    path = os.path.join(model_path, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    return manifest
+
+def load_manifest(model_path):
+    """The manifest dict, or None for artifacts trained before manifests"""
+    path = os.path.join(model_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    if is_lfs_pointer(path):
+        raise ArtifactError(f"{path} is a Git LFS pointer; run `git lfs pull`")
+    with open(path) as f:
+        return json.load(f)
+
+def check_artifacts(model_path, verify_hashes=False):
+    """
+    Fail fast on artifacts that can't load, before anything is unpickled
+
+    Every artifact present is checked for being an LFS pointer stub and,
+    when a manifest exists, for the size it records; with verify_hashes
+    also for its content hash, and files the manifest lists must exist.
+
+    Returns:
+        the manifest dict, or None when there is none
+
+    Raises:
+        ArtifactError naming every bad file
+    """
+    manifest = load_manifest(model_path)
+    expected = manifest['artifacts'] if manifest else {}
+    problems = []
+
+    for path in artifact_paths(model_path):
+        name = os.path.relpath(path, model_path).replace(os.sep, '/')
+        if name == MANIFEST_FILE:
+            continue
+        if is_lfs_pointer(path):
+            problems.append(f"{name} is a Git LFS pointer")
+            continue
+        entry = expected.get(name)
+        if entry is None:
+            continue
+        size = os.path.getsize(path)
+        if size != entry['bytes']:
+            problems.append(f"{name} is {size} bytes, manifest says {entry['bytes']}")
+        elif verify_hashes and file_sha256(path) != entry['sha256']:
+            problems.append(f"{name} content doesn't match the manifest hash")
+
+    if verify_hashes:
+        problems.extend(
+            f"{name} is listed in the manifest but missing" for name in expected
+            if not os.path.exists(os.path.join(model_path, name))
+        )
+
+    if problems:
+        hint = "; run `git lfs pull`" if any('LFS' in problem for problem in problems) else ""
+        raise ArtifactError(f"Bad model artifacts in {model_path}: " + ", ".join(problems) + hint)
+    return manifest
+
+def manifest_version(manifest):
+    """Short hash identifying the artifact set a manifest describes"""
+    digest = hashlib.sha256(json.dumps(manifest['artifacts'], sort_keys=True).encode())
+    return digest.hexdigest()[:12]
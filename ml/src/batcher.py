@@ -0,0 +1,109 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for a few milliseconds and runs them as
+    one batched call on a thread pool, so the event loop never blocks on
+    inference
+
+    A batch is dispatched when it reaches max_batch_size items or when
+    max_wait_ms has passed since its first item arrived, whichever comes
+    first. While a batch runs, the next one is already being collected.
+    """
+
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=5.0, max_workers=2):
+        """
+        Args:
+            run_batch: callable taking a list of items and returning a
+                list of results in the same order
+            max_batch_size: int, largest batch handed to run_batch
+            max_wait_ms: float, longest an item waits for others to join
+            max_workers: int, batches that may run at the same time
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batcher')
+        self._queue = None
+        self._collector = None
+        self._running = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        """Queue one item and wait for its result"""
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.get_running_loop().create_task(self._collect())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        """Form batches from the queue forever"""
+        loop = asyncio.get_running_loop()
+        getter = None
+
+        while True:
+            if getter is None:
+                getter = loop.create_task(self._queue.get())
+            batch = [await getter]
+            getter = None
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+
+                # An unfinished get is kept for the next batch rather than
+                # cancelled, so no item can be lost on timeout
+                getter = loop.create_task(self._queue.get())
+                done, _ = await asyncio.wait({getter}, timeout=timeout)
+                if not done:
+                    break
+                batch.append(getter.result())
+                getter = None
+
+            # Keep a reference so the running batch isn't garbage collected
+            task = loop.create_task(self._dispatch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _dispatch(self, batch):
+        """Run one batch on the thread pool and resolve its futures"""
+        items = [item for item, _ in batch]
+        self.batches += 1
+        self.items += len(items)
+
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.run_batch, items
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        """Batch counters for monitoring"""
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0
+        }
@@ -0,0 +1,302 @@
+"""
+Bulk scoring: rank habits for millions of stored profiles offline
+
+Streams profiles from a JSONL or CSV file in chunks and fans the chunks
+out to a process pool. Each worker loads the model once, encodes a whole
+chunk with one transform_batch call and writes it as its own output
+shard, so memory stays bounded by the chunks in flight.
+
+Input fields are the /predict payload names: bmiCategory, healthIssues
+(a list in JSONL, comma-separated in CSV), goals, plus an optional id
+column (--id-field; the row number otherwise).
+
+Output, one shard per chunk in --output:
+    jsonl   part-NNNNNN.jsonl, {"id", "habits"} or {"id", "error"} per row
+    npz     part-NNNNNN.npz with columns id, habit_index (n_rows x top_k,
+            -1 when invalid) and error; habits.json maps indices to names
+
+Finished chunks are recorded in _checkpoint.json, so an interrupted run
+resumes where it stopped when started again with the same arguments.
+
+Run from the ml/ directory:
+    python src/bulk_score.py profiles.jsonl --output scores/ --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+CHECKPOINT_FILE = '_checkpoint.json'
+
+# Set in each worker by _init_worker
+_recommender = None
+
+def read_chunks(input_path, input_format, chunk_size):
+    """
+    Yield (chunk index, records) from the input, where records are raw
+    JSONL lines or CSV row dicts; parsing JSON is left to the workers
+    """
+    if input_format == 'jsonl':
+        chunk = []
+        index = 0
+        with open(input_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                chunk.append(line)
+                if len(chunk) == chunk_size:
+                    yield index, chunk
+                    chunk = []
+                    index += 1
+        if chunk:
+            yield index, chunk
+        return
+
+    import pandas as pd
+
+    reader = pd.read_csv(input_path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    for index, frame in enumerate(reader):
+        yield index, frame.to_dict('records')
+
+def _normalize(value):
+    return value.lower().replace(' ', '') if isinstance(value, str) else value
+
+def parse_record(record, row_number, id_field):
+    """
+    (id, profile) for one input record, in predict_habits_batch's profile format
+
+    Raises:
+        ValueError for malformed JSON, a record that isn't an object, or
+        fields of the wrong type
+    """
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object, got {type(record).__name__}")
+
+    for field in ('bmiCategory', 'goals'):
+        if record.get(field) is not None and not isinstance(record[field], str):
+            raise ValueError(f"{field} must be a string")
+
+    issues = record.get('healthIssues') or []
+    if isinstance(issues, str):
+        issues = [] if issues.strip().lower() in ('', 'none') else issues.split(',')
+    if not isinstance(issues, list) or not all(isinstance(issue, str) for issue in issues):
+        raise ValueError("healthIssues must be a list of strings")
+
+    # Normalized like the backend does before calling /predict
+    profile = {
+        'bmi_category': _normalize(record.get('bmiCategory')),
+        'health_issues': [_normalize(issue) for issue in issues],
+        'goals': _normalize(record.get('goals'))
+    }
+    return record.get(id_field, row_number), profile
+
+def _init_worker(model_path, options):
+    global _recommender
+    import warnings
+    from predict import HabitRecommender
+
+    # Unknown health issues are expected in stored profiles and ignored
+    warnings.simplefilter('ignore')
+    _recommender = HabitRecommender(model_path, **options)
+
+def score_chunk(index, records, first_row, output_dir, output_format, top_k, id_field):
+    """
+    Score one chunk in a worker and write its shard
+
+    Returns:
+        (chunk index, rows, invalid rows)
+    """
+    ids, profiles, errors = [], [], {}
+    for offset, record in enumerate(records):
+        try:
+            row_id, profile = parse_record(record, first_row + offset, id_field)
+        except ValueError as e:
+            row_id, profile = first_row + offset, {}
+            errors[offset] = f"Invalid record: {e}"
+        ids.append(row_id)
+        profiles.append(profile)
+
+    ordered, rank_errors = _recommender.rank_batch(profiles, top_k)
+    # Keep the parse error for records that never became a profile
+    for offset, message in rank_errors.items():
+        errors.setdefault(offset, message)
+    for offset in errors:
+        ordered[offset] = -1
+
+    path = shard_path(output_dir, index, output_format)
+    tmp_path = path + '.tmp'
+    if output_format == 'jsonl':
+        habit_names = _recommender.preprocessor.habit_classes
+        with open(tmp_path, 'w') as f:
+            for offset, (row_id, row) in enumerate(zip(ids, ordered)):
+                if offset in errors:
+                    entry = {'id': row_id, 'error': errors[offset]}
+                else:
+                    entry = {'id': row_id, 'habits': [str(habit_names[i]) for i in row if i >= 0]}
+                f.write(json.dumps(entry, default=str) + '\n')
+    else:
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                id=np.asarray([str(row_id) for row_id in ids]),
+                habit_index=ordered.astype(np.int32),
+                error=np.asarray([errors.get(offset, '') for offset in range(len(ids))])
+            )
+    # A shard only ever exists complete
+    os.replace(tmp_path, path)
+    return index, len(records), len(errors)
+
+def shard_path(output_dir, index, output_format):
+    return os.path.join(output_dir, f'part-{index:06d}.{output_format}')
+
+def load_checkpoint(output_dir, run):
+    """Chunk indices already written by a run with the same arguments"""
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return set()
+
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint['run'] != run:
+        raise SystemExit(
+            f"{path} was written with different arguments or input; "
+            "use another --output or pass --restart"
+        )
+    return set(checkpoint['completed'])
+
+def save_checkpoint(output_dir, run, completed):
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'run': run, 'completed': sorted(completed)}, f)
+    os.replace(path + '.tmp', path)
+
+def bulk_score(input_path, output_dir, model_path, input_format=None, output_format='jsonl',
+               chunk_size=10000, workers=None, top_k=8, id_field='id', restart=False,
+               recommender_options=None):
+    """
+    Score every profile in input_path; see the module docstring
+
+    Returns:
+        dict with rows, invalid rows, chunks written and skipped, seconds
+        and rows per second
+    """
+    input_format = input_format or ('csv' if input_path.endswith('.csv') else 'jsonl')
+    workers = workers or os.cpu_count()
+    os.makedirs(output_dir, exist_ok=True)
+
+    # A checkpoint is only valid for the same input, chunking and output
+    stat = os.stat(input_path)
+    run = {
+        'input': os.path.abspath(input_path),
+        'input_size': stat.st_size,
+        'input_mtime': stat.st_mtime,
+        'chunk_size': chunk_size,
+        'top_k': top_k,
+        'output_format': output_format,
+        'model_path': os.path.abspath(model_path),
+        'recommender_options': recommender_options or {}
+    }
+    completed = set() if restart else load_checkpoint(output_dir, run)
+    if output_format == 'npz':
+        _write_habit_names(output_dir, model_path, recommender_options or {})
+
+    totals = {'rows': 0, 'invalid': 0, 'chunks': 0, 'skipped_chunks': len(completed)}
+    started = time.perf_counter()
+    last_report = started
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(model_path, recommender_options or {})) as executor:
+        pending = set()
+
+        def collect(done):
+            nonlocal last_report
+            for future in done:
+                index, rows, invalid = future.result()
+                completed.add(index)
+                totals['rows'] += rows
+                totals['invalid'] += invalid
+                totals['chunks'] += 1
+            save_checkpoint(output_dir, run, completed)
+
+            now = time.perf_counter()
+            if now - last_report >= 5:
+                last_report = now
+                print(f"{totals['rows']} rows scored, "
+                      f"{totals['rows'] / (now - started):.0f} rows/s", flush=True)
+
+        for index, records in read_chunks(input_path, input_format, chunk_size):
+            if index in completed:
+                continue
+            # Bound the chunks held in memory: at most two per worker
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(
+                score_chunk, index, records, index * chunk_size, output_dir,
+                output_format, top_k, id_field
+            ))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    seconds = time.perf_counter() - started
+    totals['seconds'] = round(seconds, 3)
+    totals['rows_per_second'] = round(totals['rows'] / seconds) if seconds else 0
+    return totals
+
+def _write_habit_names(output_dir, model_path, options):
+    """habits.json: habit name for every habit_index value of the npz shards"""
+    from predict import HabitRecommender
+
+    recommender = HabitRecommender(model_path, **options)
+    with open(os.path.join(output_dir, 'habits.json'), 'w') as f:
+        json.dump([str(habit) for habit in recommender.preprocessor.habit_classes], f)
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('input', help="JSONL or CSV file of profiles")
+    parser.add_argument('--output', required=True, help="directory for shards and the checkpoint")
+    parser.add_argument('--models', default=os.path.join(script_dir, '..', 'models'))
+    parser.add_argument('--input-format', choices=['jsonl', 'csv'],
+                        help="default: from the file extension")
+    parser.add_argument('--output-format', choices=['jsonl', 'npz'], default='jsonl')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None, help="default: all cores")
+    parser.add_argument('--top-k', type=int, default=8)
+    parser.add_argument('--id-field', default='id')
+    parser.add_argument('--restart', action='store_true', help="ignore an existing checkpoint")
+    parser.add_argument('--flat', action='store_true', help="score with the FlatForest arrays")
+    parser.add_argument('--bundle', action='store_true',
+                        help="load the pickle-free inference bundle in each worker")
+    parser.add_argument('--similarity', action='store_true', help="score with the similarity index")
+    args = parser.parse_args()
+
+    totals = bulk_score(
+        args.input,
+        args.output,
+        args.models,
+        input_format=args.input_format,
+        output_format=args.output_format,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        top_k=args.top_k,
+        id_field=args.id_field,
+        restart=args.restart,
+        recommender_options={'flat': args.flat, 'bundle': args.bundle, 'similarity': args.similarity}
+    )
+    print(f"Scored {totals['rows']} rows ({totals['invalid']} invalid) in {totals['chunks']} chunks, "
+          f"skipped {totals['skipped_chunks']} finished chunks")
+    print(f"{totals['seconds']:.1f}s, {totals['rows_per_second']} rows/s")
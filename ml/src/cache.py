@@ -0,0 +1,210 @@
+import threading
+import time
+from collections import OrderedDict
+
+def canonical_profile_key(bmi_category, health_issues, goals, top_k):
+    """
+    Build a cache key that is equal for profiles the model can't tell apart
+
+    Strings are normalized the same way as HabitDataPreprocessor
+    (lowercase, spaces removed) and health issues are deduplicated and
+    sorted, since they are encoded as a multi-hot vector.
+    """
+    def normalize(value):
+        return value.lower().replace(" ", "") if isinstance(value, str) else value
+
+    issues = tuple(sorted({normalize(issue) for issue in health_issues or []}, key=str))
+    return (normalize(bmi_category), issues, normalize(goals), int(top_k))
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache with an optional TTL
+
+    Entries are dropped whenever the owner (the loaded model) changes, and
+    writes computed for any other owner are discarded, so a reload never
+    serves predictions from old artifacts.
+    """
+
+    def __init__(self, max_size=1024, ttl=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._owner = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_writes = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def bind(self, owner):
+        """Clear the cache if it was filled for a different owner"""
+        with self._lock:
+            if self._owner is not owner:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._owner = owner
+
+    def get(self, key):
+        """Return the cached value, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and self.clock() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, owner):
+        """
+        Store a value computed by owner, evicting the least recently used
+        entry when full; dropped if the cache was rebound to another owner
+        while the value was being computed
+        """
+        if not self.enabled:
+            return
+
+        expires_at = self.clock() + self.ttl if self.ttl else None
+        with self._lock:
+            if owner is not self._owner:
+                self.stale_writes += 1
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'stale_writes': self.stale_writes
+            }
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the
+    leader) computes, callers arriving while it runs wait and share its
+    result or exception. Nothing is kept once the call finishes; caching
+    is ResponseCache's job.
+
+    do() is for threads (Flask); do_async() for coroutines on one event
+    loop (asgi.py). Both count into the same stats.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn):
+        """Return fn(), or the result of the identical call already in flight"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def do_async(self, key, coroutine_fn):
+        """Await coroutine_fn(), or the identical call already in flight"""
+        import asyncio
+
+        future = self._futures.get(key)
+        if future is not None:
+            with self._lock:
+                self.followers += 1
+            # Shielded so one follower disconnecting doesn't cancel the others
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        with self._lock:
+            self.leaders += 1
+        try:
+            result = await coroutine_fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved so a flight without followers logs nothing
+            future.exception()
+            raise
+        finally:
+            del self._futures[key]
+
+    def stats(self):
+        """Counters for monitoring; dedup_ratio is the share of calls that didn't compute"""
+        with self._lock:
+            calls = self.leaders + self.followers
+            return {
+                'in_flight': len(self._flights) + len(self._futures),
+                'calls': calls,
+                'computed': self.leaders,
+                'coalesced': self.followers,
+                'dedup_ratio': self.followers / calls if calls else 0.0
+            }
@@ -0,0 +1,130 @@
+"""
+Top-k quality of the served recommendation lists
+
+    hit@k       share of rows whose true habit is in the top k
+    ndcg@k      normalized discounted cumulative gain of the true habit's
+                position in the list as served (top k by probability,
+                then reordered by priority); one relevant habit per row,
+                so the ideal DCG is 1
+    coverage@k  share of all habits recommended to at least one row
+
+All metrics come from one top_k_indices pass over the probability
+matrix at the largest k.
+
+Run from the ml/ directory after training, to evaluate a serving backend
+on the held-out split train.py used:
+    python src/evaluation.py --similarity --k 1 5 8
+"""
+import argparse
+import json
+import os
+import sys
+import warnings
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ranking import order_by_priority, top_k_indices
+
+DEFAULT_KS = (1, 5, 8)
+
+def evaluate_ranking(ranked, y, n_classes, ks=DEFAULT_KS, priority_codes=None):
+    """
+    Metrics for ranked class lists
+
+    Args:
+        ranked: array of shape (n_rows, max_k) with class indices in
+            probability order
+        y: true class index per row
+        n_classes: number of habits, for coverage
+        ks: list sizes to report
+        priority_codes: priority code per class index; when given, ndcg
+            uses the served (priority-reordered) order
+
+    Returns:
+        dict with 'rows' and hit@k, ndcg@k and coverage@k for every k
+    """
+    ranked = np.atleast_2d(ranked)
+    y = np.asarray(y)
+    results = {'rows': int(len(y))}
+    if len(y) == 0:
+        for k in ks:
+            results.update({f'hit@{k}': 0.0, f'ndcg@{k}': 0.0, f'coverage@{k}': 0.0})
+        return results
+
+    for k in ks:
+        top = ranked[:, :k]
+        if priority_codes is not None:
+            top = order_by_priority(top, priority_codes)
+        matches = top == y[:, None]
+        discounts = 1.0 / np.log2(np.arange(2, top.shape[1] + 2))
+        recommended = np.unique(top[top >= 0])
+
+        results[f'hit@{k}'] = float(matches.any(axis=1).mean())
+        results[f'ndcg@{k}'] = float((matches @ discounts).mean())
+        results[f'coverage@{k}'] = len(recommended) / n_classes if n_classes else 0.0
+    return results
+
+def evaluate_model(model, X, y, ks=DEFAULT_KS, n_classes=None, priority_codes=None):
+    """
+    Metrics for any model exposing predict_proba and classes_ (sklearn
+    forest, FlatForest, HabitProfileIndex)
+
+    Args:
+        n_classes: number of habits; defaults to len(model.classes_),
+            which misses habits absent from the training split
+    """
+    if n_classes is None:
+        n_classes = len(model.classes_)
+    if len(y) == 0:
+        return evaluate_ranking(np.empty((0, 0), dtype=np.intp), y, n_classes, ks, priority_codes)
+
+    ranked = model.classes_[top_k_indices(model.predict_proba(X), max(ks))]
+    return evaluate_ranking(ranked, y, n_classes, ks, priority_codes)
+
+def evaluate_recommender(recommender, X, y, ks=DEFAULT_KS):
+    """
+    Metrics for a loaded HabitRecommender, ranking through the same path
+    as predict_habits (answer table when compiled, then the model)
+    """
+    n_classes = len(recommender.preprocessor.habit_classes)
+    if len(y) == 0:
+        return evaluate_ranking(np.empty((0, 0), dtype=np.intp), y, n_classes, ks)
+
+    ranked = recommender._rank_classes(X, max(ks))
+    return evaluate_ranking(ranked, y, n_classes, ks, recommender.habit_priority_codes)
+
+def format_metrics(results, ks=DEFAULT_KS):
+    """One line: hit, ndcg and coverage for each k"""
+    return '  '.join(
+        f"hit@{k} {results[f'hit@{k}']:.4f}  ndcg@{k} {results[f'ndcg@{k}']:.4f}  "
+        f"coverage@{k} {results[f'coverage@{k}']:.3f}"
+        for k in ks
+    )
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description="Evaluate a serving backend on the held-out split")
+    parser.add_argument('--data', default=os.path.join(script_dir, '..', 'data', 'habit_dataset.csv'))
+    parser.add_argument('--models', default=os.path.join(script_dir, '..', 'models'))
+    parser.add_argument('--k', type=int, nargs='+', default=list(DEFAULT_KS))
+    parser.add_argument('--flat', action='store_true')
+    parser.add_argument('--bundle', action='store_true')
+    parser.add_argument('--compiled', action='store_true')
+    parser.add_argument('--similarity', action='store_true')
+    args = parser.parse_args()
+
+    import pandas as pd
+    from predict import HabitRecommender
+    from train import split_mask
+
+    warnings.simplefilter('ignore')
+    recommender = HabitRecommender(
+        args.models, compiled=args.compiled, flat=args.flat,
+        bundle=args.bundle, similarity=args.similarity
+    )
+    X, y = recommender.preprocessor.transform_dataset(pd.read_csv(args.data))
+    is_test = split_mask(len(y))
+    print(json.dumps(evaluate_recommender(recommender, X[is_test], y[is_test], args.k), indent=2))
@@ -0,0 +1,191 @@
+import numpy as np
+
+class FlatForest:
+    """
+    Tree ensemble stored as contiguous NumPy arrays
+
+    All trees are concatenated into one node table. Leaves point to
+    themselves as both children, so all samples and trees can be walked
+    together with the same vectorized update, and `leaf_index[node]`
+    gives the row of the normalized class probabilities in `leaf_values`.
+    """
+
+    def __init__(self, feature, threshold, left, right, leaf_index, leaf_values,
+                 roots, classes, n_features, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_index = leaf_index
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Flatten a fitted RandomForestClassifier (or any forest of
+        DecisionTreeClassifiers with a single output)
+        """
+        features, thresholds, lefts, rights, leaf_indices, leaf_values, roots = [], [], [], [], [], [], []
+        node_offset = 0
+        leaf_offset = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(tree.node_count)
+
+            # Leaves loop back to themselves and compare feature 0 against +inf
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append((np.where(is_leaf, node_ids, tree.children_left) + node_offset).astype(np.int32))
+            rights.append((np.where(is_leaf, node_ids, tree.children_right) + node_offset).astype(np.int32))
+
+            # Same values as DecisionTreeClassifier.predict_proba: sklearn
+            # >= 1.4 stores leaf fractions and returns them as they are
+            # (normalizing again would move near-ties by an ulp), older
+            # versions store counts and normalize them
+            values = tree.value[is_leaf, 0, :]
+            normalizer = values.sum(axis=1, keepdims=True)
+            if not np.allclose(normalizer, 1.0, rtol=0, atol=1e-9):
+                normalizer[normalizer == 0.0] = 1.0
+                values = values / normalizer
+            leaf_values.append(values)
+
+            leaf_index = np.full(tree.node_count, -1, dtype=np.int32)
+            leaf_index[is_leaf] = np.arange(is_leaf.sum()) + leaf_offset
+            leaf_indices.append(leaf_index)
+
+            roots.append(node_offset)
+            node_offset += tree.node_count
+            leaf_offset += int(is_leaf.sum())
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            leaf_index=np.concatenate(leaf_indices),
+            leaf_values=np.vstack(leaf_values),
+            roots=np.array(roots, dtype=np.int32),
+            classes=np.asarray(model.classes_),
+            n_features=model.n_features_in_,
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_)
+        )
+
+    def predict_proba(self, X, chunk_size=256):
+        """
+        Average class probabilities of all trees
+
+        Args:
+            X: array or scipy sparse matrix of shape (n_samples, n_features)
+            chunk_size: int, samples walked together to bound memory
+
+        Returns:
+            numpy array of shape (n_samples, n_classes)
+        """
+        # Sparse rows are densified one chunk at a time (checked by
+        # attribute so scipy is never imported for dense input)
+        sparse = hasattr(X, 'tocsr')
+        if sparse:
+            X = X.tocsr()
+        else:
+            # sklearn compares float32 features against float64 thresholds
+            X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but FlatForest is expecting "
+                f"{self.n_features_in_} features as input"
+            )
+
+        proba = np.empty((X.shape[0], self.leaf_values.shape[1]))
+        for start in range(0, X.shape[0], chunk_size):
+            chunk = X[start:start + chunk_size]
+            if sparse:
+                chunk = chunk.toarray().astype(np.float32, copy=False)
+            proba[start:start + chunk_size] = self._predict_chunk(chunk)
+        return proba
+
+    def _predict_chunk(self, X):
+        """Walk every tree for a chunk of samples at once"""
+        n_samples, n_features = X.shape
+        n_trees = len(self.roots)
+        flat_X = X.ravel()
+
+        # One entry per (sample, tree); only entries not yet at a leaf are advanced
+        nodes = np.tile(self.roots, n_samples)
+        row_offsets = np.repeat(np.arange(n_samples, dtype=np.int64) * n_features, n_trees)
+        active = np.flatnonzero(self.leaf_index[nodes] < 0)
+
+        while active.size:
+            current = nodes[active]
+            go_left = flat_X[row_offsets[active] + self.feature[current]] <= self.threshold[current]
+            current = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = current
+            active = active[self.leaf_index[current] < 0]
+
+        # Sum trees in order, matching the forest's accumulation
+        leaves = self.leaf_index[nodes].reshape(n_samples, n_trees)
+        proba = np.zeros((n_samples, self.leaf_values.shape[1]))
+        for tree in range(leaves.shape[1]):
+            proba += self.leaf_values[leaves[:, tree]]
+        return proba / leaves.shape[1]
+
+    def to_arrays(self):
+        """All arrays needed to rebuild the forest, keyed by name"""
+        return {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'left': self.left,
+            'right': self.right,
+            'leaf_index': self.leaf_index,
+            'leaf_values': self.leaf_values,
+            'roots': self.roots,
+            'classes': self.classes_,
+            'shape': np.array([self.n_features_in_, self.max_depth])
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild a forest from to_arrays() output"""
+        n_features, max_depth = arrays['shape']
+        return cls(
+            feature=arrays['feature'],
+            threshold=arrays['threshold'],
+            left=arrays['left'],
+            right=arrays['right'],
+            leaf_index=arrays['leaf_index'],
+            leaf_values=arrays['leaf_values'],
+            roots=arrays['roots'],
+            classes=arrays['classes'],
+            n_features=n_features,
+            max_depth=max_depth
+        )
+
+    def save(self, path):
+        """Save all arrays to a single npz file"""
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        """Load a forest written by save()"""
+        with np.load(path) as data:
+            return cls.from_arrays({name: data[name] for name in data.files})
+
+    def verify_parity(self, model, X, atol=1e-9):
+        """
+        Check that predict_proba matches the sklearn model on X
+
+        Raises:
+            ValueError if any probability differs by more than atol
+        """
+        if not np.array_equal(self.classes_, model.classes_):
+            raise ValueError("Flat forest classes differ from the sklearn model")
+
+        difference = np.abs(self.predict_proba(X) - model.predict_proba(X)).max()
+        if difference > atol:
+            raise ValueError(f"Flat forest probabilities differ from sklearn by {difference}")
+        return difference
@@ -0,0 +1,133 @@
+import json
+import os
+import numpy as np
+
+from flat_forest import FlatForest
+from preprocess import HabitDataPreprocessor
+
+# Single self-contained artifact for serving: encoder vocabularies, habit
+# details and the flattened forest, all as plain arrays. Loading it needs
+# only NumPy (no pickle, pandas or sklearn).
+BUNDLE_FILE = 'inference_bundle.npz'
+
+# Same arrays as raw .npy files, for memory-mapped loading
+BUNDLE_DIR = 'inference'
+
+# Defaults for habits that have no row in the dataset
+DEFAULT_CATEGORY = 'Health'
+DEFAULT_DURATION = 30
+DEFAULT_PRIORITY = 'medium'
+
+def habit_metadata(dataset, habit_names):
+    """
+    Category, duration and priority per habit class, taken from the first
+    dataset row of each habit
+
+    Args:
+        dataset: DataFrame with recommendedHabit, category, duration and
+            priority columns, or None
+        habit_names: sorted array of habit class names
+
+    Returns:
+        (categories, durations, priorities) arrays aligned with habit_names
+    """
+    n_classes = len(habit_names)
+    categories = np.full(n_classes, DEFAULT_CATEGORY, dtype=object)
+    durations = np.full(n_classes, DEFAULT_DURATION, dtype=np.int64)
+    priorities = np.full(n_classes, DEFAULT_PRIORITY, dtype=object)
+
+    if dataset is not None:
+        first_rows = dataset.drop_duplicates('recommendedHabit')
+        first_rows = first_rows[first_rows['recommendedHabit'].isin(habit_names)]
+        class_indices = np.searchsorted(habit_names, first_rows['recommendedHabit'].to_numpy())
+
+        categories[class_indices] = first_rows['category'].to_numpy()
+        durations[class_indices] = first_rows['duration'].to_numpy()
+        priorities[class_indices] = first_rows['priority'].to_numpy()
+
+    return categories, durations, priorities
+
+def _bundle_arrays(preprocessor, flat_model, categories, durations, priorities, metadata):
+    """Every array stored in the bundle, keyed by name"""
+    arrays = {
+        'bmi_classes': np.asarray(preprocessor.bmi_classes, dtype=str),
+        'goal_classes': np.asarray(preprocessor.goal_classes, dtype=str),
+        'health_classes': np.asarray(preprocessor.health_classes, dtype=str),
+        'habit_classes': np.asarray(preprocessor.habit_classes, dtype=str),
+        'habit_categories': np.asarray(categories, dtype=str),
+        'habit_durations': np.asarray(durations, dtype=np.int64),
+        'habit_priorities': np.asarray(priorities, dtype=str),
+        'feature_format': np.array('sparse' if preprocessor.sparse else 'dense'),
+        'metadata_json': np.array(json.dumps(metadata or {}, default=str))
+    }
+    for name, array in flat_model.to_arrays().items():
+        arrays[f'forest_{name}'] = array
+    return arrays
+
+def save_bundle(path, preprocessor, flat_model, categories, durations, priorities, metadata=None):
+    """Write the inference bundle as a single npz file"""
+    np.savez(path, **_bundle_arrays(
+        preprocessor, flat_model, categories, durations, priorities, metadata
+    ))
+
+def save_bundle_dir(path, preprocessor, flat_model, categories, durations, priorities, metadata=None):
+    """
+    Write the inference bundle as a directory of raw .npy files, which
+    load_bundle can memory-map so all workers share the same pages
+    """
+    os.makedirs(path, exist_ok=True)
+    arrays = _bundle_arrays(preprocessor, flat_model, categories, durations, priorities, metadata)
+
+    for name, array in arrays.items():
+        # Replace by rename: workers still mapping the old file keep a valid inode
+        file_path = os.path.join(path, f'{name}.npy')
+        with open(file_path + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+        os.replace(file_path + '.tmp', file_path)
+
+def load_bundle(path, mmap=False):
+    """
+    Load a bundle written by save_bundle (npz file) or save_bundle_dir
+    (directory)
+
+    Args:
+        path: str, bundle file or directory
+        mmap: bool, memory-map the arrays of a bundle directory read-only
+            instead of reading them into private memory
+
+    Returns:
+        dict with 'preprocessor', 'model', 'habit_categories',
+        'habit_durations', 'habit_priorities' and 'metadata'
+    """
+    if os.path.isdir(path):
+        mmap_mode = 'r' if mmap else None
+        arrays = {
+            name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in os.listdir(path)
+            if name.endswith('.npy')
+        }
+    else:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+
+    forest_arrays = {
+        name[len('forest_'):]: array
+        for name, array in arrays.items()
+        if name.startswith('forest_')
+    }
+
+    return {
+        'preprocessor': HabitDataPreprocessor.from_vocabulary(
+            arrays['bmi_classes'],
+            arrays['goal_classes'],
+            arrays['health_classes'],
+            arrays['habit_classes'],
+            # Bundles written before sparse features existed are dense
+            sparse='feature_format' in arrays and arrays['feature_format'].item() == 'sparse'
+        ),
+        'model': FlatForest.from_arrays(forest_arrays),
+        'habit_categories': arrays['habit_categories'].astype(object),
+        'habit_durations': np.asarray(arrays['habit_durations']),
+        'habit_priorities': arrays['habit_priorities'].astype(object),
+        'metadata': json.loads(arrays['metadata_json'].item())
+    }
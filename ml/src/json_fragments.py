@@ -0,0 +1,59 @@
+import json
+
+# Optional: faster encoder for the payloads that aren't pre-serialized
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+def _default(value):
+    # NumPy scalars and arrays that orjson doesn't take natively
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(payload):
+    """
+    Compact JSON with sorted keys, as bytes
+
+    Same layout as Flask's jsonify in production; with orjson, non-ASCII
+    text is written as UTF-8 instead of \\u escapes.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), default=_default).encode()
+
+class RecommendationFragments:
+    """
+    Each habit's recommendation object serialized once, at model load
+
+    A response is assembled by joining the fragments of the selected
+    class indices, so requests skip building and encoding dicts. The
+    bytes match what jsonify writes for the same recommendations.
+    """
+
+    def __init__(self, recommendations):
+        self.fragments = [
+            json.dumps(recommendation, sort_keys=True, separators=(',', ':')).encode()
+            for recommendation in recommendations
+        ]
+
+    def join(self, indices):
+        """JSON array of the recommendations for the ordered class indices"""
+        fragments = self.fragments
+        return b'[' + b','.join([fragments[i] for i in indices]) + b']'
+
+def predict_body(recommendations):
+    """/predict success body around a serialized recommendations array"""
+    return b'{"data":{"recommendations":' + recommendations + b'},"success":true}\n'
+
+def batch_body(results):
+    """/predict/batch success body; recommendations in results are serialized arrays"""
+    items = [
+        b'{"recommendations":' + result['recommendations'] + b'}' if 'recommendations' in result
+        else dumps(result)
+        for result in results
+    ]
+    return b'{"data":{"results":[' + b','.join(items) + b']},"success":true}\n'
@@ -0,0 +1,151 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import time
+import uuid
+
+# Set per request (Flask before_request, the ASGI /predict route) and
+# attached to every record logged while handling it
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Caller-supplied IDs are echoed into logs and headers, so keep them short
+# and free of control characters
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# LogRecord attributes that are not `extra` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+def new_request_id(header=None):
+    """The caller's X-Request-ID when it is well-formed, otherwise a fresh one"""
+    if header and _REQUEST_ID_PATTERN.match(header):
+        return header
+    return uuid.uuid4().hex
+
+def _extras(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+class RequestIdFilter(logging.Filter):
+    """Copy the current request ID onto each record"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created))
+                  + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(_extras(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development, extras as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        if getattr(record, 'request_id', None):
+            line += f' request_id={record.request_id}'
+        return line + ''.join(f' {key}={value}' for key, value in _extras(record).items())
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the listener thread without waiting on I/O
+
+    When the queue is full (stdout stalled) records are dropped and counted
+    rather than blocking the request thread.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock prepare() formats the record here, on the request
+        # thread, and strips the extra fields; only resolve what can't
+        # cross the queue (args and the traceback object)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_state = {'handler': None, 'listener': None, 'stream_handler': None}
+
+def setup_logging(level='INFO', fmt='json', queue_size=10000, stream=None):
+    """
+    Route the root logger through a queue to a background thread that
+    writes to stdout (JSON lines or text). Calling it again only updates
+    the level.
+
+    Returns:
+        the NonBlockingQueueHandler (its `dropped` counts lost records)
+    """
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _state['handler'] is not None:
+        return _state['handler']
+
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(RequestIdFilter())
+    root.addHandler(handler)
+
+    _state.update(handler=handler, stream_handler=stream_handler)
+    _start_listener()
+    atexit.register(_stop_listener)
+    return handler
+
+def _start_listener():
+    listener = logging.handlers.QueueListener(_state['handler'].queue, _state['stream_handler'])
+    listener.start()
+    _state['listener'] = listener
+
+def _stop_listener():
+    # Flushes whatever is still queued
+    if _state['listener'] is not None:
+        _state['listener'].stop()
+        _state['listener'] = None
+
+def restart_after_fork():
+    """
+    Threads don't survive fork: give a forked worker a fresh queue and
+    listener thread (the parent's queue lock may have been held mid-fork)
+    """
+    handler = _state['handler']
+    if handler is None:
+        return
+    handler.queue = queue.Queue(maxsize=handler.queue.maxsize)
+    _start_listener()
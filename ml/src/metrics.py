@@ -0,0 +1,221 @@
+import cProfile
+import math
+import os
+import random
+import threading
+import time
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+class LatencyHistogram:
+    """
+    Log-spaced latency histogram from 1 microsecond to about 100 seconds
+
+    Observing is O(1). Quantiles are reported as the upper bound of the
+    bucket they fall in, so they overestimate by at most GROWTH - 1 (10%).
+    """
+
+    MIN_SECONDS = 1e-6
+    GROWTH = 1.1
+    N_BUCKETS = 194
+
+    def __init__(self):
+        self.counts = [0] * (self.N_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self._log_growth = math.log(self.GROWTH)
+
+    def observe(self, seconds):
+        if seconds <= self.MIN_SECONDS:
+            bucket = 0
+        else:
+            bucket = min(self.N_BUCKETS, 1 + int(math.log(seconds / self.MIN_SECONDS) / self._log_growth))
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, or NaN when empty"""
+        if not self.count:
+            return float('nan')
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.MIN_SECONDS * self.GROWTH ** bucket
+        return float('inf')
+
+class StageClock:
+    """
+    Times consecutive stages of one request: each lap() records the time
+    since the previous lap (or since the clock was started)
+    """
+
+    __slots__ = ('metrics', 'last')
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.metrics.observe_stage(stage, now - self.last)
+        self.last = now
+
+class _NullClock:
+    """Stand-in when metrics are disabled; lap() does nothing"""
+
+    __slots__ = ()
+
+    def lap(self, stage):
+        pass
+
+NULL_CLOCK = _NullClock()
+
+def stage_clock(metrics):
+    """A StageClock recording into metrics, or NULL_CLOCK if metrics is None"""
+    return StageClock(metrics) if metrics is not None else NULL_CLOCK
+
+class MetricsRegistry:
+    """
+    Thread-safe latency summaries, counters and gauges, rendered in the
+    Prometheus text exposition format
+
+    Every gunicorn worker keeps its own registry, so each scrape sees one
+    worker; aggregate across workers in Prometheus.
+    """
+
+    HELP = {
+        'habivance_stage_seconds': ('summary', 'Time spent in each stage of a request'),
+        'habivance_request_seconds': ('summary', 'Request latency by route'),
+        'habivance_requests_total': ('counter', 'Requests by route, method and status'),
+        'habivance_request_errors_total': ('counter', 'Requests that failed with a 5xx status'),
+        'habivance_profiles_total': ('counter', 'Requests profiled with cProfile'),
+    }
+
+    def __init__(self):
+        self.help = dict(self.HELP)
+        self._summaries = {}
+        self._counters = {}
+        self._gauges = {}
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._summaries.get(key)
+            if histogram is None:
+                histogram = self._summaries[key] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def observe_stage(self, stage, seconds):
+        """observe() for habivance_stage_seconds, skipping the label key build on the hot path"""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                key = ('habivance_stage_seconds', (('stage', stage),))
+                histogram = self._summaries.setdefault(key, LatencyHistogram())
+                self._stages[stage] = histogram
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_counter(self, name, value, help_text=None, **labels):
+        """Export a count kept elsewhere (e.g. cache stats); it must only ever grow"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = value
+            if help_text:
+                self.help.setdefault(name, ('counter', help_text))
+
+    def set_gauge(self, name, value, help_text=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+            if help_text:
+                self.help.setdefault(name, ('gauge', help_text))
+
+    def quantiles(self, name, **labels):
+        """{quantile: seconds} for one summary, for tests and JSON endpoints"""
+        with self._lock:
+            histogram = self._summaries.get((name, tuple(sorted(labels.items()))))
+            if histogram is None:
+                return {}
+            return {q: histogram.quantile(q) for q in QUANTILES}
+
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        with self._lock:
+            summaries = {key: (h.count, h.total, [h.quantile(q) for q in QUANTILES])
+                         for key, h in self._summaries.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        lines = []
+        for name in sorted({key[0] for key in (*summaries, *counters, *gauges)}):
+            kind, help_text = self.help.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            for (metric, labels), (count, total, values) in sorted(summaries.items()):
+                if metric != name:
+                    continue
+                for q, value in zip(QUANTILES, values):
+                    lines.append(f"{name}{_labels(labels + (('quantile', q),))} {value:.6g}")
+                lines.append(f"{name}_sum{_labels(labels)} {total:.6g}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+
+            for values in (counters, gauges):
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+def _labels(labels):
+    """Prometheus label set, e.g. {stage="rank"}"""
+    if not labels:
+        return ''
+
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels) + '}'
+
+class ProfileSampler:
+    """
+    Run cProfile on a random fraction of requests and dump each trace to
+    directory as a .prof file (open with pstats or snakeviz)
+    """
+
+    def __init__(self, rate=0.0, directory='profiles'):
+        self.rate = rate
+        self.directory = directory
+
+    def start(self):
+        """A running profiler for a sampled request, otherwise None"""
+        if self.rate <= 0 or random.random() >= self.rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another thread is being profiled (one profiler per process on 3.12+)
+            return None
+        return profiler
+
+    def stop(self, profiler, name):
+        """Stop profiler and write its stats; returns the file path"""
+        profiler.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() else '_' for c in name).strip('_') or 'root'
+        path = os.path.join(
+            self.directory, f"{safe_name}-{int(time.time() * 1000)}-{os.getpid()}.prof"
+        )
+        profiler.dump_stats(path)
+        return path
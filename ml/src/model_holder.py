@@ -0,0 +1,194 @@
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from artifacts import artifact_paths, artifact_sizes, check_artifacts, manifest_version
+from predict import HabitRecommender
+
+logger = logging.getLogger(__name__)
+
+def artifact_version(model_path):
+    """Short content hash of the model artifacts present in model_path"""
+    digest = hashlib.sha256()
+    for path in artifact_paths(model_path):
+        digest.update(os.path.relpath(path, model_path).encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+def artifact_mtimes(model_path):
+    """Modification times of the model artifacts present in model_path"""
+    mtimes = {}
+    for path in artifact_paths(model_path):
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except OSError:
+            # Replaced between listing and stat; the next poll sees the new file
+            pass
+    return mtimes
+
+class ModelHolder:
+    """
+    Holds the HabitRecommender currently being served and swaps it for a
+    freshly loaded one without downtime
+
+    Requests read `current` once and keep using that instance, so a swap
+    never affects in-flight predictions. Each gunicorn worker has its own
+    holder; use the file watcher to reload every worker after a deploy.
+    """
+
+    def __init__(self, model_path, **recommender_options):
+        self.model_path = model_path
+        self.recommender_options = recommender_options
+        self.current = None
+        self.info = {}
+        self.last_error = None
+        self._mtimes = None
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._retrier = None
+        self._stop_watching = threading.Event()
+
+    def reload(self):
+        """
+        Verify the artifacts against their manifest, load them into a new
+        HabitRecommender, smoke test it and swap it in. The previous model
+        keeps serving if anything fails.
+
+        Returns:
+            dict with the version, load time and artifact sizes of the new model
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            try:
+                # Hashing every file is the version check anyway, so verify in the same pass
+                manifest = check_artifacts(self.model_path, verify_hashes=True)
+                if manifest is not None:
+                    version = manifest_version(manifest)
+                else:
+                    version = artifact_version(self.model_path)
+                mtimes = artifact_mtimes(self.model_path)
+                sizes = artifact_sizes(self.model_path)
+                recommender = HabitRecommender(self.model_path, **self.recommender_options)
+                self._smoke_test(recommender)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+
+            load_seconds = time.perf_counter() - started
+
+            # A single attribute assignment is atomic for readers
+            self.current = recommender
+            self.last_error = None
+            self.info = {
+                'model_version': version,
+                'loaded_at': datetime.now(timezone.utc).isoformat(),
+                'load_seconds': round(load_seconds, 3),
+                'manifest': manifest is not None,
+                'artifact_bytes': sum(sizes.values()),
+                'artifact_sizes': sizes
+            }
+            self._mtimes = mtimes
+            return self.info
+
+    def reload_in_background(self):
+        """
+        Start a reload on a daemon thread
+
+        Returns:
+            False if a reload is already running
+        """
+        if self._reload_lock.locked():
+            return False
+
+        def run():
+            try:
+                info = self.reload()
+                logger.info('Model reloaded', extra=info)
+            except Exception:
+                logger.exception('Model reload failed, keeping previous model')
+
+        threading.Thread(target=run, name='model-reload', daemon=True).start()
+        return True
+
+    def retry_in_background(self, initial_delay=1.0, max_delay=300.0):
+        """
+        Keep trying to load a model on a daemon thread, doubling the delay
+        (with jitter) after each failure up to max_delay, until one loads.
+        For a worker that started without a model, e.g. while artifacts
+        are still being synced.
+
+        Returns:
+            False if a retry loop is already running
+        """
+        if self._retrier is not None and self._retrier.is_alive():
+            return False
+
+        def run():
+            delay = initial_delay
+            attempt = 1
+            while self.current is None:
+                if self._stop_watching.wait(delay * random.uniform(0.5, 1.0)):
+                    return
+                if self.current is not None:
+                    # Loaded meanwhile by the watcher or /admin/reload
+                    return
+                attempt += 1
+                try:
+                    info = self.reload()
+                    logger.info('Model loaded after retrying', extra=dict(info, attempt=attempt))
+                except Exception as e:
+                    delay = min(delay * 2, max_delay)
+                    logger.warning(
+                        'Model load failed, retrying',
+                        extra={'attempt': attempt, 'error': self.last_error or str(e), 'retry_in': delay}
+                    )
+
+        self._retrier = threading.Thread(target=run, name='model-retry', daemon=True)
+        self._retrier.start()
+        return True
+
+    def _smoke_test(self, recommender):
+        """Run one prediction so a broken model is never swapped in"""
+        preprocessor = recommender.preprocessor
+        recommendations = recommender.predict_habits(
+            bmi_category=preprocessor.bmi_classes[0],
+            health_issues=[],
+            goals=preprocessor.goal_classes[0],
+            top_k=1
+        )
+        if len(recommendations) != 1:
+            raise ValueError("Smoke prediction returned no recommendations")
+
+    def watch(self, interval):
+        """
+        Poll artifact modification times and reload when they change
+
+        Safe to call again in a forked worker: the parent's watcher thread
+        does not survive the fork, so a new one is started.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        if self._mtimes is None:
+            self._mtimes = artifact_mtimes(self.model_path)
+
+        def run():
+            while not self._stop_watching.wait(interval):
+                mtimes = artifact_mtimes(self.model_path)
+                # Remember the change once a reload for it starts, even if
+                # that reload fails, to avoid retrying every tick; while
+                # another reload is running, check again next tick
+                if mtimes != self._mtimes and self.reload_in_background():
+                    self._mtimes = mtimes
+
+        self._watcher = threading.Thread(target=run, name='model-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        """Stop the file watcher and the retry loop"""
+        self._stop_watching.set()
@@ -0,0 +1,197 @@
+import os
+import pickle
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+
+from evaluation import evaluate_model
+
+# Estimator families; only tree ensembles can be exported to FlatForest,
+# the inference bundle and the answer table
+ESTIMATORS = {
+    'random_forest': ('sklearn.ensemble', 'RandomForestClassifier', True),
+    'extra_trees': ('sklearn.ensemble', 'ExtraTreesClassifier', True),
+    'logistic_regression': ('sklearn.linear_model', 'LogisticRegression', False),
+}
+
+# The configuration train.py has always used
+DEFAULT_CONFIG = {
+    'estimator': 'random_forest',
+    'params': {
+        'n_estimators': 100,
+        'max_depth': None,
+        'min_samples_split': 2,
+        'min_samples_leaf': 1,
+        'class_weight': 'balanced',
+        'bootstrap': True,
+        'max_features': 'sqrt',
+        'random_state': 42,
+    }
+}
+
+def search_space():
+    """Configurations evaluated by search_models"""
+    configs = []
+    for n_estimators in (25, 50, 100, 200):
+        for max_depth in (None, 16):
+            for max_features in ('sqrt', 0.3):
+                params = dict(DEFAULT_CONFIG['params'], n_estimators=n_estimators,
+                              max_depth=max_depth, max_features=max_features)
+                configs.append({'estimator': 'random_forest', 'params': params})
+    for n_estimators in (50, 100):
+        params = dict(DEFAULT_CONFIG['params'], n_estimators=n_estimators, bootstrap=False)
+        configs.append({'estimator': 'extra_trees', 'params': params})
+    # Log-loss probabilities; CalibratedClassifierCV can't be used because
+    # it needs at least `cv` examples of every habit
+    configs.append({
+        'estimator': 'logistic_regression',
+        'params': {'C': 1.0, 'max_iter': 2000, 'class_weight': 'balanced'}
+    })
+    return configs
+
+def config_name(config):
+    """Short readable name, e.g. random_forest(n_estimators=50, max_depth=16)"""
+    default = DEFAULT_CONFIG['params'] if config['estimator'] != 'logistic_regression' else {}
+    changed = [f'{key}={value}' for key, value in config['params'].items()
+               if key in ('n_estimators', 'max_depth', 'max_features', 'C')
+               or default.get(key, value) != value]
+    return f"{config['estimator']}({', '.join(changed)})"
+
+def build_estimator(config, n_jobs=None):
+    """Instantiate the sklearn estimator described by config"""
+    import importlib
+
+    module_name, class_name, _ = ESTIMATORS[config['estimator']]
+    estimator = getattr(importlib.import_module(module_name), class_name)(**config['params'])
+    if n_jobs is not None and 'n_jobs' in estimator.get_params():
+        estimator.set_params(n_jobs=n_jobs)
+    return estimator
+
+def is_exportable(config):
+    """Whether the serving artifacts (flat forest, bundle) can be built"""
+    return ESTIMATORS[config['estimator']][2]
+
+def _median_seconds(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+def evaluate_config(config, X_train, y_train, X_test, y_test, top_k=5, batch_size=256):
+    """
+    Fit one configuration single-threaded and measure it
+
+    Returns:
+        dict with hit@k, fit time, single-row and per-row batch latency
+        (ms), pickle size (KB) and peak memory growth during fit and
+        prediction (MB)
+    """
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    model = build_estimator(config, n_jobs=1)
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+
+    hit_rate = evaluate_model(model, X_test, y_test, (top_k,))[f'hit@{top_k}']
+
+    rows = X_test if X_test.shape[0] else X_train
+    single_row = rows[:1]
+    # Rows repeated up to batch_size; row indexing works for dense and CSR X
+    batch = rows[np.resize(np.arange(rows.shape[0]), batch_size)]
+    model.predict_proba(single_row)
+    single_seconds = _median_seconds(lambda: model.predict_proba(single_row), 50)
+    batch_seconds = _median_seconds(lambda: model.predict_proba(batch), 5)
+
+    peak_growth_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    return {
+        'name': config_name(config),
+        'config': config,
+        'exportable': is_exportable(config),
+        'hit_rate': hit_rate,
+        'fit_seconds': round(fit_seconds, 3),
+        'single_ms': round(single_seconds * 1000, 3),
+        'batch_row_ms': round(batch_seconds * 1000 / batch_size, 4),
+        'pickle_kb': round(len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1024, 1),
+        'peak_mb': round(peak_growth_kb / 1024, 1)
+    }
+
+def pareto_front(results, objectives=('hit_rate', 'single_ms', 'pickle_kb')):
+    """
+    Mark each result as Pareto-optimal or not: no other result is at
+    least as good on every objective and better on one. hit_rate is
+    maximized, every other objective minimized.
+    """
+    def as_costs(result):
+        return [-result[key] if key == 'hit_rate' else result[key] for key in objectives]
+
+    costs = [as_costs(result) for result in results]
+    for result, cost in zip(results, costs):
+        result['pareto'] = not any(
+            all(o <= c for o, c in zip(other, cost)) and other != cost
+            for other in costs
+        )
+    return [result for result in results if result['pareto']]
+
+def select_config(results, tolerance=0.01):
+    """
+    Cheapest exportable Pareto configuration whose hit rate is within
+    tolerance of the best exportable one (lowest single-row latency,
+    then pickle size)
+    """
+    candidates = [result for result in results if result['exportable']]
+    best_hit_rate = max(result['hit_rate'] for result in candidates)
+    good_enough = [
+        result for result in candidates
+        if result['pareto'] and result['hit_rate'] >= best_hit_rate - tolerance
+    ]
+    if not good_enough:
+        good_enough = [result for result in candidates if result['hit_rate'] == best_hit_rate]
+    return min(good_enough, key=lambda result: (result['single_ms'], result['pickle_kb']))
+
+def search_models(X_train, y_train, X_test, y_test, configs=None, top_k=5, n_jobs=-1):
+    """
+    Evaluate configurations in parallel, one fresh process per
+    configuration so peak memory readings don't mix
+
+    Returns:
+        list of result dicts (see evaluate_config), with 'pareto' set
+    """
+    configs = configs if configs is not None else search_space()
+    workers = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=context,
+                             max_tasks_per_child=1) as executor:
+        futures = [
+            executor.submit(evaluate_config, config, X_train, y_train, X_test, y_test, top_k)
+            for config in configs
+        ]
+        results = [future.result() for future in futures]
+
+    pareto_front(results)
+    return results
+
+def format_report(results, selected=None, top_k=5):
+    """Plain-text table of search results, best hit rate first"""
+    width = max(len(result['name']) for result in results)
+    lines = [
+        f"{'':2}{'configuration':<{width}} {f'hit@{top_k}':>7} {'1-row ms':>9} "
+        f"{'batch ms/row':>13} {'pickle KB':>10} {'peak MB':>8}"
+    ]
+    ordered = sorted(results, key=lambda result: (-result['hit_rate'], result['single_ms']))
+    for result in ordered:
+        marker = '>' if result is selected else ('*' if result['pareto'] else ' ')
+        suffix = '' if result['exportable'] else '  (not exportable)'
+        lines.append(
+            f"{marker:2}{result['name']:<{width}} {result['hit_rate']:>7.3f} {result['single_ms']:>9.2f} "
+            f"{result['batch_row_ms']:>13.4f} {result['pickle_kb']:>10.0f} {result['peak_mb']:>8.1f}{suffix}"
+        )
+    lines.append("* Pareto-optimal (hit rate, single-row latency, pickle size)   > selected")
+    return "\n".join(lines)
@@ -1,45 +1,228 @@
-import pandas as pd
+import logging
 import numpy as np
-import joblib
 import os
+from answer_table import AnswerTable
+from artifacts import MODEL_FILE, ArtifactError, check_artifacts, file_sha256
+from flat_forest import FlatForest
+from inference_bundle import BUNDLE_DIR, BUNDLE_FILE, habit_metadata, load_bundle
+from json_fragments import RecommendationFragments
+from metrics import stage_clock
+from ranking import top_k_indices, order_by_priority, priority_codes
+from similarity import HabitProfileIndex
+
+logger = logging.getLogger(__name__)
 
 class HabitRecommender:
     """
     Habit recommendation system using trained ML model
     """
     
-    def __init__(self, model_path='../models/'):
+    def __init__(self, model_path='../models/', compiled=False, max_health_issues=2,
+                 flat=False, bundle=False, mmap=False, metrics=None, similarity=False):
         self.model_path = model_path
+        # Optional MetricsRegistry receiving per-stage prediction timings
+        self.metrics = metrics
+        self.flat = flat
+        self.similarity = similarity
+        self.bundle = bundle or mmap
+        self.mmap = mmap
+        self.compiled = compiled
+        self.max_health_issues = max_health_issues
         self.model = None
         self.preprocessor = None
         self.metadata = None
         self.dataset = None
+        self.answer_table = None
+        self.habit_categories = None
+        self.habit_durations = None
+        self.habit_priorities = None
+        self.habit_descriptions = None
+        self.habit_priority_codes = None
+        self.fragments = None
         self.load_model()
         
     def load_model(self):
-        """Load trained model and preprocessor"""
-        try:
-            model_file = os.path.join(self.model_path, 'habit_recommender.pkl')
-            preprocessor_file = os.path.join(self.model_path, 'preprocessor.pkl')
-            metadata_file = os.path.join(self.model_path, 'metadata.pkl')
-            
+        """
+        Load trained model and preprocessor
+        
+        Raises:
+            ArtifactError: an artifact is an LFS pointer, doesn't match the
+                manifest, or was trained for other features or classes
+        """
+        # Sizes and LFS stubs only; ModelHolder also verifies the hashes
+        manifest = check_artifacts(self.model_path)
+        
+        if self.bundle:
+            self._load_from_bundle()
+        else:
+            self._load_from_pickles()
+        
+        if self.similarity:
+            self.model = self._load_similarity_model()
+        
+        if self.compiled:
+            self.answer_table = self._load_answer_table(manifest)
+        
+        if manifest is not None:
+            self._check_shapes(manifest)
+        logger.info("Model loaded successfully!")
+    
+    def _check_shapes(self, manifest):
+        """Catch artifacts mixed from different training runs"""
+        n_features = 2 + len(self.preprocessor.health_classes)
+        n_classes = len(self.preprocessor.habit_classes)
+        model_features = getattr(self.model, 'n_features_in_', n_features)
+        mismatched = (
+            manifest['n_features'] != n_features or model_features != n_features
+            or manifest['n_classes'] != n_classes
+        )
+        if mismatched:
+            raise ArtifactError(
+                f"Artifacts in {self.model_path} expect {n_features} features (model {model_features}) "
+                f"and {n_classes} classes, manifest says {manifest['n_features']} and {manifest['n_classes']}"
+            )
+    
+    def _load_from_pickles(self):
+        """Load the pickled estimator and preprocessor plus the dataset CSV"""
+        # Deferred so bundle-only workers never import them
+        import joblib
+        import pandas as pd
+        
+        model_file = os.path.join(self.model_path, 'habit_recommender.pkl')
+        preprocessor_file = os.path.join(self.model_path, 'preprocessor.pkl')
+        metadata_file = os.path.join(self.model_path, 'metadata.pkl')
+        
+        if self.flat:
+            self.model = self._load_flat_model(model_file)
+        else:
             self.model = joblib.load(model_file)
-            self.preprocessor = joblib.load(preprocessor_file)
-            
-            if os.path.exists(metadata_file):
-                self.metadata = joblib.load(metadata_file)
-            
-            # Load dataset for habit details
-            dataset_path = os.path.join(self.model_path, '..', 'data', 'habit_dataset.csv')
-            if os.path.exists(dataset_path):
-                self.dataset = pd.read_csv(dataset_path)
-            
-            print("Model loaded successfully!")
-            
-        except Exception as e:
-            raise Exception(f"Error loading model: {str(e)}")
-    
-    def predict_habits(self, bmi_category, health_issues, goals, top_k=8):
+        self.preprocessor = joblib.load(preprocessor_file)
+        
+        if os.path.exists(metadata_file):
+            self.metadata = joblib.load(metadata_file)
+        
+        # Load dataset for habit details
+        dataset_path = os.path.join(self.model_path, '..', 'data', 'habit_dataset.csv')
+        if os.path.exists(dataset_path):
+            self.dataset = pd.read_csv(dataset_path)
+        
+        self._set_habit_index(*habit_metadata(self.dataset, self.preprocessor.habit_classes))
+    
+    def _load_from_bundle(self):
+        """
+        Load everything from the NumPy inference bundle; with mmap=True the
+        .npy directory is memory-mapped so forked workers share its pages
+        """
+        if self.mmap:
+            bundle = load_bundle(os.path.join(self.model_path, BUNDLE_DIR), mmap=True)
+        else:
+            bundle = load_bundle(os.path.join(self.model_path, BUNDLE_FILE))
+        
+        self.model = bundle['model']
+        self.preprocessor = bundle['preprocessor']
+        self.metadata = bundle['metadata']
+        self._set_habit_index(
+            bundle['habit_categories'],
+            bundle['habit_durations'],
+            bundle['habit_priorities']
+        )
+    
+    def _set_habit_index(self, categories, durations, priorities):
+        """
+        Store per-class habit details aligned with the habit classes so
+        recommendations can be assembled by array indexing
+        """
+        self.habit_categories = categories
+        self.habit_durations = durations
+        self.habit_priorities = priorities
+        self.habit_priority_codes = priority_codes(priorities)
+        self.habit_descriptions = np.array([
+            self._generate_description(habit, {'category': category, 'duration': duration})
+            for habit, category, duration in zip(self.preprocessor.habit_classes, categories, durations)
+        ], dtype=object)
+        # Pre-serialized recommendation per class for as_json responses
+        self.fragments = RecommendationFragments(
+            self._build_recommendations(range(len(self.preprocessor.habit_classes)))
+        )
+    
+    def _load_flat_model(self, model_file):
+        """Load the array-backed forest, flattening the pickled one if it wasn't exported"""
+        flat_file = os.path.join(self.model_path, 'flat_forest.npz')
+        
+        if os.path.exists(flat_file):
+            return FlatForest.load(flat_file)
+        
+        import joblib
+        return FlatForest.from_sklearn(joblib.load(model_file))
+    
+    def _load_similarity_model(self):
+        """Load the habit profile index, building it from the dataset if it wasn't exported"""
+        index_file = os.path.join(self.model_path, 'similarity_index.npz')
+        
+        if os.path.exists(index_file):
+            return HabitProfileIndex.load(index_file)
+        
+        if self.dataset is None:
+            raise FileNotFoundError(f"{index_file} not found and no dataset to build it from")
+        X, y = self.preprocessor.transform_dataset(self.dataset)
+        return HabitProfileIndex.fit(X, y, len(self.preprocessor.bmi_classes), len(self.preprocessor.goal_classes))
+    
+    def _load_answer_table(self, manifest=None):
+        """Load the precomputed answer table, building it if missing or stale"""
+        table_file = os.path.join(self.model_path, 'answer_table.npz')
+        fingerprint = self._model_fingerprint(manifest)
+        
+        # The saved table holds the forest's rankings, and only those of
+        # the forest it was built from
+        if os.path.exists(table_file) and not self.similarity:
+            table = AnswerTable.load(table_file)
+            if (fingerprint is not None and table.fingerprint == fingerprint
+                    and table.n_goals == len(self.preprocessor.goal_classes)
+                    and table.n_health == len(self.preprocessor.health_classes)
+                    and table.max_health_issues >= self.max_health_issues):
+                return table
+            logger.warning(f"Rebuilding {table_file}: it doesn't match the loaded model")
+        
+        return AnswerTable.build(self.model, self.preprocessor, self.max_health_issues, fingerprint=fingerprint)
+    
+    def _model_fingerprint(self, manifest=None):
+        """sha256 of the pickled forest, from the manifest when it lists it; None without the pickle"""
+        entry = (manifest or {}).get('artifacts', {}).get(MODEL_FILE)
+        if entry is not None:
+            return entry['sha256']
+        model_file = os.path.join(self.model_path, MODEL_FILE)
+        return file_sha256(model_file) if os.path.exists(model_file) else None
+    
+    def _rank_classes(self, features, top_k):
+        """
+        Rank habit classes for each feature row by probability
+        
+        Rows found in the answer table are served from it; the model is
+        only called for the remaining rows.
+        
+        Returns:
+            array of shape (n_rows, top_k) with le_habit class indices
+        """
+        hit = np.zeros(features.shape[0], dtype=bool)
+        if self.answer_table is not None:
+            ranked, hit = self.answer_table.lookup(features, top_k)
+        
+        if hit.all():
+            return ranked
+        
+        # predict_proba columns follow model.classes_, which may miss habits
+        # absent from the training split
+        probabilities = self.model.predict_proba(features[~hit])
+        live_ranked = self.model.classes_[top_k_indices(probabilities, top_k)]
+        
+        if not hit.any():
+            return live_ranked
+        
+        ranked = ranked.astype(live_ranked.dtype)
+        ranked[~hit] = live_ranked
+        return ranked
+    
+    def predict_habits(self, bmi_category, health_issues, goals, top_k=8, as_json=False):
         """
         Predict top K habits for user
         
@@ -48,10 +231,14 @@ class HabitRecommender:
             health_issues: list of str (e.g., ['Diabetes', 'Hypertension'])
             goals: str (e.g., 'Weight Loss')
             top_k: int, number of recommendations to return
+            as_json: return the recommendations already serialized
         
         Returns:
-            list of dicts with habit recommendations
+            list of dicts with habit recommendations, or with as_json
+            their JSON array as bytes
         """
+        clock = stage_clock(self.metrics)
+        
         # Validate inputs
         valid_bmi = ['underweight', 'normal', 'overweight', 'obese']
         if bmi_category not in valid_bmi:
@@ -63,52 +250,155 @@ class HabitRecommender:
         
         # Transform input
         features = self.preprocessor.transform_input(bmi_category, health_issues, goals)
+        clock.lap('predict.transform_input')
+        
+        # Get top K predictions, shown by priority (high -> medium -> low)
+        ranked = self._rank_classes(features, top_k)
+        clock.lap('predict.rank')
+        top_indices = order_by_priority(ranked, self.habit_priority_codes)[0]
+        clock.lap('predict.order')
         
-        # Get prediction probabilities
-        probabilities = self.model.predict_proba(features)[0]
+        if as_json:
+            recommendations = self.fragments.join(top_indices)
+            clock.lap('predict.join_fragments')
+            return recommendations
+        
+        recommendations = self._build_recommendations(top_indices)
+        clock.lap('predict.build_recommendations')
+        return recommendations
+    
+    def predict_habits_batch(self, profiles, top_k=8, as_json=False):
+        """
+        Predict top K habits for many users with a single model call
+        
+        Args:
+            profiles: list of dicts with 'bmi_category', 'health_issues',
+                'goals' and optionally 'top_k'
+            top_k: int, default number of recommendations per profile
+            as_json: serialize each profile's recommendations (bytes)
+        
+        Returns:
+            list with one entry per profile, either
+            {'recommendations': [...]} or {'error': str}
+        """
+        clock = stage_clock(self.metrics)
+        results = [None] * len(profiles)
+        valid_rows, errors = self._validate_profiles(profiles)
+        for i, message in errors.items():
+            results[i] = {'error': message}
+        clock.lap('predict_batch.validate')
         
-        # Get top K predictions
-        top_indices = np.argsort(probabilities)[-top_k:][::-1]
+        if not valid_rows:
+            return results
         
-        # Convert indices to habit names
-        top_habits = self.preprocessor.inverse_transform_habit(top_indices)
+        # Build one feature matrix and rank it in one pass
+        features = self.preprocessor.transform_batch(
+            [profiles[i]['bmi_category'] for i in valid_rows],
+            [profiles[i].get('health_issues') or [] for i in valid_rows],
+            [profiles[i]['goals'] for i in valid_rows]
+        )
+        clock.lap('predict_batch.transform')
         
-        # Prepare recommendations with details
-        recommendations = []
+        # Rank and order all rows at once, then slice each row to its own top K
+        row_top_k = np.array([
+            top_k if profiles[i].get('top_k') is None else int(profiles[i]['top_k'])
+            for i in valid_rows
+        ])
+        ranked = self._rank_classes(features, row_top_k.max())
+        clock.lap('predict_batch.rank')
+        row_top_k = np.minimum(row_top_k, ranked.shape[1])
+        ordered = order_by_priority(ranked, self.habit_priority_codes, row_top_k)
+        clock.lap('predict_batch.order')
         
-        for habit in top_habits:
-            # Get habit details from dataset
-            habit_info = self._get_habit_details(habit)
-            
-            recommendation = {
-                'habit': habit,
-                'category': habit_info.get('category', 'Health'),
-                'duration': int(habit_info.get('duration', 30)),
-                'priority': habit_info.get('priority', 'medium'),
-                'description': self._generate_description(habit, habit_info)
+        build = self.fragments.join if as_json else self._build_recommendations
+        for row, i in enumerate(valid_rows):
+            results[i] = {
+                'recommendations': build(ordered[row, :row_top_k[row]])
             }
-            
-            recommendations.append(recommendation)
+        clock.lap('predict_batch.build_recommendations')
         
-        # Sort by priority (high -> medium -> low)
-        priority_order = {'high': 0, 'medium': 1, 'low': 2}
-        recommendations.sort(key=lambda x: priority_order.get(x['priority'], 1))
+        return results
+    
+    def rank_batch(self, profiles, top_k=8):
+        """
+        Habit class indices in recommendation order for many users, without
+        building recommendation dicts (for bulk scoring)
         
-        return recommendations
+        Args:
+            profiles: list of dicts with 'bmi_category', 'health_issues'
+                and 'goals'
+            top_k: int, number of habits per profile
+        
+        Returns:
+            (ordered, errors): ordered has shape (n_profiles, top_k), with
+            -1 rows for invalid profiles; errors maps their row to a message
+        """
+        valid_rows, errors = self._validate_profiles(profiles)
+        ordered = np.full((len(profiles), top_k), -1, dtype=np.int64)
+        if not valid_rows:
+            return ordered, errors
+        
+        features = self.preprocessor.transform_batch(
+            [profiles[i]['bmi_category'] for i in valid_rows],
+            [profiles[i].get('health_issues') or [] for i in valid_rows],
+            [profiles[i]['goals'] for i in valid_rows]
+        )
+        ranked = self._rank_classes(features, top_k)
+        ordered[valid_rows, :ranked.shape[1]] = order_by_priority(ranked, self.habit_priority_codes)
+        return ordered, errors
     
-    def _get_habit_details(self, habit_name):
-        """Get habit details from dataset"""
-        if self.dataset is not None:
-            habit_row = self.dataset[self.dataset['recommendedHabit'] == habit_name]
-            if not habit_row.empty:
-                return {
-                    'category': habit_row.iloc[0]['category'],
-                    'duration': habit_row.iloc[0]['duration'],
-                    'priority': habit_row.iloc[0]['priority']
-                }
+    def _validate_profiles(self, profiles):
+        """
+        Validate each profile on its own so one bad item doesn't fail the batch
         
-        # Default values if not found
-        return {'category': 'Health', 'duration': 30, 'priority': 'medium'}
+        Returns:
+            (valid row indices, {row: error message})
+        """
+        valid_bmi = ['underweight', 'normal', 'overweight', 'obese']
+        valid_rows = []
+        errors = {}
+        for i, profile in enumerate(profiles):
+            try:
+                if not isinstance(profile, dict):
+                    raise ValueError("Each profile must be an object")
+                bmi_category = profile.get('bmi_category')
+                goals = profile.get('goals')
+                health_issues = profile.get('health_issues') or []
+                top_k = profile.get('top_k')
+                if bmi_category not in valid_bmi:
+                    raise ValueError(f"Invalid bmiCategory. Must be one of: {valid_bmi}")
+                if not isinstance(goals, str):
+                    raise ValueError("goals must be a string")
+                if not isinstance(health_issues, (list, tuple)) or not all(
+                    isinstance(issue, str) for issue in health_issues
+                ):
+                    raise ValueError("healthIssues must be a list of strings")
+                if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 0):
+                    raise ValueError("topK must be a non-negative integer")
+                self.preprocessor.validate_input(bmi_category, goals)
+            except ValueError as e:
+                errors[i] = str(e)
+                continue
+            valid_rows.append(i)
+        return valid_rows, errors
+    
+    def _build_recommendations(self, top_indices):
+        """Turn ordered class indices into recommendation dicts"""
+        habit_names = self.preprocessor.habit_classes
+        
+        # Prepare recommendations with details from the habit index
+        recommendations = [
+            {
+                'habit': habit_names[i],
+                'category': self.habit_categories[i],
+                'duration': int(self.habit_durations[i]),
+                'priority': self.habit_priorities[i],
+                'description': self.habit_descriptions[i]
+            }
+            for i in top_indices
+        ]
+        
+        return recommendations
     
     def _generate_description(self, habit, habit_info):
         """Generate a brief description for the habit"""
@@ -132,7 +422,11 @@ class HabitRecommender:
                 'test_accuracy': self.metadata.get('test_accuracy'),
                 'cv_score': self.metadata.get('cv_mean_score'),
                 'n_features': self.metadata.get('n_features'),
-                'n_classes': self.metadata.get('n_classes')
+                'n_classes': self.metadata.get('n_classes'),
+                # Test-split hit@k, ndcg@k and coverage@k of the backend being served
+                'evaluation': (self.metadata.get('evaluation') or {}).get(
+                    'similarity' if self.similarity else 'forest'
+                )
             }
         return None
 
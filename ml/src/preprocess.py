@@ -1,46 +1,141 @@
-import pandas as pd
+import itertools
+import warnings
 import numpy as np
-from sklearn.preprocessing import MultiLabelBinarizer, LabelEncoder
+
+# pandas, sklearn and scipy are imported where they are used, so serving
+# from a vocabulary (see from_vocabulary) never loads them
 
 class HabitDataPreprocessor:
     """
     Preprocesses user data for habit recommendation model
+    
+    With sparse=True every transform returns a float32 CSR matrix instead
+    of a dense array, so memory and encode time follow the number of
+    health issues per user rather than the size of the vocabulary. Feature
+    values are the same in both formats.
     """
     
-    def __init__(self):
+    # Columns read from the training CSV
+    DATASET_COLUMNS = ['bmiCategory', 'healthIssues', 'goals', 'recommendedHabit']
+    
+    def __init__(self, sparse=False):
+        from sklearn.preprocessing import MultiLabelBinarizer, LabelEncoder
+        
+        self.sparse = sparse
         self.mlb_health = MultiLabelBinarizer()
         self.le_bmi = LabelEncoder()
         self.le_goals = LabelEncoder()
         self.le_habit = LabelEncoder()
         self.health_issues_fitted = False
         self.fitted = False
+        self.bmi_codes = {}
+        self.goal_codes = {}
+        self.health_columns = {}
+        self.n_features = 0
+        self.bmi_classes = None
+        self.goal_classes = None
+        self.health_classes = None
+        self.habit_classes = None
         
+    @classmethod
+    def from_vocabulary(cls, bmi_classes, goal_classes, health_classes, habit_classes, sparse=False):
+        """
+        Build a fitted preprocessor for inference from the encoders'
+        class lists, without sklearn encoders
+        """
+        preprocessor = cls.__new__(cls)
+        preprocessor.sparse = sparse
+        preprocessor.mlb_health = None
+        preprocessor.le_bmi = None
+        preprocessor.le_goals = None
+        preprocessor.le_habit = None
+        preprocessor.health_issues_fitted = True
+        preprocessor.fitted = True
+        preprocessor._build_lookup_tables(bmi_classes, goal_classes, health_classes, habit_classes)
+        return preprocessor
+    
+    def __setstate__(self, state):
+        # Preprocessors pickled before the lookup tables existed get them on load
+        self.sparse = False
+        self.__dict__.update(state)
+        if self.fitted:
+            self._build_lookup_tables()
+    
+    def _build_lookup_tables(self, bmi_classes=None, goal_classes=None,
+                             health_classes=None, habit_classes=None):
+        """
+        Build dict lookups from the fitted encoders (or the given class
+        lists) so single inputs can be encoded without going through sklearn
+        """
+        if bmi_classes is None:
+            bmi_classes = self.le_bmi.classes_
+            goal_classes = self.le_goals.classes_
+            health_classes = self.mlb_health.classes_
+            habit_classes = self.le_habit.classes_
+        
+        self.bmi_classes = np.asarray(bmi_classes)
+        self.goal_classes = np.asarray(goal_classes)
+        self.health_classes = np.asarray(health_classes)
+        self.habit_classes = np.asarray(habit_classes)
+        
+        self.bmi_codes = {label: code for code, label in enumerate(self.bmi_classes)}
+        self.goal_codes = {label: code for code, label in enumerate(self.goal_classes)}
+        self.health_columns = {issue: 2 + col for col, issue in enumerate(self.health_classes)}
+        self.n_features = 2 + len(self.health_classes)
+    
+    @staticmethod
+    def _parse_health_issues(value):
+        """Comma-separated health issues as a normalized list; missing or 'none' means none"""
+        import pandas as pd
+        
+        if pd.isna(value) or value == 'none':
+            return []
+        return [issue.strip().lower().replace(" ", "") for issue in str(value).split(',')]
+    
+    def _dataset_vocabulary(self, df):
+        """Distinct normalized BMI categories, goals, health issues and habits in df"""
+        # Columns hold few distinct values, so only those are normalized
+        bmi = {value.lower().replace(" ", "") for value in df['bmiCategory'].dropna().unique()}
+        goals = {value.lower().replace(" ", "") for value in df['goals'].dropna().unique()}
+        issues = set()
+        for value in df['healthIssues'].unique():
+            issues.update(self._parse_health_issues(value))
+        habits = set(df['recommendedHabit'].dropna().unique())
+        return bmi, goals, issues, habits
+    
     def fit(self, df):
         """
-        Fit the preprocessor on training data
+        Fit the preprocessor on training data (df is not modified)
         """
-        # Normalize case for consistency
-        df['bmiCategory'] = df['bmiCategory'].str.lower().str.replace(" ", "")
-        df['goals'] = df['goals'].str.lower().str.replace(" ", "")
-
-        # Parse health issues (comma-separated string to list)
-        df['healthIssues_list'] = df['healthIssues'].apply(
-            lambda x: [issue.strip().lower().replace(" ", "") for issue in str(x).split(',')]
-            if pd.notna(x) and x != 'none' else []
-        )
-
+        self._fit_vocabulary(*self._dataset_vocabulary(df))
+        return self
+    
+    def fit_csv(self, csv_path, chunksize=100000):
+        """
+        Fit on a CSV in chunks, so only one chunk and the vocabulary are
+        ever held in memory
+        """
+        import pandas as pd
         
-        # Fit MultiLabelBinarizer for health issues
-        self.mlb_health.fit(df['healthIssues_list'])
-        self.health_issues_fitted = True
+        bmi, goals, issues, habits = set(), set(), set(), set()
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, usecols=self.DATASET_COLUMNS):
+            for vocabulary, values in zip((bmi, goals, issues, habits), self._dataset_vocabulary(chunk)):
+                vocabulary.update(values)
         
-        # Fit LabelEncoders
-        self.le_bmi.fit(df['bmiCategory'])
-        self.le_goals.fit(df['goals'])
-        self.le_habit.fit(df['recommendedHabit'])
+        self._fit_vocabulary(bmi, goals, issues, habits)
+        return self
+    
+    def _fit_vocabulary(self, bmi_values, goal_values, health_values, habit_values):
+        """Fit the encoders on the distinct normalized values of each column"""
+        # The encoders only need each distinct value once; classes come out sorted
+        self.mlb_health.fit([[issue] for issue in sorted(health_values)])
+        self.health_issues_fitted = True
+        self.le_bmi.fit(sorted(bmi_values))
+        self.le_goals.fit(sorted(goal_values))
+        self.le_habit.fit(sorted(habit_values))
         
+        self._build_lookup_tables()
         self.fitted = True
-        return self
     
     def transform_input(self, bmi_category, health_issues, goals):
         """
@@ -52,32 +147,99 @@ class HabitDataPreprocessor:
             goals: str (e.g., 'Weight Loss')
         
         Returns:
-            numpy array of features
+            numpy array of features (CSR matrix when sparse)
         """
         if not self.fitted:
             raise ValueError("Preprocessor must be fitted before transforming")
         
+        if self.sparse:
+            return self._sparse_rows([bmi_category], [health_issues], [goals])
+        
+        # Write codes straight into a preallocated feature row
+        features = np.zeros((1, self.n_features), dtype=np.int64)
+        self._encode_into(features[0], bmi_category, health_issues, goals)
+        
+        return features
+    
+    def _encode_codes(self, bmi_category, health_issues, goals):
+        """
+        Codes of one user input
+        
+        Returns:
+            (bmi code, goal code, health issue feature columns)
+        """
         # Normalize case
         bmi_category = bmi_category.lower().replace(" ", "") if bmi_category else None
         goals = goals.lower().replace(" ", "") if goals else None
-
-        # Handle None or empty health issues
-        if health_issues is None or len(health_issues) == 0:
-            health_issues = []
-        else:
-            health_issues = [issue.lower().replace(" ", "") for issue in health_issues]
-
         
-        # Encode BMI category
-        bmi_encoded = self.le_bmi.transform([bmi_category])[0]
+        try:
+            bmi_code = self.bmi_codes[bmi_category]
+        except KeyError:
+            raise ValueError(f"y contains previously unseen labels: {[bmi_category]}")
         
-        # Encode goals
-        goals_encoded = self.le_goals.transform([goals])[0]
+        try:
+            goal_code = self.goal_codes[goals]
+        except KeyError:
+            raise ValueError(f"y contains previously unseen labels: {[goals]}")
+        
+        # Health issues (multi-hot), ignoring unknown issues like MultiLabelBinarizer
+        columns = []
+        unknown = []
+        for issue in health_issues or []:
+            issue = issue.lower().replace(" ", "")
+            column = self.health_columns.get(issue)
+            if column is None:
+                unknown.append(issue)
+            else:
+                columns.append(column)
+        
+        if unknown:
+            warnings.warn(f"unknown class(es) {sorted(unknown, key=str)} will be ignored")
+        
+        return bmi_code, goal_code, columns
+    
+    def _encode_into(self, row, bmi_category, health_issues, goals):
+        """Encode one user input into an already zeroed feature row"""
+        row[0], row[1], columns = self._encode_codes(bmi_category, health_issues, goals)
+        for column in columns:
+            row[column] = 1
+    
+    def _sparse_rows(self, bmi_categories, health_issues, goals):
+        """CSR feature rows for many user inputs; zero codes are left implicit"""
+        import scipy.sparse as sp
+        
+        indptr = [0]
+        indices = []
+        data = []
+        for bmi_category, issues, goal in zip(bmi_categories, health_issues, goals):
+            bmi_code, goal_code, columns = self._encode_codes(bmi_category, issues, goal)
+            if bmi_code:
+                indices.append(0)
+                data.append(bmi_code)
+            if goal_code:
+                indices.append(1)
+                data.append(goal_code)
+            columns = sorted(set(columns))
+            indices.extend(columns)
+            data.extend([1] * len(columns))
+            indptr.append(len(indices))
         
-        # Encode health issues (multi-hot)
+        return sp.csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32),
+             np.array(indptr, dtype=np.int32)),
+            shape=(len(indptr) - 1, self.n_features)
+        )
+    
+    def _transform_input_sklearn(self, bmi_category, health_issues, goals):
+        """Reference encoding through the sklearn encoders, used to verify transform_input"""
+        bmi_category = bmi_category.lower().replace(" ", "") if bmi_category else None
+        goals = goals.lower().replace(" ", "") if goals else None
+        health_issues = [issue.lower().replace(" ", "") for issue in health_issues or []]
+        
+        bmi_encoded = self.le_bmi.transform([bmi_category])[0]
+        goals_encoded = self.le_goals.transform([goals])[0]
         health_encoded = self.mlb_health.transform([health_issues])[0]
         
-        # Combine all features
         features = np.concatenate([
             [bmi_encoded, goals_encoded],
             health_encoded
@@ -85,43 +247,240 @@ class HabitDataPreprocessor:
         
         return features.reshape(1, -1)
     
-    def transform_dataset(self, df):
+    def verify_fast_path(self):
         """
-        Transform entire dataset for training
+        Check that the fast encoder matches the sklearn encoders for every
+        BMI category, goal and health issue
+        
+        Linear in the vocabulary, so it stays cheap for thousands of
+        health issues: every (BMI, goal) pair is encoded once without
+        health issues, and every health issue once (plus all of them
+        together) under the first BMI category and goal, each as one
+        transform_batch call checked against the encoders' transform.
+        
+        Raises:
+            ValueError on the first input where the two paths differ
         """
-        # Normalize case
-        df['bmiCategory'] = df['bmiCategory'].str.lower().str.replace(" ", "")
-        df['goals'] = df['goals'].str.lower().str.replace(" ", "")
-
-        # Parse health issues
-        df['healthIssues_list'] = df['healthIssues'].apply(
-            lambda x: [issue.strip().lower().replace(" ", "") for issue in str(x).split(',')]
-            if pd.notna(x) and x != 'none' else []
+        pairs = list(itertools.product(self.bmi_classes, self.goal_classes))
+        bmi_categories = [bmi_category for bmi_category, _ in pairs]
+        goals = [goal for _, goal in pairs]
+        reference = np.zeros((len(pairs), self.n_features), dtype=np.int64)
+        reference[:, 0] = self.le_bmi.transform(bmi_categories)
+        reference[:, 1] = self.le_goals.transform(goals)
+        self._check_batch(bmi_categories, [[]] * len(pairs), goals, reference)
+        
+        health_classes = list(self.health_classes)
+        health_sets = [[issue] for issue in health_classes] + [health_classes]
+        bmi_category, goal = self.bmi_classes[0], self.goal_classes[0]
+        reference = np.zeros((len(health_sets), self.n_features), dtype=np.int64)
+        reference[:, 0] = self.le_bmi.transform([bmi_category])[0]
+        reference[:, 1] = self.le_goals.transform([goal])[0]
+        reference[:, 2:] = self.mlb_health.transform(health_sets)
+        self._check_batch(
+            [bmi_category] * len(health_sets), health_sets, [goal] * len(health_sets), reference
         )
+        
+        # The single-row entry point shares the encoder, so one input covers it
+        fast = self.transform_input(bmi_category, health_classes, goal)
+        if self.sparse:
+            fast = fast.toarray()
+        if not np.array_equal(fast, self._transform_input_sklearn(bmi_category, health_classes, goal)):
+            raise ValueError(f"Fast encoder mismatch for {bmi_category}, {goal}, {health_classes}")
+    
+    def _check_batch(self, bmi_categories, health_issues, goals, reference):
+        """Compare transform_batch with reference rows; raises ValueError on the first difference"""
+        fast = self.transform_batch(bmi_categories, health_issues, goals)
+        if self.sparse:
+            fast = fast.toarray().astype(reference.dtype)
+        if fast.dtype != reference.dtype or fast.shape != reference.shape:
+            raise ValueError(f"Fast encoder returned {fast.dtype} {fast.shape}, expected "
+                             f"{reference.dtype} {reference.shape}")
+        mismatched = np.flatnonzero((fast != reference).any(axis=1))
+        if len(mismatched):
+            row = mismatched[0]
+            raise ValueError(
+                f"Fast encoder mismatch for {bmi_categories[row]}, {goals[row]}, {health_issues[row]}"
+            )
+    
+    def validate_input(self, bmi_category, goals):
+        """
+        Check that a single user input can be encoded
 
+        Raises:
+            ValueError if bmi_category or goals were not seen during fit
+        """
+        if not self.fitted:
+            raise ValueError("Preprocessor must be fitted before transforming")
+        
+        bmi_category = bmi_category.lower().replace(" ", "") if bmi_category else None
+        goals = goals.lower().replace(" ", "") if goals else None
+        
+        # Same messages as the single-row path, so batching never changes an error
+        if bmi_category not in self.bmi_codes:
+            raise ValueError(f"y contains previously unseen labels: {[bmi_category]}")
+        if goals not in self.goal_codes:
+            raise ValueError(f"y contains previously unseen labels: {[goals]}")
+    
+    def transform_batch(self, bmi_categories, health_issues, goals):
+        """
+        Transform many user inputs into a single feature matrix
+        
+        Args:
+            bmi_categories: list of str, one per user
+            health_issues: list of lists of str, one per user
+            goals: list of str, one per user
+        
+        Returns:
+            numpy array of shape (n_users, n_features) (CSR matrix when sparse)
+        """
+        if not self.fitted:
+            raise ValueError("Preprocessor must be fitted before transforming")
+        
+        if self.sparse:
+            return self._sparse_rows(bmi_categories, health_issues, goals)
+        
+        features = np.zeros((len(bmi_categories), self.n_features), dtype=np.int64)
+        
+        for row, (bmi_category, issues, goal) in enumerate(zip(bmi_categories, health_issues, goals)):
+            self._encode_into(features[row], bmi_category, issues, goal)
+        
+        return features
+    
+    def transform_dataset(self, df):
+        """
+        Transform entire dataset for training, without modifying df
+        
+        Each column is factorized and only its distinct values are
+        normalized and encoded; rows are then filled by gathering codes.
+        
+        Returns:
+            (X, y): X is a multi-hot matrix of shape (n_rows, n_features)
+            in the smallest unsigned dtype that holds every code (a float32
+            CSR matrix when sparse); y holds the habit class codes
+        """
+        if not self.fitted:
+            raise ValueError("Preprocessor must be fitted before transforming")
+        
+        bmi = self._encode_labels(df['bmiCategory'], self.bmi_classes)
+        goals = self._encode_labels(df['goals'], self.goal_classes)
+        y = self._encode_labels(df['recommendedHabit'], self.habit_classes, normalize=False)
         
-        # Encode features
-        bmi_encoded = self.le_bmi.transform(df['bmiCategory'])
-        goals_encoded = self.le_goals.transform(df['goals'])
-        health_encoded = self.mlb_health.transform(df['healthIssues_list'])
+        if self.sparse:
+            import scipy.sparse as sp
+            
+            prefix = sp.csr_matrix(np.column_stack([bmi, goals]).astype(np.float32))
+            X = sp.hstack([prefix, self._encode_health_issues_sparse(df['healthIssues'])],
+                          format='csr', dtype=np.float32)
+            return X, y.astype(np.int64)
         
-        # Combine features
-        X = np.column_stack([bmi_encoded, goals_encoded, health_encoded])
+        codes_dtype = np.min_scalar_type(max(len(self.bmi_classes), len(self.goal_classes)))
         
-        # Encode target
-        y = self.le_habit.transform(df['recommendedHabit'])
+        X = np.empty((len(df), self.n_features), dtype=codes_dtype)
+        X[:, 0] = bmi
+        X[:, 1] = goals
+        X[:, 2:] = self._encode_health_issues(df['healthIssues'])
         
-        return X, y
+        return X, y.astype(np.int64)
+    
+    def iter_transform_csv(self, csv_path, chunksize=100000):
+        """
+        Stream (X, y) chunks from a CSV too large to load at once
+        
+        Args:
+            csv_path: path to a CSV with the training dataset columns
+            chunksize: rows per chunk
+        
+        Yields:
+            (X, y) for each chunk, as returned by transform_dataset
+        """
+        import pandas as pd
+        
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, usecols=self.DATASET_COLUMNS):
+            yield self.transform_dataset(chunk)
+    
+    @staticmethod
+    def _encode_labels(column, classes, normalize=True):
+        """Codes of a column's values in the sorted classes; raises like LabelEncoder on unseen labels"""
+        import pandas as pd
+        
+        codes, uniques = pd.factorize(column)
+        labels = [value.lower().replace(" ", "") if normalize else value for value in uniques]
+        unique_codes = pd.Index(classes).get_indexer(labels)
+        
+        if (unique_codes < 0).any() or (codes < 0).any():
+            unseen = [label for label, code in zip(labels, unique_codes) if code < 0]
+            if (codes < 0).any():
+                unseen.append(np.nan)
+            raise ValueError(f"y contains previously unseen labels: {sorted(unseen, key=str)}")
+        return unique_codes[codes]
+    
+    def _distinct_health_columns(self, column):
+        """
+        Factorize a column of comma-separated strings
+        
+        Returns:
+            (codes, columns): codes per row (-1 when missing) and, for each
+            distinct string, the sorted health block columns it sets
+        """
+        import pandas as pd
+        
+        codes, uniques = pd.factorize(column)
+        columns = []
+        unknown = set()
+        for value in uniques:
+            value_columns = set()
+            for issue in self._parse_health_issues(value):
+                column_index = self.health_columns.get(issue)
+                if column_index is None:
+                    unknown.add(issue)
+                else:
+                    value_columns.add(column_index - 2)
+            columns.append(sorted(value_columns))
+        
+        # Unknown issues are ignored like MultiLabelBinarizer
+        if unknown:
+            warnings.warn(f"unknown class(es) {sorted(unknown, key=str)} will be ignored")
+        
+        return codes, columns
+    
+    def _encode_health_issues(self, column):
+        """Multi-hot health issue block for a column of comma-separated strings"""
+        codes, columns = self._distinct_health_columns(column)
+        
+        # One multi-hot row per distinct string, plus a trailing all-zero
+        # row that missing values (code -1) select
+        rows = np.zeros((len(columns) + 1, len(self.health_classes)), dtype=np.uint8)
+        for row, value_columns in zip(rows, columns):
+            row[value_columns] = 1
+        
+        return rows[codes]
+    
+    def _encode_health_issues_sparse(self, column):
+        """_encode_health_issues as a float32 CSR matrix"""
+        import scipy.sparse as sp
+        
+        codes, columns = self._distinct_health_columns(column)
+        
+        # Same trailing empty row for missing values; CSR row indexing
+        # needs it addressed explicitly rather than as -1
+        lengths = [len(value_columns) for value_columns in columns] + [0]
+        distinct = sp.csr_matrix(
+            (np.ones(sum(lengths), dtype=np.float32),
+             np.fromiter((c for value_columns in columns for c in value_columns), dtype=np.int32),
+             np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32)),
+            shape=(len(lengths), len(self.health_classes))
+        )
+        return distinct[np.where(codes < 0, len(columns), codes)]
     
     def inverse_transform_habit(self, encoded_habits):
         """
         Convert encoded habit predictions back to habit names
         """
-        return self.le_habit.inverse_transform(encoded_habits)
+        return self.habit_classes[np.asarray(encoded_habits, dtype=np.intp)]
     
     def get_feature_names(self):
         """
         Get feature names for model interpretation
         """
-        health_features = [f'health_{issue}' for issue in self.mlb_health.classes_]
+        health_features = [f'health_{issue}' for issue in self.health_classes]
         return ['bmi_category', 'goals'] + health_features
\ No newline at end of file
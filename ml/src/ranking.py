@@ -0,0 +1,82 @@
+import numpy as np
+
+# Lower code = shown first; unknown priorities rank as medium
+PRIORITY_ORDER = {'high': 0, 'medium': 1, 'low': 2}
+
+# Up to this many classes top_k_indices sorts whole rows instead of
+# partitioning, at any row count. Forest probabilities are mostly tied
+# zeros, which send the partition path to its sort fallback anyway; on
+# forest-like rows the stable sort is faster up to ~1000 classes for
+# single rows and 256-row batches alike (benchmarks/topk_selection.py)
+FULL_SORT_MAX_CLASSES = 512
+
+def priority_codes(priorities):
+    """Map priority labels to their sort codes"""
+    return np.array([PRIORITY_ORDER.get(p, 1) for p in priorities], dtype=np.int8)
+
+def top_k_indices(probabilities, top_k):
+    """
+    Row-wise top K columns ordered by probability (descending), then
+    column index (ascending)
+
+    Small vocabularies are fully sorted; larger ones use argpartition so
+    only the K winners are sorted. Rows where ties straddle the K-th place
+    fall back to a stable sort so the lowest column indices always win.
+
+    Args:
+        probabilities: array of shape (n_rows, n_classes) or (n_classes,)
+        top_k: int, number of columns to keep per row
+
+    Returns:
+        numpy array of shape (n_rows, top_k) with column indices
+    """
+    probabilities = np.atleast_2d(probabilities)
+    n_rows, n_classes = probabilities.shape
+    top_k = max(0, min(int(top_k), n_classes))
+
+    if top_k == 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+
+    # A single stable sort is cheapest over a small vocabulary, or when
+    # most of the row is kept anyway
+    if n_classes <= FULL_SORT_MAX_CLASSES or 4 * top_k >= n_classes:
+        return np.argsort(-probabilities, axis=1, kind='stable')[:, :top_k]
+
+    negated = -probabilities
+    rows = np.arange(n_rows)[:, None]
+    candidates = np.argpartition(negated, top_k - 1, axis=1)[:, :top_k]
+    values = negated[rows, candidates]
+
+    # The winners are unique unless more than K columns reach the K-th value
+    kth_value = values.max(axis=1)
+    ambiguous = np.count_nonzero(negated <= kth_value[:, None], axis=1) > top_k
+    if ambiguous.any():
+        candidates[ambiguous] = np.argsort(negated[ambiguous], axis=1, kind='stable')[:, :top_k]
+        values = negated[rows, candidates]
+
+    order = np.lexsort((candidates, values))
+    return candidates[rows, order]
+
+def order_by_priority(ranked, codes, lengths=None):
+    """
+    Stable-sort each row of ranked class indices by priority code, so the
+    final order is (priority, probability, class index)
+
+    Args:
+        ranked: array of shape (n_rows, k), already in probability order
+        codes: array of priority codes per class index
+        lengths: optional array of per-row lengths; entries past a row's
+            length stay at the end of that row
+
+    Returns:
+        numpy array of shape (n_rows, k)
+    """
+    ranked = np.atleast_2d(ranked)
+    keys = codes[ranked].astype(np.int16)
+
+    if lengths is not None:
+        past_end = np.arange(ranked.shape[1]) >= np.asarray(lengths)[:, None]
+        keys[past_end] = np.iinfo(np.int16).max
+
+    order = np.argsort(keys, axis=1, kind='stable')
+    return np.take_along_axis(ranked, order, axis=1)
@@ -0,0 +1,147 @@
+import numpy as np
+
+class HabitProfileIndex:
+    """
+    Nearest-profile recommender: each habit is summarized by how often
+    every BMI category, goal and health issue occurs in its training rows,
+    and a query is scored against all habits at once
+
+    The score of a habit is the Bernoulli naive Bayes log-likelihood of
+    the query under the habit's profile:
+
+        bucket_scores[bmi, goal]   log P(bmi | habit) + log P(goal | habit)
+                                   + sum over issues of log P(issue absent | habit)
+        issue_weights[issue]       log P(issue | habit) - log P(issue absent | habit)
+
+    issue_weights is an inverted index from health issue to per-habit
+    weights, so a query only reads the rows of its own issues. Exposes
+    predict_proba and classes_ like the forests, so HabitRecommender,
+    the answer table and batching work unchanged.
+    """
+
+    def __init__(self, bucket_scores, issue_weights, classes, n_features):
+        self.bucket_scores = bucket_scores
+        self.issue_weights = issue_weights
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+
+    @classmethod
+    def fit(cls, X, y, n_bmi, n_goals, alpha=0.1, class_prior=False):
+        """
+        Build the habit profiles from encoded training rows
+
+        Args:
+            X: dense array or CSR matrix from HabitDataPreprocessor
+            y: habit class codes
+            n_bmi, n_goals: number of BMI categories and goals
+            alpha: additive (Laplace) smoothing of every frequency
+            class_prior: add log P(habit); off by default, like the
+                forest's class_weight='balanced'
+
+        Returns:
+            HabitProfileIndex
+        """
+        # Only needed when building the index, not for serving it
+        import scipy.sparse as sp
+
+        y = np.asarray(y)
+        classes, y_index = np.unique(y, return_inverse=True)
+        n_classes = len(classes)
+        class_counts = np.bincount(y_index, minlength=n_classes).astype(np.float64)
+
+        if hasattr(X, 'tocsr'):
+            X = X.tocsr()
+            prefix = X[:, :2].toarray().astype(np.intp)
+            health = X[:, 2:]
+        else:
+            X = np.asarray(X)
+            prefix = X[:, :2].astype(np.intp)
+            health = X[:, 2:]
+
+        # Per-habit counts of each BMI category, goal and health issue
+        bmi_counts = np.zeros((n_classes, n_bmi))
+        np.add.at(bmi_counts, (y_index, prefix[:, 0]), 1)
+        goal_counts = np.zeros((n_classes, n_goals))
+        np.add.at(goal_counts, (y_index, prefix[:, 1]), 1)
+        membership = sp.csr_matrix(
+            (np.ones(len(y_index)), (y_index, np.arange(len(y_index)))),
+            shape=(n_classes, len(y_index))
+        )
+        issue_counts = membership @ health
+        issue_counts = issue_counts.toarray() if hasattr(issue_counts, 'toarray') else np.asarray(issue_counts)
+
+        log_bmi = np.log((bmi_counts + alpha) / (class_counts[:, None] + alpha * n_bmi))
+        log_goal = np.log((goal_counts + alpha) / (class_counts[:, None] + alpha * n_goals))
+        p_issue = (issue_counts + alpha) / (class_counts[:, None] + 2 * alpha)
+        log_present, log_absent = np.log(p_issue), np.log1p(-p_issue)
+
+        base = log_absent.sum(axis=1)
+        if class_prior:
+            base = base + np.log(class_counts / class_counts.sum())
+
+        bucket_scores = log_bmi.T[:, None, :] + log_goal.T[None, :, :] + base
+        return cls(
+            bucket_scores=bucket_scores,
+            issue_weights=(log_present - log_absent).T.copy(),
+            classes=classes,
+            n_features=2 + health.shape[1]
+        )
+
+    def decision_function(self, X):
+        """Log-likelihood of each row under each habit profile, shape (n_samples, n_classes)"""
+        if hasattr(X, 'tocsr'):
+            X = X.tocsr()
+            prefix = X[:, :2].toarray()
+        else:
+            X = np.asarray(X)
+            prefix = X[:, :2]
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but HabitProfileIndex is expecting "
+                f"{self.n_features_in_} features as input"
+            )
+
+        scores = self.bucket_scores[prefix[:, 0].astype(np.intp), prefix[:, 1].astype(np.intp)]
+        # Sparse rows gather only their issues' weights; dense rows multiply by 0/1
+        scores += np.asarray(X[:, 2:] @ self.issue_weights)
+        return scores
+
+    def predict_proba(self, X):
+        """Normalized habit likelihoods (softmax of decision_function)"""
+        scores = self.decision_function(X)
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.decision_function(X), axis=1)]
+
+    def to_arrays(self):
+        """All arrays needed to rebuild the index, keyed by name"""
+        return {
+            'bucket_scores': self.bucket_scores,
+            'issue_weights': self.issue_weights,
+            'classes': self.classes_,
+            'shape': np.array([self.n_features_in_])
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild an index from to_arrays() output"""
+        return cls(
+            bucket_scores=arrays['bucket_scores'],
+            issue_weights=arrays['issue_weights'],
+            classes=arrays['classes'],
+            n_features=arrays['shape'][0]
+        )
+
+    def save(self, path):
+        """Save all arrays to a single npz file"""
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()"""
+        with np.load(path) as data:
+            return cls.from_arrays({name: data[name] for name in data.files})
@@ -1,15 +1,53 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.base import clone
+from sklearn.model_selection import cross_val_score
 from sklearn.metrics import classification_report, accuracy_score
 import joblib
+import argparse
+import hashlib
+import json
 import os
 import sys
+import time
 
 # Add src directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from preprocess import HabitDataPreprocessor
+from answer_table import AnswerTable
+from artifacts import MANIFEST_FILE, MODEL_FILE, file_sha256, write_manifest
+from flat_forest import FlatForest
+from similarity import HabitProfileIndex
+from evaluation import DEFAULT_KS, evaluate_model, format_metrics
+from ranking import priority_codes
+from inference_bundle import BUNDLE_DIR, BUNDLE_FILE, habit_metadata, save_bundle, save_bundle_dir
+from model_search import (
+    DEFAULT_CONFIG, build_estimator, config_name, format_report, search_models, select_config
+)
+
+# Bump when the feature encoding changes so stale cached arrays are never reused
+ENCODED_CACHE_VERSION = 2
+
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+def rows_sha256(X, y, n_rows=None, block_bytes=1 << 25):
+    """
+    Hex sha256 of the first n_rows encoded rows (all rows by default)
+
+    X is hashed as int64 in blocks of rows, densifying sparse blocks, so
+    the same rows hash the same in either feature format.
+    """
+    n_rows = X.shape[0] if n_rows is None else min(n_rows, X.shape[0])
+    block_rows = max(1, block_bytes // (8 * X.shape[1]))
+    digest = hashlib.sha256()
+    for start in range(0, n_rows, block_rows):
+        block = X[start:min(start + block_rows, n_rows)]
+        if hasattr(block, 'toarray'):
+            block = block.toarray()
+        digest.update(np.ascontiguousarray(block, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(y[:n_rows], dtype=np.int64).tobytes())
+    return digest.hexdigest()
 
 def load_data(csv_path):
     """Load habit dataset"""
@@ -21,33 +59,254 @@ def load_data(csv_path):
     print(df.head())
     return df
 
-def train_model(csv_path='../data/habit_dataset.csv', model_path='../models/'):
+def encode_dataset(csv_path, cache_dir=None, sparse=False):
     """
-    Train the habit recommendation model
+    Stage 1: load the CSV, fit the preprocessor and encode X, y
+
+    The result is cached in cache_dir under the CSV's content hash (and
+    the feature format), so retraining on an unchanged dataset skips
+    loading and encoding. With sparse=True, X is a CSR matrix.
+
+    Returns:
+        dict with X, y, the fitted preprocessor, per-habit metadata and
+        the dataset fingerprint (file sha256, rows)
     """
-    # Create models directory if it doesn't exist
-    os.makedirs(model_path, exist_ok=True)
-    
-    # Load data
+    dataset_sha256 = file_sha256(csv_path)
+
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(
+            cache_dir,
+            f"encoded-v{ENCODED_CACHE_VERSION}{'-sparse' if sparse else ''}-{dataset_sha256[:16]}.joblib"
+        )
+        if os.path.exists(cache_file):
+            print(f"Using cached encoded dataset: {cache_file}")
+            return joblib.load(cache_file)
+
     df = load_data(csv_path)
-    
-    # Initialize preprocessor
+
     print("\n" + "="*50)
     print("Preprocessing data...")
     print("="*50)
-    preprocessor = HabitDataPreprocessor()
+    preprocessor = HabitDataPreprocessor(sparse=sparse)
     preprocessor.fit(df)
-    
-    # Transform data
+    preprocessor.verify_fast_path()
     X, y = preprocessor.transform_dataset(df)
+
+    encoded = {
+        'X': X,
+        'y': y,
+        'preprocessor': preprocessor,
+        'habit_metadata': habit_metadata(df, preprocessor.habit_classes),
+        'dataset_info': df.groupby('recommendedHabit')['category'].first().to_dict(),
+        'dataset_sha256': dataset_sha256,
+        'n_rows': len(df)
+    }
+
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = cache_file + '.tmp'
+        joblib.dump(encoded, tmp_file)
+        os.replace(tmp_file, cache_file)
+        print(f"Encoded dataset cached to: {cache_file}")
+
+    return encoded
+
+def split_mask(n_rows, test_size=TEST_SIZE, random_state=RANDOM_STATE):
+    """
+    Boolean test-set mask that keeps every existing row on the same side
+    of the split when rows are appended, so warm-started trees never
+    train on earlier test rows
+    """
+    return np.random.RandomState(random_state).random_sample(n_rows) < test_size
+
+def previous_model_config(model_path):
+    """The model configuration saved by the last training run, if any"""
+    try:
+        return joblib.load(os.path.join(model_path, 'metadata.pkl')).get('model_config')
+    except Exception:
+        return None
+
+def run_model_search(X_train, y_train, X_test, y_test, model_path, top_k=5, n_jobs=-1):
+    """
+    Evaluate the search space, print the Pareto report, save it as
+    search_report.json and return (selected config, results)
+    """
+    print("\n" + "="*50)
+    print("Searching model configurations...")
+    print("="*50)
+    results = search_models(X_train, y_train, X_test, y_test, top_k=top_k, n_jobs=n_jobs)
+    selected = select_config(results)
+    print(format_report(results, selected, top_k))
+    print(f"\nSelected: {selected['name']}")
+
+    report_file = os.path.join(model_path, 'search_report.json')
+    with open(report_file, 'w') as f:
+        json.dump({'top_k': top_k, 'selected': selected['name'], 'results': results}, f, indent=2)
+    print(f"Search report saved to: {report_file}")
+    return selected['config'], results
+
+def warm_start_model(model_path, encoded, y_train):
+    """
+    Load the saved forest if it can be grown with new trees: the
+    vocabulary and class set must be unchanged and the rows it was
+    trained on must still be the first rows of the dataset (rows were
+    only appended)
+
+    Returns:
+        (model, None) on success, or (None, reason) when a full retrain is needed
+    """
+    model_file = os.path.join(model_path, 'habit_recommender.pkl')
+    preprocessor_file = os.path.join(model_path, 'preprocessor.pkl')
+    metadata_file = os.path.join(model_path, 'metadata.pkl')
+
+    try:
+        model = joblib.load(model_file)
+        previous_preprocessor = joblib.load(preprocessor_file)
+        previous_metadata = joblib.load(metadata_file)
+    except Exception as e:
+        return None, f"previous model could not be loaded ({e})"
+
+    if not hasattr(model, 'estimators_'):
+        return None, "previous model is not a tree ensemble"
+    if 'rows_sha256' not in previous_metadata:
+        return None, "previous model has no dataset fingerprint"
+
+    # Codes are only comparable when every encoder has the same classes
+    preprocessor = encoded['preprocessor']
+    for name in ('bmi_classes', 'goal_classes', 'health_classes', 'habit_classes'):
+        if not np.array_equal(getattr(previous_preprocessor, name), getattr(preprocessor, name)):
+            return None, f"vocabulary changed ({name})"
+
+    previous_rows = previous_metadata['n_rows']
+    if len(encoded['y']) < previous_rows:
+        return None, "dataset has fewer rows than the one the model was trained on"
+    if rows_sha256(encoded['X'], encoded['y'], previous_rows) != previous_metadata['rows_sha256']:
+        return None, "existing rows changed, not only appended"
+
+    if not np.array_equal(model.classes_, np.unique(y_train)):
+        return None, "set of habits in the training split changed"
+
+    return model, None
+
+def compile_answer_table(model, preprocessor, model_path, max_health_issues=2):
+    """
+    Precompute rankings for every input with up to max_health_issues
+    health issues so HabitRecommender(compiled=True) can skip the model
+
+    The table records the hash of the saved model pickle, so it must be
+    called after the model is saved.
+    """
+    print("\n" + "="*50)
+    print("Compiling answer table...")
+    print("="*50)
+    fingerprint = file_sha256(os.path.join(model_path, MODEL_FILE))
+    table = AnswerTable.build(model, preprocessor, max_health_issues, fingerprint=fingerprint)
+    table_file = os.path.join(model_path, 'answer_table.npz')
+    table.save(table_file)
+    print(f"Precomputed inputs: {len(table.keys)}")
+    print(f"Answer table saved to: {table_file}")
+    return table
+
+def export_flat_model(model, X, model_path):
+    """
+    Flatten the fitted forest into contiguous arrays for
+    HabitRecommender(flat=True) and check it reproduces sklearn's
+    probabilities on X
+    """
+    print("\n" + "="*50)
+    print("Exporting flat forest...")
+    print("="*50)
+    flat_model = FlatForest.from_sklearn(model)
+    difference = flat_model.verify_parity(model, X)
+    flat_file = os.path.join(model_path, 'flat_forest.npz')
+    flat_model.save(flat_file)
+    print(f"Nodes: {len(flat_model.feature)}, leaves: {len(flat_model.leaf_values)}")
+    print(f"Max probability difference vs sklearn: {difference:.2e}")
+    print(f"Flat forest saved to: {flat_file}")
+    return flat_model
+
+def export_similarity_index(preprocessor, X_train, y_train, X_test, y_test, model_path,
+                            habit_priority_codes=None):
+    """
+    Build the habit profile index served by HabitRecommender(similarity=True)
+    from the training split and report its top-k quality next to the forest's
+
+    Returns:
+        (index, evaluation metrics on the test split)
+    """
+    print("\n" + "="*50)
+    print("Exporting similarity index...")
+    print("="*50)
+    index = HabitProfileIndex.fit(
+        X_train, y_train, len(preprocessor.bmi_classes), len(preprocessor.goal_classes)
+    )
+    index_file = os.path.join(model_path, 'similarity_index.npz')
+    index.save(index_file)
+    metrics = evaluate_model(
+        index, X_test, y_test, DEFAULT_KS, len(preprocessor.habit_classes), habit_priority_codes
+    )
+    print(f"Test {format_metrics(metrics)}")
+    print(f"Similarity index saved to: {index_file}")
+    return index, metrics
+
+def export_inference_bundle(preprocessor, flat_model, habit_arrays, metadata, model_path):
+    """
+    Write the self-contained, pandas- and pickle-free serving artifact
+    loaded by HabitRecommender(bundle=True), both as one npz file and as
+    a directory of .npy files for memory-mapped loading
+    """
+    bundle_file = os.path.join(model_path, BUNDLE_FILE)
+    bundle_dir = os.path.join(model_path, BUNDLE_DIR)
+    categories, durations, priorities = habit_arrays
+    save_bundle(bundle_file, preprocessor, flat_model, categories, durations, priorities, metadata)
+    save_bundle_dir(bundle_dir, preprocessor, flat_model, categories, durations, priorities, metadata)
+    print(f"Inference bundle saved to: {bundle_file}")
+    print(f"Memory-mappable bundle saved to: {bundle_dir}")
+
+def train_model(csv_path='../data/habit_dataset.csv', model_path='../models/', compile_table=True,
+                cache_dir=None, warm_start=False, add_trees=20, cv_jobs=-1,
+                model_config=None, search=False, search_top_k=5, sparse=False):
+    """
+    Train the habit recommendation model
+
+    Args:
+        csv_path: path to the habit dataset
+        model_path: directory the artifacts are written to
+        compile_table: also precompute the answer table
+        cache_dir: directory for cached encoded datasets, None to disable
+        warm_start: grow the saved forest by add_trees trees instead of
+            retraining, when rows were only appended to the dataset
+        add_trees: number of trees added by a warm start
+        cv_jobs: processes used for the cross-validation folds (and
+            for the configuration search)
+        model_config: estimator configuration (see model_search); by
+            default the one saved by the previous run, else DEFAULT_CONFIG
+        search: evaluate the model_search space and train the selected
+            configuration
+        search_top_k: K of the hit rate the search optimizes
+        sparse: keep features as CSR matrices, for training and for the
+            saved preprocessor (large health issue vocabularies)
+    """
+    # Create models directory if it doesn't exist
+    os.makedirs(model_path, exist_ok=True)
+    timings = {}
+    
+    # Stage 1: load and encode (cached on the CSV content hash)
+    started = time.perf_counter()
+    encoded = encode_dataset(csv_path, cache_dir, sparse)
+    preprocessor = encoded['preprocessor']
+    X, y = encoded['X'], encoded['y']
+    timings['encode'] = time.perf_counter() - started
     print(f"\nFeature shape: {X.shape}")
+    if sparse:
+        print(f"Sparse features: {X.nnz} stored values ({X.nnz / (X.shape[0] * X.shape[1]):.2%} of cells)")
     print(f"Target shape: {y.shape}")
     print(f"Feature names: {preprocessor.get_feature_names()}")
     
-    # Split data (remove stratify due to small dataset with unique classes)
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
+    # Stage 2: split; existing rows keep their side when rows are appended
+    is_test = split_mask(len(y))
+    X_train, X_test, y_train, y_test = X[~is_test], X[is_test], y[~is_test], y[is_test]
     print(f"\nTrain set: {X_train.shape}")
     print(f"Test set: {X_test.shape}")
     
@@ -58,26 +317,44 @@ def train_model(csv_path='../data/habit_dataset.csv', model_path='../models/'):
         print(f"\nWarning: {single_instance_classes} habit(s) appear only once in dataset")
         print("Consider adding more diverse training examples for better performance")
     
-    # Train model with better parameters for small dataset
-    print("\n" + "="*50)
-    print("Training Random Forest Classifier...")
-    print("="*50)
-    model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=None,
-        min_samples_split=2,
-        min_samples_leaf=1,
-        random_state=42,
-        class_weight='balanced',
-        n_jobs=-1,
-        bootstrap=True,
-        max_features='sqrt'
-    )
+    # Stage 3: pick a configuration, then train or grow the saved forest
+    started = time.perf_counter()
+    search_results = None
+    if search:
+        model_config, search_results = run_model_search(
+            X_train, y_train, X_test, y_test, model_path, search_top_k, cv_jobs
+        )
+        warm_start = False
+    elif model_config is None:
+        model_config = previous_model_config(model_path) or DEFAULT_CONFIG
+    timings['search'] = time.perf_counter() - started
     
-    model.fit(X_train, y_train)
+    started = time.perf_counter()
+    model = None
+    if warm_start:
+        model, reason = warm_start_model(model_path, encoded, y_train)
+        if model is None:
+            print(f"\nWarm start not possible: {reason}; retraining from scratch")
+    
+    print("\n" + "="*50)
+    if model is not None:
+        print(f"Growing {type(model).__name__} from {len(model.estimators_)} by {add_trees} trees...")
+        print("="*50)
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + add_trees)
+        model.fit(X_train, y_train)
+        model.set_params(warm_start=False)
+        warm_started = True
+    else:
+        print(f"Training {config_name(model_config)}...")
+        print("="*50)
+        model = build_estimator(model_config, n_jobs=-1)
+        model.fit(X_train, y_train)
+        warm_started = False
+    timings['train'] = time.perf_counter() - started
     print("Training completed!")
     
-    # Evaluate model
+    # Stage 4: evaluate
+    started = time.perf_counter()
     print("\n" + "="*50)
     print("Model Evaluation")
     print("="*50)
@@ -92,16 +369,35 @@ def train_model(csv_path='../data/habit_dataset.csv', model_path='../models/'):
     test_acc = accuracy_score(y_test, test_pred)
     print(f"Test Accuracy: {test_acc:.4f}")
     
-    # Cross-validation score (skip if dataset is too small)
+    # Top-k quality of the lists predict_habits serves, per backend
+    habit_priority_codes = priority_codes(encoded['habit_metadata'][2])
+    evaluation = {
+        'forest': evaluate_model(
+            model, X_test, y_test, DEFAULT_KS, len(preprocessor.habit_classes), habit_priority_codes
+        )
+    }
+    print(f"Test {format_metrics(evaluation['forest'])}")
+    
+    # Cross-validation score (skip if dataset is too small). Folds run in
+    # separate processes, each fitting a single-threaded copy of the forest.
+    cv_scores = None
     if len(np.unique(y_train)) >= 5 and len(y_train) >= 10:
         try:
-            cv_scores = cross_val_score(model, X_train, y_train, cv=min(3, len(y_train) // 10))
+            folds = min(3, len(y_train) // 10)
+            cv_scores = cross_val_score(
+                clone(model).set_params(n_jobs=1, warm_start=False),
+                X_train, y_train, cv=folds, n_jobs=cv_jobs
+            )
             print(f"Cross-validation scores: {cv_scores}")
             print(f"Mean CV Score: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
         except Exception as e:
             print(f"Cross-validation skipped: {str(e)}")
     else:
         print("Cross-validation skipped: Dataset too small or too many unique classes")
+    _, evaluation['similarity'] = export_similarity_index(
+        preprocessor, X_train, y_train, X_test, y_test, model_path, habit_priority_codes
+    )
+    timings['evaluate'] = time.perf_counter() - started
     
     # Feature importance
     print("\n" + "="*50)
@@ -114,7 +410,8 @@ def train_model(csv_path='../data/habit_dataset.csv', model_path='../models/'):
     }).sort_values('importance', ascending=False)
     print(feature_importance.head(10))
     
-    # Save model and preprocessor
+    # Stage 5: save model and preprocessor
+    started = time.perf_counter()
     model_file = os.path.join(model_path, 'habit_recommender.pkl')
     preprocessor_file = os.path.join(model_path, 'preprocessor.pkl')
     metadata_file = os.path.join(model_path, 'metadata.pkl')
@@ -125,16 +422,26 @@ def train_model(csv_path='../data/habit_dataset.csv', model_path='../models/'):
     joblib.dump(model, model_file)
     joblib.dump(preprocessor, preprocessor_file)
     
-    # Save metadata for reference
+    # Save metadata for reference; the dataset fingerprint lets a later
+    # warm start check that rows were only appended
     metadata = {
         'train_accuracy': train_acc,
         'test_accuracy': test_acc,
-        'cv_mean_score': None,
-        'cv_std_score': None,
+        'evaluation': evaluation,
+        'cv_mean_score': float(cv_scores.mean()) if cv_scores is not None else None,
+        'cv_std_score': float(cv_scores.std()) if cv_scores is not None else None,
         'n_features': X.shape[1],
+        'feature_format': 'sparse' if sparse else 'dense',
         'n_classes': len(np.unique(y)),
         'feature_names': feature_names,
-        'dataset_info': df.groupby('recommendedHabit')['category'].first().to_dict()
+        'dataset_info': encoded['dataset_info'],
+        'dataset_sha256': encoded['dataset_sha256'],
+        'rows_sha256': rows_sha256(X, y),
+        'n_rows': encoded['n_rows'],
+        'n_estimators': len(model.estimators_),
+        'warm_started': warm_started,
+        'model_config': model_config,
+        'model_search': search_results
     }
     joblib.dump(metadata, metadata_file)
     
@@ -142,9 +449,32 @@ def train_model(csv_path='../data/habit_dataset.csv', model_path='../models/'):
     print(f"Preprocessor saved to: {preprocessor_file}")
     print(f"Metadata saved to: {metadata_file}")
     
+    # Stage 6: serving artifacts
+    flat_model = export_flat_model(model, X, model_path)
+    export_inference_bundle(preprocessor, flat_model, encoded['habit_metadata'], metadata, model_path)
+    
+    if compile_table:
+        compile_answer_table(model, preprocessor, model_path)
+    elif os.path.exists(os.path.join(model_path, 'answer_table.npz')):
+        # A table from the previous model would be listed in the manifest
+        # and served by compiled workers
+        os.remove(os.path.join(model_path, 'answer_table.npz'))
+        print("Removed the previous model's answer table")
+    
+    # Last, so a manifest always describes a complete set of artifacts
+    manifest = write_manifest(
+        model_path, X.shape[1], len(preprocessor.habit_classes), 'sparse' if sparse else 'dense'
+    )
+    total_bytes = sum(entry['bytes'] for entry in manifest['artifacts'].values())
+    print(f"Manifest of {len(manifest['artifacts'])} files ({total_bytes / 1e6:.1f} MB) "
+          f"saved to: {os.path.join(model_path, MANIFEST_FILE)}")
+    timings['export'] = time.perf_counter() - started
+    
     print("\n" + "="*50)
     print("Training Complete!")
     print("="*50)
+    for stage, seconds in timings.items():
+        print(f"{stage:>10}: {seconds:.2f}s")
     
     return model, preprocessor
 
@@ -152,9 +482,39 @@ if __name__ == "__main__":
     # Get the directory of this script
     script_dir = os.path.dirname(os.path.abspath(__file__))
     
-    # Set paths relative to script location
-    csv_path = os.path.join(script_dir, '..', 'data', 'habit_dataset.csv')
-    model_path = os.path.join(script_dir, '..', 'models')
+    parser = argparse.ArgumentParser(description="Train the habit recommendation model")
+    parser.add_argument('--data', default=os.path.join(script_dir, '..', 'data', 'habit_dataset.csv'))
+    parser.add_argument('--models', default=os.path.join(script_dir, '..', 'models'))
+    parser.add_argument('--cache-dir', default=os.path.join(script_dir, '..', '.train_cache'),
+                        help="where encoded datasets are cached")
+    parser.add_argument('--no-cache', action='store_true', help="always re-encode the CSV")
+    parser.add_argument('--warm-start', action='store_true',
+                        help="add trees to the saved forest when rows were only appended")
+    parser.add_argument('--add-trees', type=int, default=20)
+    parser.add_argument('--cv-jobs', type=int, default=-1,
+                        help="processes for cross-validation folds (-1 = all cores)")
+    parser.add_argument('--search', action='store_true',
+                        help="evaluate model configurations and train the selected one")
+    parser.add_argument('--search-top-k', type=int, default=5)
+    parser.add_argument('--default-config', action='store_true',
+                        help="ignore the configuration selected by a previous search")
+    parser.add_argument('--sparse', action='store_true',
+                        help="CSR health issue features, for large vocabularies "
+                             "(combine with --skip-answer-table)")
+    parser.add_argument('--skip-answer-table', action='store_true')
+    args = parser.parse_args()
     
     # Train model
-    train_model(csv_path, model_path)
\ No newline at end of file
+    train_model(
+        args.data,
+        args.models,
+        compile_table=not args.skip_answer_table,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        warm_start=args.warm_start,
+        add_trees=args.add_trees,
+        cv_jobs=args.cv_jobs,
+        model_config=DEFAULT_CONFIG if args.default_config else None,
+        search=args.search,
+        search_top_k=args.search_top_k,
+        sparse=args.sparse
+    )
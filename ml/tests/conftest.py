@@ -0,0 +1,53 @@
+import importlib
+import os
+import sys
+import warnings
+
+import joblib
+import pytest
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Modules are imported the way app.py and the scripts import them
+sys.path.insert(0, os.path.join(ML_DIR, 'src'))
+sys.path.insert(0, ML_DIR)
+
+@pytest.fixture(scope='session')
+def apps(tmp_path_factory):
+    """Both apps serving a small forest trained on the repository dataset"""
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    from preprocess import HabitDataPreprocessor
+
+    model_dir = tmp_path_factory.mktemp('models')
+    df = pd.read_csv(os.path.join(ML_DIR, 'data', 'habit_dataset.csv'))
+    preprocessor = HabitDataPreprocessor().fit(df)
+    X, y = preprocessor.transform_dataset(df)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    joblib.dump(model, model_dir / 'habit_recommender.pkl')
+    joblib.dump(preprocessor, model_dir / 'preprocessor.pkl')
+
+    # No response cache, so each app computes its own answer
+    environ = {
+        'ML_MODEL_DIR': str(model_dir), 'ML_CACHE_SIZE': '0', 'ML_METRICS': 'false', 'ML_LOG_LEVEL': 'ERROR'
+    }
+    saved = {name: os.environ.get(name) for name in environ}
+    os.environ.update(environ)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for name in ('app', 'asgi'):
+                sys.modules.pop(name, None)
+            app = importlib.import_module('app')
+            asgi = importlib.import_module('asgi')
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    assert app.model_holder.current is not None
+    yield app, asgi
+    for name in ('app', 'asgi'):
+        sys.modules.pop(name, None)
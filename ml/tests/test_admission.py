@@ -0,0 +1,121 @@
+import pytest
+
+from admission import AdmissionController, queue_seconds
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_in_flight_cap_sheds_until_a_slot_is_released():
+    controller = AdmissionController(max_in_flight=2, max_wait_ms=10_000)
+    assert controller.try_acquire()[0]
+    assert controller.try_acquire()[0]
+
+    assert controller.try_acquire() == (False, 'in_flight', 1)
+    controller.release()
+    assert controller.try_acquire()[0]
+    assert controller.stats()['admitted'] == 3
+    assert controller.stats()['shed_in_flight'] == 1
+
+def test_expected_wait_sheds_with_retry_after():
+    controller = AdmissionController(max_in_flight=100, max_wait_ms=1000, concurrency=2, smoothing=1.0)
+    controller.try_acquire()
+    controller.release(0.5)
+
+    # Each request in flight adds 0.5 s / 2 slots of expected wait; admitted
+    # while it stays within max_wait
+    for _ in range(5):
+        assert controller.try_acquire()[0]
+    admitted, reason, retry_after = controller.try_acquire()
+    assert (admitted, reason) == (False, 'expected_wait')
+    assert controller.stats()['expected_wait_seconds'] == pytest.approx(1.25)
+    # Retry-After is the expected wait rounded up to whole seconds
+    assert retry_after == 2
+
+    controller.release(0.5)
+    assert controller.try_acquire()[0]
+
+def test_queue_time_sheds_and_counts_by_reason():
+    controller = AdmissionController(max_in_flight=1, max_wait_ms=500)
+    assert controller.try_acquire(queued_seconds=0.6)[1] == 'queue_time'
+    assert controller.try_acquire()[0]
+    assert controller.try_acquire()[1] == 'in_flight'
+
+    stats = controller.stats()
+    assert (stats['shed_queue_time'], stats['shed_in_flight'], stats['shed_expected_wait']) == (1, 1, 0)
+    assert stats['shed'] == 2
+
+def test_status_degrades_near_the_limit_and_after_shedding():
+    clock = FakeClock()
+    controller = AdmissionController(max_in_flight=4, degraded_hold_seconds=5.0, clock=clock)
+    for _ in range(2):
+        controller.try_acquire()
+    assert controller.status() == 'healthy'
+    controller.try_acquire()
+    assert controller.status() == 'degraded'
+
+    controller.try_acquire()
+    controller.try_acquire()
+    for _ in range(4):
+        controller.release()
+    assert controller.status() == 'degraded'
+    clock.now += 6
+    assert controller.status() == 'healthy'
+
+def test_disabled_controller_admits_everything():
+    controller = AdmissionController(max_in_flight=0)
+    assert all(controller.try_acquire()[0] for _ in range(1000))
+    assert controller.status() == 'healthy'
+
+@pytest.mark.parametrize('header, expected', [
+    ('t=1700000000.5', 1.5), ('1700000000500', 1.5), ('1700000000500000', 1.5),
+    ('', 0.0), ('garbage', 0.0), ('t=1700000003', 0.0)
+])
+def test_queue_seconds_reads_every_unit(header, expected):
+    assert queue_seconds(header, now=1700000002.0) == pytest.approx(expected)
+
+@pytest.fixture
+def tight_app(apps, monkeypatch):
+    app, _ = apps
+    controller = AdmissionController(max_in_flight=1, max_wait_ms=1000)
+    monkeypatch.setattr(app, 'admission', controller)
+    return app, controller
+
+PROFILE = {'bmiCategory': 'normal', 'goals': 'weightloss'}
+
+def test_predict_is_shed_with_retry_after_and_health_degrades(tight_app):
+    app, controller = tight_app
+    client = app.app.test_client()
+    assert client.get('/health').status_code == 200
+    assert client.post('/predict', json=PROFILE).status_code == 200
+
+    # A request already holding the only slot
+    assert controller.try_acquire()[0]
+    response = client.post('/predict', json=PROFILE)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert 'in_flight' in response.get_json()['message']
+    assert client.post('/predict/batch', json={'profiles': [PROFILE]}).status_code == 503
+
+    health = client.get('/health')
+    assert health.status_code == 503
+    assert health.get_json()['status'] == 'degraded'
+    assert controller.stats()['shed_in_flight'] == 2
+
+def test_expected_wait_shedding_over_http(tight_app, monkeypatch):
+    app, _ = tight_app
+    controller = AdmissionController(max_in_flight=100, max_wait_ms=1000, smoothing=1.0)
+    monkeypatch.setattr(app, 'admission', controller)
+    controller.try_acquire()
+    controller.release(0.7)
+    controller.try_acquire()
+    controller.try_acquire()
+
+    response = app.app.test_client().post('/predict', json=PROFILE)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
+    assert 'expected_wait' in response.get_json()['message']
+    assert controller.stats()['shed_expected_wait'] == 1
@@ -0,0 +1,108 @@
+"""The compiled answer table must rank exactly like the live model it was built from"""
+import contextlib
+import io
+import itertools
+import os
+import shutil
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from answer_table import AnswerTable
+from artifacts import MODEL_FILE, file_sha256, load_manifest, write_manifest
+from flat_forest import FlatForest
+from predict import HabitRecommender
+from preprocess import HabitDataPreprocessor
+from train import compile_answer_table
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+@pytest.fixture(scope='module')
+def model_dir(tmp_path_factory):
+    """Pickles, flat forest, answer table and manifest for a small forest"""
+    model_dir = tmp_path_factory.mktemp('models')
+    df = pd.read_csv(os.path.join(ML_DIR, 'data', 'habit_dataset.csv'))
+    preprocessor = HabitDataPreprocessor().fit(df)
+    X, y = preprocessor.transform_dataset(df)
+    # Few trees, so many classes tie
+    model = RandomForestClassifier(n_estimators=10, random_state=1).fit(X, y)
+
+    joblib.dump(model, model_dir / MODEL_FILE)
+    joblib.dump(preprocessor, model_dir / 'preprocessor.pkl')
+    FlatForest.from_sklearn(model).save(model_dir / 'flat_forest.npz')
+    with contextlib.redirect_stdout(io.StringIO()):
+        compile_answer_table(model, preprocessor, str(model_dir))
+    write_manifest(str(model_dir), X.shape[1], len(preprocessor.habit_classes))
+    return model_dir
+
+def load(path, **options):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return HabitRecommender(str(path), **options)
+
+def profiles(preprocessor, n_random=8, seed=0):
+    """Every (BMI, goal) pair with no or one health issue, and a few random sets of two and three"""
+    issues = list(preprocessor.health_classes)
+    rng = np.random.default_rng(seed)
+    health_sets = [[]] + [[issue] for issue in issues] + [
+        list(rng.choice(issues, size=size, replace=False)) for size in (2, 3) for _ in range(n_random)
+    ]
+    return [
+        {'bmi_category': bmi_category, 'goals': goals, 'health_issues': health_issues}
+        for bmi_category, goals in itertools.product(preprocessor.bmi_classes, preprocessor.goal_classes)
+        for health_issues in health_sets
+    ]
+
+@pytest.fixture(scope='module')
+def live(model_dir):
+    recommender = load(model_dir)
+    return recommender, profiles(recommender.preprocessor)
+
+@pytest.mark.parametrize('options', [{}, {'flat': True}], ids=['sklearn', 'flat'])
+def test_compiled_matches_live_model(model_dir, live, options):
+    reference, batch = live
+    compiled = load(model_dir, compiled=True, **options)
+    assert compiled.answer_table.fingerprint == file_sha256(model_dir / MODEL_FILE)
+
+    expected, _ = reference.rank_batch(batch, 8)
+    ranked, errors = compiled.rank_batch(batch, 8)
+    assert errors == {}
+    np.testing.assert_array_equal(ranked, expected)
+
+    # Three health issues miss the table and go to the model
+    features = compiled.preprocessor.transform_batch(
+        [p['bmi_category'] for p in batch], [p['health_issues'] for p in batch], [p['goals'] for p in batch]
+    )
+    _, hit = compiled.answer_table.lookup(features, 8)
+    sizes = np.array([len(p['health_issues']) for p in batch])
+    np.testing.assert_array_equal(hit, sizes <= compiled.max_health_issues)
+
+@pytest.mark.parametrize('options', [{}, {'flat': True}], ids=['sklearn', 'flat'])
+def test_live_modes_agree(model_dir, live, options):
+    reference, batch = live
+    expected, _ = reference.rank_batch(batch, 8)
+    ranked, _ = load(model_dir, **options).rank_batch(batch, 8)
+    np.testing.assert_array_equal(ranked, expected)
+
+@pytest.mark.parametrize('fingerprint', ['0' * 64, None], ids=['other-model', 'unfingerprinted'])
+def test_table_from_another_model_is_rebuilt(model_dir, live, tmp_path, fingerprint):
+    reference, batch = live
+    stale_dir = tmp_path / 'models'
+    shutil.copytree(model_dir, stale_dir)
+
+    # Same shape as the real table, but wrong rankings
+    table = AnswerTable.load(stale_dir / 'answer_table.npz')
+    table.rankings = table.rankings[:, ::-1].copy()
+    table.fingerprint = fingerprint
+    table.save(stale_dir / 'answer_table.npz')
+    manifest = load_manifest(str(stale_dir))
+    write_manifest(str(stale_dir), manifest['n_features'], manifest['n_classes'])
+
+    compiled = load(stale_dir, compiled=True)
+    assert compiled.answer_table.fingerprint == file_sha256(stale_dir / MODEL_FILE)
+    ranked, _ = compiled.rank_batch(batch, 8)
+    np.testing.assert_array_equal(ranked, reference.rank_batch(batch, 8)[0])
@@ -0,0 +1,57 @@
+"""Flask (app.py) and ASGI (asgi.py) must answer the same request identically"""
+import asyncio
+import json
+
+import pytest
+
+def flask_post(app, path, payload):
+    response = app.app.test_client().post(path, json=payload)
+    return response.status_code, response.get_json()
+
+def asgi_post(asgi, path, payload):
+    async def call():
+        messages = [{'type': 'http.request', 'body': json.dumps(payload).encode(), 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': path, 'query_string': b'',
+            'headers': [(b'content-type', b'application/json')]
+        }
+        await asgi.application(scope, receive, send)
+        return sent[0]['status'], json.loads(sent[1]['body'])
+
+    return asyncio.run(call())
+
+@pytest.mark.parametrize('top_k', [0, 1, 5, None])
+def test_predict_top_k_matches(apps, top_k):
+    app, asgi = apps
+    payload = {'bmiCategory': 'overweight', 'healthIssues': ['diabetes'], 'goals': 'weightloss'}
+    if top_k is not None:
+        payload['topK'] = top_k
+
+    flask_status, flask_body = flask_post(app, '/predict', payload)
+    asgi_status, asgi_body = asgi_post(asgi, '/predict', payload)
+    assert flask_status == asgi_status == 200
+    assert flask_body == asgi_body
+    expected = 5 if top_k is None else top_k
+    assert len(flask_body['data']['recommendations']) == expected
+
+@pytest.mark.parametrize('payload', [
+    {'bmiCategory': 'normal', 'goals': 'weightloss', 'topK': -1},
+    {'bmiCategory': 'normal', 'goals': 'weightloss', 'topK': 'x'},
+    {'bmiCategory': 'normal', 'goals': 5},
+    {'bmiCategory': 'normal', 'goals': 'weightloss', 'healthIssues': [1]},
+    {'bmiCategory': 'giant', 'goals': 'weightloss'},
+])
+def test_predict_rejects_the_same_payloads(apps, payload):
+    app, asgi = apps
+    flask_status, flask_body = flask_post(app, '/predict', payload)
+    asgi_status, asgi_body = asgi_post(asgi, '/predict', payload)
+    assert flask_status == asgi_status == 400
+    assert flask_body == asgi_body
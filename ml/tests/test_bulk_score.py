@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from bulk_score import parse_record
+
+def test_jsonl_record_becomes_normalized_profile():
+    row_id, profile = parse_record(
+        json.dumps({'id': 'u1', 'bmiCategory': 'Over Weight', 'goals': 'Weight Loss',
+                    'healthIssues': ['Back Pain']}), 0, 'id'
+    )
+    assert row_id == 'u1'
+    assert profile == {'bmi_category': 'overweight', 'health_issues': ['backpain'], 'goals': 'weightloss'}
+
+def test_csv_record_splits_health_issues_and_defaults_id():
+    row_id, profile = parse_record({'bmiCategory': 'normal', 'goals': 'endurance', 'healthIssues': 'none'}, 7, 'id')
+    assert row_id == 7
+    assert profile['health_issues'] == []
+
+@pytest.mark.parametrize('line', [
+    'not json',
+    '[1, 2]',
+    '"profile"',
+    '{"bmiCategory": "normal", "goals": 5}',
+    '{"bmiCategory": "normal", "goals": "endurance", "healthIssues": [1]}',
+    '{"bmiCategory": "normal", "goals": "endurance", "healthIssues": {"asthma": true}}',
+])
+def test_malformed_records_raise_value_error(line):
+    with pytest.raises(ValueError):
+        parse_record(line, 0, 'id')
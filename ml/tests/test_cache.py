@@ -0,0 +1,29 @@
+from cache import ResponseCache, canonical_profile_key
+
+def test_write_from_previous_owner_is_dropped():
+    cache = ResponseCache(max_size=8)
+    old_model, new_model = object(), object()
+    key = canonical_profile_key('Normal', ['Asthma'], 'Endurance', 5)
+
+    cache.bind(old_model)
+    # A reload rebinds the cache while old_model is still computing
+    cache.bind(new_model)
+    cache.set(key, ['stale'], old_model)
+    assert cache.get(key) is None
+    assert cache.stats()['stale_writes'] == 1
+
+    cache.set(key, ['fresh'], new_model)
+    assert cache.get(key) == ['fresh']
+
+def test_rebinding_clears_entries():
+    cache = ResponseCache(max_size=8)
+    old_model, new_model = object(), object()
+    cache.bind(old_model)
+    cache.set('key', 'value', old_model)
+    cache.bind(new_model)
+    assert cache.get('key') is None
+    assert cache.stats()['invalidations'] == 1
+
+def test_canonical_key_ignores_case_spaces_and_issue_order():
+    assert canonical_profile_key('Over Weight', ['Back Pain', 'asthma'], 'Weight Loss', 5) == \
+        canonical_profile_key('overweight', ['Asthma', 'backpain', 'asthma'], 'weightloss', '5')
@@ -0,0 +1,87 @@
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestClassifier
+
+from flat_forest import FlatForest
+from preprocess import HabitDataPreprocessor
+from ranking import top_k_indices
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Leaf values and summation order match sklearn's, so probabilities are
+# expected to be identical; the tolerance only guards other sklearn versions
+ATOL = 1e-12
+
+@pytest.fixture(scope='module')
+def fitted():
+    """Small forest on encoded-looking features: two codes plus multi-hot columns"""
+    rng = np.random.default_rng(0)
+    n_rows = 600
+    X = np.hstack([
+        rng.integers(0, 4, size=(n_rows, 1)),
+        rng.integers(0, 12, size=(n_rows, 1)),
+        rng.integers(0, 2, size=(n_rows, 10))
+    ]).astype(np.int64)
+    y = (X[:, 0] * 3 + X[:, 1] + X[:, 2:5].sum(axis=1) + rng.integers(0, 3, size=n_rows)) % 9
+    model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+
+    X_test = np.hstack([
+        rng.integers(0, 4, size=(200, 1)),
+        rng.integers(0, 12, size=(200, 1)),
+        rng.integers(0, 2, size=(200, 10))
+    ]).astype(np.int64)
+    return model, X_test
+
+def test_predict_proba_matches_sklearn(fitted):
+    model, X = fitted
+    flat = FlatForest.from_sklearn(model)
+    np.testing.assert_array_equal(flat.classes_, model.classes_)
+    np.testing.assert_allclose(flat.predict_proba(X), model.predict_proba(X), rtol=0, atol=ATOL)
+
+def test_near_ties_break_like_sklearn():
+    """A one-ulp difference reorders classes with (nearly) equal probability"""
+    df = pd.read_csv(os.path.join(ML_DIR, 'data', 'habit_dataset.csv'))
+    preprocessor = HabitDataPreprocessor().fit(df)
+    X, y = preprocessor.transform_dataset(df)
+    model = RandomForestClassifier(n_estimators=10, random_state=1).fit(X, y)
+
+    # Every (BMI, goal) pair with no or one health issue
+    health_sets = [[]] + [[issue] for issue in preprocessor.health_classes]
+    bmi_categories, health_issues, goals = zip(*itertools.product(
+        preprocessor.bmi_classes, health_sets, preprocessor.goal_classes
+    ))
+    features = preprocessor.transform_batch(bmi_categories, health_issues, goals)
+    flat = FlatForest.from_sklearn(model)
+    np.testing.assert_array_equal(top_k_indices(flat.predict_proba(features), 8),
+                                  top_k_indices(model.predict_proba(features), 8))
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 256])
+def test_chunking_does_not_change_probabilities(fitted, chunk_size):
+    model, X = fitted
+    flat = FlatForest.from_sklearn(model)
+    np.testing.assert_allclose(flat.predict_proba(X, chunk_size=chunk_size), model.predict_proba(X),
+                               rtol=0, atol=ATOL)
+
+def test_sparse_input_matches_dense(fitted):
+    model, X = fitted
+    flat = FlatForest.from_sklearn(model)
+    np.testing.assert_allclose(flat.predict_proba(sp.csr_matrix(X.astype(np.float32))),
+                               model.predict_proba(X), rtol=0, atol=ATOL)
+
+def test_save_and_load_round_trip(fitted, tmp_path):
+    model, X = fitted
+    path = tmp_path / 'flat_forest.npz'
+    FlatForest.from_sklearn(model).save(path)
+    loaded = FlatForest.load(path)
+    np.testing.assert_allclose(loaded.predict_proba(X), model.predict_proba(X), rtol=0, atol=ATOL)
+    assert loaded.verify_parity(model, X) <= ATOL
+
+def test_wrong_feature_count_raises(fitted):
+    model, X = fitted
+    with pytest.raises(ValueError, match='features'):
+        FlatForest.from_sklearn(model).predict_proba(X[:, :-1])
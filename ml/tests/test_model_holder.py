@@ -0,0 +1,51 @@
+import os
+import threading
+import time
+
+from model_holder import ModelHolder, artifact_mtimes
+
+class RecordingHolder(ModelHolder):
+    """ModelHolder whose reload only records the artifact mtimes it saw"""
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        self.reloads = []
+        self.reloaded = threading.Event()
+
+    def reload(self):
+        with self._reload_lock:
+            self._mtimes = artifact_mtimes(self.model_path)
+            self.reloads.append(dict(self._mtimes))
+            self.reloaded.set()
+
+def touch(path, mtime):
+    with open(path, 'a'):
+        pass
+    os.utime(path, (mtime, mtime))
+
+def test_change_during_running_reload_is_loaded_afterwards(tmp_path):
+    artifact = tmp_path / 'metadata.pkl'
+    touch(artifact, 1_000_000)
+    holder = RecordingHolder(str(tmp_path))
+    holder.watch(0.01)
+    try:
+        # An earlier reload is still running when the deploy's last file lands
+        with holder._reload_lock:
+            touch(artifact, 2_000_000)
+            time.sleep(0.1)
+            assert holder.reloads == []
+
+        assert holder.reloaded.wait(2)
+        assert holder.reloads[-1] == {str(artifact): 2_000_000}
+    finally:
+        holder.stop()
+
+def test_unchanged_artifacts_are_not_reloaded(tmp_path):
+    touch(tmp_path / 'metadata.pkl', 1_000_000)
+    holder = RecordingHolder(str(tmp_path))
+    holder.watch(0.01)
+    try:
+        time.sleep(0.1)
+        assert holder.reloads == []
+    finally:
+        holder.stop()
@@ -0,0 +1,57 @@
+"""Per-item error contract of /predict/batch and predict_habits_batch"""
+import pytest
+
+VALID = {'bmiCategory': 'overweight', 'healthIssues': ['diabetes'], 'goals': 'weightloss'}
+OTHER = {'bmiCategory': 'underweight', 'healthIssues': [], 'goals': 'weightgain', 'topK': 2}
+
+@pytest.fixture
+def client(apps):
+    app, _ = apps
+    return app.app.test_client()
+
+def single(client, profile):
+    response = client.post('/predict', json=profile)
+    assert response.status_code == 200
+    return response.get_json()['data']['recommendations']
+
+def test_mixed_batch_keeps_valid_rows_and_order(client):
+    profiles = [
+        VALID,
+        {'bmiCategory': 'normal', 'goals': 5},
+        OTHER,
+        7,
+        {'bmiCategory': 'normal', 'goals': 'flying'},
+        dict(VALID, topK=0),
+    ]
+    response = client.post('/predict/batch', json={'profiles': profiles})
+    assert response.status_code == 200
+    results = response.get_json()['data']['results']
+    assert len(results) == len(profiles)
+
+    assert results[0] == {'recommendations': single(client, VALID)}
+    assert results[1] == {'error': 'bmiCategory and goals must be strings'}
+    assert results[2] == {'recommendations': single(client, OTHER)}
+    assert len(results[2]['recommendations']) == 2
+    assert results[3] == {'error': 'Each profile must be a JSON object'}
+    assert 'flying' in results[4]['error']
+    assert results[5] == {'recommendations': []}
+
+@pytest.mark.parametrize('body', [[VALID], {'profiles': VALID}, {'profiles': [VALID], 'topK': -1}])
+def test_malformed_batch_body_is_rejected(client, body):
+    assert client.post('/predict/batch', json=body).status_code == 400
+
+def test_predict_habits_batch_reports_errors_in_place(apps):
+    app, _ = apps
+    recommender = app.model_holder.current
+    profiles = [
+        {'bmi_category': 'normal', 'health_issues': ['asthma'], 'goals': 'endurance'},
+        {'bmi_category': 'normal', 'health_issues': [1], 'goals': 'endurance'},
+        {'bmi_category': 'obese', 'health_issues': [], 'goals': 'weightloss', 'top_k': 3},
+        {'bmi_category': 'normal', 'goals': 'endurance', 'top_k': 'x'},
+    ]
+    results = recommender.predict_habits_batch(profiles, top_k=5)
+
+    assert results[0]['recommendations'] == recommender.predict_habits('normal', ['asthma'], 'endurance', top_k=5)
+    assert results[1] == {'error': 'healthIssues must be a list of strings'}
+    assert results[2]['recommendations'] == recommender.predict_habits('obese', [], 'weightloss', top_k=3)
+    assert results[3] == {'error': 'topK must be a non-negative integer'}
@@ -0,0 +1,97 @@
+import itertools
+import pickle
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocess import HabitDataPreprocessor
+
+BMI = ['Underweight', 'Normal', 'Overweight', 'Obese']
+GOALS = ['Weight Loss', 'Muscle Gain', 'Better Sleep', 'Stress Relief']
+ISSUES = ['Diabetes', 'Hypertension', 'Back Pain', 'Asthma', 'Insomnia']
+HABITS = ['Walking 20 min daily', 'Meal planning and prep', 'Yoga', 'Drink 8 glasses water']
+
+def training_frame():
+    rng = np.random.default_rng(0)
+    rows = []
+    for bmi, goal in itertools.product(BMI, GOALS):
+        issues = rng.choice(ISSUES, size=rng.integers(0, 3), replace=False)
+        rows.append({
+            'bmiCategory': bmi,
+            'healthIssues': ', '.join(issues) if len(issues) else 'none',
+            'goals': goal,
+            'recommendedHabit': HABITS[rng.integers(len(HABITS))]
+        })
+    # Every issue at least once, so all of them are classes
+    rows.append({'bmiCategory': 'Normal', 'healthIssues': ', '.join(ISSUES),
+                 'goals': 'Weight Loss', 'recommendedHabit': 'Yoga'})
+    return pd.DataFrame(rows)
+
+@pytest.fixture(params=[False, True], ids=['dense', 'sparse'])
+def preprocessor(request):
+    return HabitDataPreprocessor(sparse=request.param).fit(training_frame())
+
+def dense(features):
+    return features.toarray() if hasattr(features, 'toarray') else features
+
+def all_inputs(preprocessor):
+    health_classes = list(preprocessor.health_classes)
+    health_sets = [[]] + [list(combo) for size in (1, 2) for combo in itertools.combinations(health_classes, size)]
+    health_sets.append(health_classes)
+    return itertools.product(preprocessor.bmi_classes, preprocessor.goal_classes, health_sets)
+
+def test_fast_encoder_matches_sklearn_for_every_class(preprocessor):
+    for bmi_category, goals, health_issues in all_inputs(preprocessor):
+        fast = dense(preprocessor.transform_input(bmi_category, health_issues, goals))
+        reference = preprocessor._transform_input_sklearn(bmi_category, health_issues, goals)
+        np.testing.assert_array_equal(fast, reference, err_msg=f"{bmi_category}, {goals}, {health_issues}")
+
+def test_fast_encoder_normalizes_like_sklearn(preprocessor):
+    fast = dense(preprocessor.transform_input('Over Weight', ['Back Pain', 'DIABETES'], 'Muscle Gain'))
+    reference = preprocessor._transform_input_sklearn('Over Weight', ['Back Pain', 'DIABETES'], 'Muscle Gain')
+    np.testing.assert_array_equal(fast, reference)
+
+def test_batch_matches_single_inputs(preprocessor):
+    inputs = list(all_inputs(preprocessor))
+    batch = dense(preprocessor.transform_batch(*zip(*[(b, h, g) for b, g, h in inputs])))
+    singles = np.vstack([dense(preprocessor.transform_input(b, h, g)) for b, g, h in inputs])
+    np.testing.assert_array_equal(batch, singles)
+
+def test_verify_fast_path_passes(preprocessor):
+    preprocessor.verify_fast_path()
+
+def test_unknown_labels_raise_like_sklearn(preprocessor):
+    # sklearn's exact message differs between versions; both name the label
+    for bmi_category, goals, label in [('giant', 'weightloss', 'giant'), ('normal', 'flying', 'flying')]:
+        with pytest.raises(ValueError, match='previously unseen labels') as fast:
+            preprocessor.transform_input(bmi_category, [], goals)
+        with pytest.raises(ValueError, match='previously unseen labels') as reference:
+            preprocessor._transform_input_sklearn(bmi_category, [], goals)
+        assert label in str(fast.value) and label in str(reference.value)
+
+def test_unknown_health_issues_are_ignored_like_sklearn(preprocessor):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        fast = dense(preprocessor.transform_input('normal', ['diabetes', 'gout'], 'weightloss'))
+        reference = preprocessor._transform_input_sklearn('normal', ['diabetes', 'gout'], 'weightloss')
+    np.testing.assert_array_equal(fast, reference)
+
+def test_lookup_tables_survive_pickling(preprocessor):
+    restored = pickle.loads(pickle.dumps(preprocessor))
+    restored.verify_fast_path()
+
+def test_verify_fast_path_catches_a_wrong_lookup(preprocessor):
+    first, second = preprocessor.health_classes[:2]
+    preprocessor.health_columns[first], preprocessor.health_columns[second] = (
+        preprocessor.health_columns[second], preprocessor.health_columns[first]
+    )
+    with pytest.raises(ValueError, match='Fast encoder mismatch'):
+        preprocessor.verify_fast_path()
+
+def test_verify_fast_path_catches_a_wrong_goal_code(preprocessor):
+    goal = preprocessor.goal_classes[-1]
+    preprocessor.goal_codes[goal] = 0
+    with pytest.raises(ValueError, match=f'Fast encoder mismatch for .*{goal}'):
+        preprocessor.verify_fast_path()
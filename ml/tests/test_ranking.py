@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+import ranking
+from ranking import top_k_indices
+
+def reference_top_k(probabilities, top_k):
+    """Probability descending, then column index ascending"""
+    return np.array([sorted(range(len(row)), key=lambda col: (-row[col], col))[:top_k] for row in probabilities])
+
+@pytest.mark.parametrize('n_classes', [20, 100, ranking.FULL_SORT_MAX_CLASSES + 1, 2000])
+@pytest.mark.parametrize('n_rows', [1, 64])
+def test_sort_and_partition_paths_agree_with_ties(n_classes, n_rows):
+    rng = np.random.default_rng(n_classes + n_rows)
+    # Quantized like forest vote shares, so ties straddle the K-th place
+    probabilities = np.round(rng.dirichlet(np.ones(n_classes) * 0.1, size=n_rows) * 20) / 20
+    np.testing.assert_array_equal(top_k_indices(probabilities, 8), reference_top_k(probabilities, 8))
+
+def test_zero_and_oversized_k():
+    probabilities = np.array([[0.2, 0.5, 0.3]])
+    assert top_k_indices(probabilities, 0).shape == (1, 0)
+    np.testing.assert_array_equal(top_k_indices(probabilities, 10), [[1, 2, 0]])